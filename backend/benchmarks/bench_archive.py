@@ -0,0 +1,86 @@
+"""
+Archiving an inactive survey: storage moved out of survey_responses and the
+cost of reading it afterwards.
+
+Seeds a throwaway SQLite database with one survey's synthetic responses, times
+analytics and a page of responses, archives the survey and times them again
+(stored analytics, paging from the archive file). Run from ``backend/``:
+
+    python -m benchmarks.bench_archive --responses 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+directory = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(directory, "bench_archive.db")
+os.environ["ARCHIVE_DIR"] = os.path.join(directory, "archives")
+os.environ.setdefault("SQL_ECHO", "false")
+
+from database import SessionLocal, create_tables, engine
+from models.survey import SurveyArchive, SurveyResponse
+from services.retention import archive_survey
+from services.survey_service import compute_survey_analytics, list_responses
+from benchmarks.bench_encoding import build_responses
+
+SURVEY_ID = 1
+
+
+def table_bytes() -> int:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    return os.path.getsize(engine.url.database)
+
+
+def timed(fn) -> float:
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=100_000)
+    parser.add_argument("--questions", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    random.seed(7)
+    create_tables()
+    start = datetime(2020, 1, 1)
+    # No text questions: theme fitting is not what is measured here
+    rows = build_responses(args.responses, args.questions)
+    with engine.begin() as conn:
+        conn.execute(SurveyResponse.__table__.insert(), [
+            {"survey_id": SURVEY_ID, "respondent_id": i % 5000,
+             "responses": {q: a for q, a in row.items() if int(q) % 4 != 1},
+             "submitted_at": start + timedelta(minutes=i)}
+            for i, row in enumerate(rows)
+        ])
+    before_bytes = table_bytes()
+
+    db = SessionLocal()
+    live_analytics = timed(lambda: compute_survey_analytics(db, SURVEY_ID))
+    live_page = timed(lambda: list_responses(db, SURVEY_ID, 50))
+    archive_s = timed(lambda: archive_survey(db, SURVEY_ID))
+    archive = db.get(SurveyArchive, SURVEY_ID)
+    after_bytes = table_bytes()
+    stored_analytics = timed(lambda: compute_survey_analytics(db, SURVEY_ID))
+    first_page = timed(lambda: list_responses(db, SURVEY_ID, 50))
+    cached_page = timed(lambda: list_responses(db, SURVEY_ID, 50))
+    db.close()
+
+    print(f"{args.responses} responses")
+    print(f"database file:     {before_bytes / 1e6:8.1f} MB -> {after_bytes / 1e6:.1f} MB after archiving")
+    print(f"archive file:      {os.path.getsize(archive.path) / 1e6:8.1f} MB (archived in {archive_s:.1f}s)")
+    print(f"analytics:         {live_analytics * 1e3:8.1f} ms live -> {stored_analytics * 1e3:.2f} ms stored")
+    print(f"page of 50:        {live_page * 1e3:8.1f} ms live -> {first_page * 1e3:.1f} ms from archive "
+          f"({cached_page * 1e3:.1f} ms once loaded)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Authentication CPU per active user per day: password logins vs. refresh tokens.
+
+Measures the CPU time of a password login (bcrypt verify + JWT) and of a refresh
+token exchange (HMAC lookup + rotation + JWT) against a throwaway SQLite
+database, then scales them by how often an active client has to re-authenticate
+with each scheme. Run from ``backend/``:
+
+    python -m benchmarks.bench_auth --active-hours 8 --users 100000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+os.environ.setdefault("SQL_ECHO", "false")
+
+from core.config import settings
+from core.security import (
+    hash_password, verify_password, create_access_token,
+    new_token_family, issue_refresh_token, rotate_refresh_token
+)
+from database import SessionLocal, create_tables
+from models.user import User
+
+
+def cpu_per_call(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--active-hours", type=float, default=8.0, help="hours per day a client stays signed in")
+    parser.add_argument("--users", type=int, default=100_000, help="daily active users to scale the totals to")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    create_tables()
+    db = SessionLocal()
+    user = User(username="bench", hashed_password=hash_password("benchpass123"), is_active=True)
+    db.add(user)
+    db.commit()
+
+    def password_login():
+        row = db.query(User).filter(User.username == "bench").first()
+        verify_password("benchpass123", row.hashed_password)
+        create_access_token({"sub": row.username})
+
+    state = {"token": issue_refresh_token(db, user.id, new_token_family())}
+    db.commit()
+
+    def refresh_exchange():
+        row, state["token"], _ = rotate_refresh_token(db, state["token"])
+        create_access_token({"sub": row.username})
+
+    login_s = cpu_per_call(password_login, args.iterations)
+    refresh_s = cpu_per_call(refresh_exchange, args.iterations * 20)
+    db.close()
+
+    renewals = args.active_hours * 60 / settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    # With refresh tokens a daily user types the password once per refresh token lifetime
+    before = renewals * login_s
+    after = renewals * refresh_s + login_s / settings.REFRESH_TOKEN_EXPIRE_DAYS
+
+    print(f"password login:   {login_s * 1e3:8.2f} ms CPU")
+    print(f"refresh exchange: {refresh_s * 1e3:8.2f} ms CPU")
+    print(f"re-authentications per user per day: {renewals:.0f}")
+    print(f"{'':8} {'ms/user/day':>12} {'CPU-hours/day @ ' + str(args.users) + ' users':>32}")
+    print(f"{'before':8} {before * 1e3:12.2f} {before * args.users / 3600:32.2f}")
+    print(f"{'after':8} {after * 1e3:12.2f} {after * args.users / 3600:32.2f}")
+    print(f"reduction: {before / after:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Storage size and decode throughput of the survey response encodings.
+
+Encodes synthetic responses (ratings, booleans, free text and multiple choice
+answers keyed by realistic question ids) with each RESPONSE_ENCODING, then
+stores them in a throwaway SQLite table to compare on-disk size and the time to
+load every row back through the ORM column type. Run from ``backend/``:
+
+    python -m benchmarks.bench_encoding --responses 50000 --questions 12
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+from sqlalchemy import create_engine, Column, Integer, JSON, MetaData, Table, select
+
+from utils.response_codec import CODECS, EncodedResponses, get_codec
+
+WORDS = "great slow support price quality app crash love hate fast easy team checkout delivery".split()
+CHOICES = ["Email", "Phone", "Chat", "In store", "Social media", "Other"]
+
+
+def build_responses(n_responses: int, n_questions: int, first_question_id: int = 48_000) -> list:
+    kinds = [("rating", "text", "choice", "boolean")[i % 4] for i in range(n_questions)]
+    rows = []
+    for _ in range(n_responses):
+        row = {}
+        for i, kind in enumerate(kinds):
+            question_id = str(first_question_id + i)
+            if kind == "rating":
+                row[question_id] = random.randint(1, 5)
+            elif kind == "text":
+                row[question_id] = " ".join(random.choices(WORDS, k=random.randint(3, 20)))
+            elif kind == "choice":
+                row[question_id] = random.sample(CHOICES, random.randint(1, 3))
+            else:
+                row[question_id] = random.choice(["yes", "no"])
+        rows.append(row)
+    return rows
+
+
+def available_codecs() -> list:
+    names = []
+    for name in CODECS:
+        try:
+            get_codec(name)
+        except RuntimeError as exc:
+            print(f"skipping {name}: {exc}")
+            continue
+        names.append(name)
+    return names
+
+
+def measure_codec(name: str, rows: list, repeat: int) -> dict:
+    codec = get_codec(name)
+    start = time.perf_counter()
+    encoded = [codec.encode(row) for row in rows]
+    encode_s = time.perf_counter() - start
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in encoded:
+            codec.decode(data)
+        best = min(best, time.perf_counter() - start)
+    return {
+        "bytes": sum(len(data) for data in encoded),
+        "encode_rows_s": len(rows) / encode_s,
+        "decode_rows_s": len(rows) / best,
+    }
+
+
+def measure_table(name: str, rows: list, directory: str) -> dict:
+    path = os.path.join(directory, f"bench_encoding_{name}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = create_engine(f"sqlite:///{path}")
+    table = Table(
+        "survey_responses", MetaData(),
+        Column("id", Integer, primary_key=True),
+        Column("responses", JSON if name == "json" else EncodedResponses(name)),
+    )
+    table.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(table.insert(), [{"responses": row} for row in rows])
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+        start = time.perf_counter()
+        loaded = conn.execute(select(table.c.responses)).scalars().all()
+        load_s = time.perf_counter() - start
+    engine.dispose()
+    size = os.path.getsize(path)
+    os.remove(path)
+    assert len(loaded) == len(rows)
+    return {"file_bytes": size, "load_rows_s": len(rows) / load_s}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=50_000)
+    parser.add_argument("--questions", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    rows = build_responses(args.responses, args.questions)
+    directory = tempfile.mkdtemp()
+
+    print(f"{args.responses} responses x {args.questions} questions")
+    print(f"{'encoding':10} {'payload MB':>11} {'vs json':>8} {'db file MB':>11} "
+          f"{'encode r/s':>11} {'decode r/s':>11} {'db load r/s':>12}")
+    baseline = None
+    for name in available_codecs():
+        codec_stats = measure_codec(name, rows, args.repeat)
+        table_stats = measure_table(name, rows, directory)
+        baseline = baseline or codec_stats["bytes"]
+        print(f"{name:10} {codec_stats['bytes'] / 1e6:11.2f} {codec_stats['bytes'] / baseline:8.2f} "
+              f"{table_stats['file_bytes'] / 1e6:11.2f} {codec_stats['encode_rows_s']:11.0f} "
+              f"{codec_stats['decode_rows_s']:11.0f} {table_stats['load_rows_s']:12.0f}")
+    os.rmdir(directory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Response ingest benchmark: per-request commit vs. buffered group commit.
+
+Drives only ``POST /surveys/{id}/respond`` through the in-process load test for
+each ingest mode and ack policy and reports throughput and latency. Run from
+``backend/``:
+
+    python -m benchmarks.bench_ingest --duration 10 --concurrency 64
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+
+from benchmarks.bench_load import configure_environment, seed, drive, summarize
+
+ROUTE = "POST /surveys/{id}/respond"
+MODES = (
+    ("direct", "flush"),
+    ("buffered", "flush"),
+    ("buffered", "enqueue"),
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--surveys", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--fsync", action="store_true", help="fsync the spill journal on every enqueue")
+    args = parser.parse_args(argv)
+
+    configure_environment()
+    from core.config import settings
+    from services.response_buffer import ResponseBuffer
+    import services.response_buffer as response_buffer_module
+    from database import SessionLocal
+
+    fixtures = seed(args.users, args.surveys, 0)
+    spill_path = os.path.join(tempfile.gettempdir(), "bench_ingest.journal")
+
+    print(f"{'mode':20} {'reqs':>7} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8} {'errs':>5}")
+    for mode, ack in MODES:
+        settings.RESPONSE_INGEST_MODE = mode
+        settings.RESPONSE_ACK_POLICY = ack
+        buffer = None
+        if mode == "buffered":
+            buffer = ResponseBuffer(SessionLocal, batch_size=args.batch_size,
+                                    spill_path=spill_path, fsync=args.fsync).start()
+            response_buffer_module.response_buffer = buffer
+        try:
+            latencies, errors, elapsed = asyncio.run(
+                drive(fixtures, args.concurrency, args.duration, {ROUTE: 1}))
+        finally:
+            if buffer:
+                buffer.stop()
+        r = summarize(latencies, errors, elapsed)[ROUTE]
+        print(f"{mode + '/' + ack:20} {r['requests']:7d} {r['rps']:8.1f} {r['p50_ms']:8.1f} "
+              f"{r['p95_ms']:8.1f} {r['p99_ms']:8.1f} {r['errors']:5d}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+In-process load test for the FastAPI backend.
+
+Seeds a database with users, surveys and responses, then drives the
+register/login/respond/analytics/analyze flows concurrently against the ASGI app
+(no network, no server) and reports p50/p95/p99 latency and RPS per route. The
+database is LOAD_TEST_DATABASE_URL, else DATABASE_URL, else a throwaway SQLite
+file; its tables are dropped and recreated. Run from ``backend/``:
+
+    python -m benchmarks.bench_load --users 50 --surveys 20 --responses 5000 --duration 20
+    python -m benchmarks.bench_load --update-baseline      # record baselines.json
+    python -m benchmarks.bench_load --check                # exit 1 on regression
+
+Latencies only compare on the machine that recorded them, so baselines.json is
+not committed: record it on the CI runner (or your own machine) and keep it
+there. It stores the run's parameters and --check refuses a run with different
+ones. A route regresses when its p95 is more than --tolerance (default 25%)
+above the baseline, its RPS more than --tolerance below it, it had failed
+requests or it was not driven at all.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+import httpx
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+PASSWORD = "loadtest-password"
+WORDS = "great slow support price quality app crash love hate fast easy team checkout".split()
+
+# Relative weight of each flow in the traffic mix
+ROUTE_MIX = {
+    "POST /auth/register": 1,
+    "POST /auth/token": 2,
+    "POST /surveys/{id}/respond": 12,
+    "GET /surveys/{id}": 10,
+    "GET /surveys/analytics/{id}": 2,
+    "POST /surveys/analyze": 1,
+}
+
+
+def configure_environment():
+    """
+    Point the app at the load test's database before anything imports it. Call
+    first thing in main(): importing this module must not touch the environment.
+    """
+    load_test_url = os.getenv("LOAD_TEST_DATABASE_URL")
+    if load_test_url:
+        os.environ["DATABASE_URL"] = load_test_url
+    os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "survey_load_test.db"))
+    os.environ.setdefault("SQL_ECHO", "false")
+    # Every simulated client shares one address; measure handlers, not the limiter
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+
+def seed(n_users: int, n_surveys: int, n_responses: int) -> dict:
+    """
+    Create a fresh database and bulk-load users, surveys and responses
+    """
+    from database import Base, engine, SessionLocal
+    from core.security import hash_password, create_access_token
+    from models.user import User
+    from models.survey import Survey, Question, SurveyResponse, QuestionType
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    try:
+        hashed = hash_password(PASSWORD)  # one bcrypt round for every seeded user
+        users = [
+            User(username=f"user{i}", email=f"user{i}@example.com", hashed_password=hashed,
+                 role="user", is_active=True)
+            for i in range(n_users)
+        ]
+        db.add_all(users)
+        db.flush()
+
+        surveys = []
+        for i in range(n_surveys):
+            survey = Survey(title=f"Load survey {i}", description="seeded",
+                            created_by=users[i % n_users].id)
+            survey.questions = [
+                Question(question_text="Rate us", question_type=QuestionType.RATING),
+                Question(question_text="Why?", question_type=QuestionType.TEXT),
+            ]
+            surveys.append(survey)
+        db.add_all(surveys)
+        db.flush()
+
+        db.bulk_insert_mappings(SurveyResponse, [
+            {
+                "survey_id": survey.id,
+                "respondent_id": users[random.randrange(n_users)].id,
+                "responses": random_answers([q.id for q in survey.questions]),
+            }
+            for survey in (random.choice(surveys) for _ in range(n_responses))
+        ])
+        db.commit()
+
+        return {
+            "users": [u.username for u in users],
+            "tokens": {u.id: create_access_token(data={"sub": u.username}) for u in users},
+            "surveys": [
+                {"id": s.id, "owner": s.created_by, "questions": [q.id for q in s.questions]}
+                for s in surveys
+            ],
+        }
+    finally:
+        db.close()
+
+
+def random_answers(question_ids: list) -> dict:
+    rating_id, text_id = question_ids
+    return {
+        rating_id: random.randint(1, 5),
+        text_id: " ".join(random.choices(WORDS, k=random.randint(3, 15))),
+    }
+
+
+def feedback_csv(rows: int = 200) -> bytes:
+    lines = ["feedback"] + [" ".join(random.choices(WORDS, k=8)) for _ in range(rows)]
+    return "\n".join(lines).encode()
+
+
+class Flows:
+    """
+    Issues one request of the given route against randomly picked seeded data
+    """
+
+    def __init__(self, client: httpx.AsyncClient, fixtures: dict):
+        self.client = client
+        self.fixtures = fixtures
+        self.user_ids = list(fixtures["tokens"])
+        self.csv = feedback_csv()
+        self.counter = 0
+
+    def auth(self, user_id=None) -> dict:
+        user_id = user_id or random.choice(self.user_ids)
+        return {"Authorization": f"Bearer {self.fixtures['tokens'][user_id]}"}
+
+    async def call(self, route: str) -> httpx.Response:
+        survey = random.choice(self.fixtures["surveys"])
+        if route == "POST /auth/register":
+            self.counter += 1
+            name = f"new{os.getpid()}_{self.counter}_{random.randrange(1 << 30)}"
+            return await self.client.post("/auth/register", data={"username": name, "password": PASSWORD})
+        if route == "POST /auth/token":
+            name = random.choice(self.fixtures["users"])
+            return await self.client.post("/auth/token", data={"username": name, "password": PASSWORD})
+        if route == "POST /surveys/{id}/respond":
+            body = {"survey_id": survey["id"], "responses": random_answers(survey["questions"])}
+            return await self.client.post(f"/surveys/{survey['id']}/respond", json=body, headers=self.auth())
+        if route == "GET /surveys/{id}":
+            return await self.client.get(f"/surveys/{survey['id']}", headers=self.auth())
+        if route == "GET /surveys/analytics/{id}":
+            return await self.client.get(f"/surveys/analytics/{survey['id']}",
+                                         headers=self.auth(survey["owner"]))
+        if route == "POST /surveys/analyze":
+            return await self.client.post("/surveys/analyze", headers=self.auth(),
+                                          files={"file": ("feedback.csv", self.csv, "text/csv")})
+        raise ValueError(route)
+
+
+async def drive(fixtures: dict, concurrency: int, duration: float, routes: dict) -> tuple:
+    from main import app
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    labels, weights = zip(*routes.items())
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        flows = Flows(client, fixtures)
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                route = random.choices(labels, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await flows.call(route)
+                    ok = response.status_code < 400
+                except Exception:
+                    ok = False
+                latencies[route].append(time.perf_counter() - start)
+                if not ok:
+                    errors[route] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return latencies, errors, elapsed
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies: dict, errors: dict, elapsed: float) -> dict:
+    report = {}
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        report[route] = {
+            "requests": len(values),
+            "errors": errors.get(route, 0),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"{'route':30} {'reqs':>7} {'errs':>5} {'rps':>8} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}")
+    for route, r in report.items():
+        print(f"{route:30} {r['requests']:7d} {r['errors']:5d} {r['rps']:8.1f} "
+              f"{r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f}")
+
+
+def run_parameters(args) -> dict:
+    """
+    The options that shape the load; a baseline only compares with the same ones
+    """
+    return {name: getattr(args, name) for name in ("users", "surveys", "responses", "concurrency", "duration", "routes")}
+
+
+def check_regressions(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare p95 latency and RPS per route against the stored baseline
+    """
+    failures = []
+    for route, base in baseline.items():
+        current = report.get(route)
+        if current is None:
+            failures.append(f"{route}: in the baseline but not driven")
+            continue
+        if current["errors"]:
+            failures.append(f"{route}: {current['errors']} failed requests")
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            failures.append(f"{route}: p95 {current['p95_ms']:.1f}ms > baseline {base['p95_ms']:.1f}ms")
+        if current["rps"] < base["rps"] * (1 - tolerance):
+            failures.append(f"{route}: {current['rps']:.1f} rps < baseline {base['rps']:.1f} rps")
+    return failures
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--surveys", type=int, default=20)
+    parser.add_argument("--responses", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of load")
+    parser.add_argument("--routes", nargs="*", help="subset of routes to drive (default: full mix)")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--check", action="store_true", help="fail on regression against baselines.json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative regression of p95 latency and RPS (0.25 = 25%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="record this run as baselines.json")
+    args = parser.parse_args(argv)
+    configure_environment()
+
+    baseline = None
+    if args.check:
+        if not os.path.exists(BASELINE_PATH):
+            parser.error(f"no baseline at {BASELINE_PATH}; record one on this machine with --update-baseline")
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != run_parameters(args):
+            parser.error(f"the baseline was recorded with {baseline.get('parameters')}; "
+                         f"rerun with those options or record a new baseline")
+
+    routes = {r: w for r, w in ROUTE_MIX.items() if not args.routes or r in args.routes}
+    fixtures = seed(args.users, args.surveys, args.responses)
+    latencies, errors, elapsed = asyncio.run(drive(fixtures, args.concurrency, args.duration, routes))
+    report = summarize(latencies, errors, elapsed)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump({
+                "parameters": run_parameters(args),
+                "routes": {r: {"p95_ms": round(v["p95_ms"], 1), "rps": round(v["rps"], 2)} for r, v in report.items()}
+            }, f, indent=2)
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    if baseline is not None:
+        failures = check_regressions(report, baseline["routes"], args.tolerance)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        return 1 if failures else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
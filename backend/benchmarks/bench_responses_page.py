@@ -0,0 +1,101 @@
+"""
+Latency of one page of GET /surveys/{id}/responses at increasing depth:
+keyset pagination on (submitted_at, id) against LIMIT/OFFSET.
+
+Seeds a throwaway SQLite database with one survey's responses (1M by default),
+then times fetching a page that starts N rows deep with each approach, both
+with the service's own query and with the OFFSET query it replaces. Run from
+``backend/``:
+
+    python -m benchmarks.bench_responses_page --responses 1000000 --limit 50
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench_responses_page.db")
+os.environ.setdefault("SQL_ECHO", "false")
+os.environ.setdefault("RESPONSE_ENCODING", "json")
+
+from database import SessionLocal, create_tables, engine
+from models.survey import SurveyResponse
+from services.survey_service import list_responses, encode_cursor
+from benchmarks.bench_encoding import build_responses
+
+SURVEY_ID = 1
+
+
+def seed(n_responses: int, batch_size: int = 50_000):
+    create_tables()
+    start = datetime(2025, 1, 1)
+    answers = build_responses(1000, 12)
+    table = SurveyResponse.__table__
+    with engine.begin() as conn:
+        for offset in range(0, n_responses, batch_size):
+            conn.execute(table.insert(), [
+                {
+                    "survey_id": SURVEY_ID,
+                    "respondent_id": random.randint(1, 10_000),
+                    "responses": answers[i % len(answers)],
+                    "submitted_at": start + timedelta(seconds=i * 30),
+                }
+                for i in range(offset, min(offset + batch_size, n_responses))
+            ])
+        conn.exec_driver_sql("ANALYZE")
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    started = time.perf_counter()
+    seed(args.responses)
+    print(f"seeded {args.responses} responses in {time.perf_counter() - started:.1f}s")
+
+    db = SessionLocal()
+    newest_first = db.query(SurveyResponse.submitted_at, SurveyResponse.id).filter(
+        SurveyResponse.survey_id == SURVEY_ID
+    ).order_by(SurveyResponse.submitted_at.desc(), SurveyResponse.id.desc())
+
+    depths = [0, 1_000, 10_000, 100_000, args.responses // 2, args.responses - args.limit]
+    print(f"{'depth':>10} {'keyset ms':>10} {'offset ms':>10}")
+    for depth in sorted({d for d in depths if 0 <= d < args.responses}):
+        # The cursor a client would hold after paging down to `depth`
+        cursor = None
+        if depth:
+            submitted_at, response_id = newest_first.offset(depth - 1).limit(1).one()
+            cursor = encode_cursor(submitted_at, response_id)
+
+        def keyset():
+            list_responses(db, SURVEY_ID, args.limit, cursor=cursor)
+
+        def offset():
+            db.query(SurveyResponse).filter(SurveyResponse.survey_id == SURVEY_ID).order_by(
+                SurveyResponse.submitted_at.desc(), SurveyResponse.id.desc()
+            ).offset(depth).limit(args.limit).all()
+
+        print(f"{depth:10} {best_of(keyset, args.repeat) * 1e3:10.2f} {best_of(offset, args.repeat) * 1e3:10.2f}")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Segment filters and cross-tabs: bitmap index against re-scanning the answers.
+
+Builds synthetic responses, indexes their rating, choice and yes/no questions,
+then times "rating 4 or 5 and answered yes" plus a rating x channel cross-tab
+both with SegmentIndex and with a pass over every response dict, which is what
+answering it from the stored JSON costs. Run from ``backend/``:
+
+    python -m benchmarks.bench_segments --responses 200000
+"""
+import sys
+import time
+import random
+import argparse
+from collections import Counter
+
+from benchmarks.bench_encoding import build_responses
+from utils.segments import SegmentIndex
+
+FIRST_QUESTION = 48_000
+RATING, CHOICE, YES_NO = str(FIRST_QUESTION), str(FIRST_QUESTION + 2), str(FIRST_QUESTION + 3)
+
+
+def scan(rows: list) -> tuple:
+    matched = [r for r in rows if r[RATING] in (4, 5) and r[YES_NO] == "yes"]
+    table = Counter((r[RATING], choice) for r in matched for choice in r[CHOICE])
+    return len(matched), table
+
+
+def indexed(index: SegmentIndex) -> tuple:
+    selected = index.select([[(RATING, 4), (RATING, 5)], [(YES_NO, "yes")]])
+    return selected.bit_count(), index.crosstab(RATING, CHOICE, selected)
+
+
+def best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--responses", type=int, default=200_000)
+    parser.add_argument("--questions", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    random.seed(7)
+    rows = build_responses(args.responses, args.questions, FIRST_QUESTION)
+    index = SegmentIndex(q for q in rows[0] if int(q) % 4 != 1)  # everything but the text questions
+
+    started = time.perf_counter()
+    index.add(enumerate(rows, start=1))
+    build_s = time.perf_counter() - started
+    assert indexed(index)[0] == scan(rows)[0]
+
+    scan_s = best_of(lambda: scan(rows), args.repeat)
+    index_s = best_of(lambda: indexed(index), args.repeat)
+    print(f"{args.responses} responses, {len(index.questions)} indexed questions")
+    print(f"index build:          {build_s * 1e3:9.1f} ms (once, then extended per new response)")
+    print(f"scan filter+crosstab: {scan_s * 1e3:9.2f} ms")
+    print(f"index filter+crosstab:{index_s * 1e3:9.2f} ms")
+    print(f"speedup: {scan_s / index_s:.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
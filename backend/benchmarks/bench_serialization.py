@@ -0,0 +1,104 @@
+"""
+Microbenchmark of the response serialization path per endpoint.
+
+Compares the Pydantic ``from_attributes`` + stdlib JSON path against the direct
+ORM-row-to-dict serializers rendered with orjson. Run from ``backend/``:
+
+    python -m benchmarks.bench_serialization --questions 50 --responses 2000
+"""
+import os
+import argparse
+import random
+import timeit
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.user import User  # noqa: F401  (registers the mapper)
+from models.survey import Survey, Question, SurveyResponse, QuestionType
+from schemas.survey import Survey as SurveySchema, SurveyResponseOut
+from utils.analytics import analyze_survey_responses
+from utils.serializers import survey_to_dict, surveys_to_list, survey_response_to_dict
+from core.responses import FastJSONResponse
+
+WORDS = "great slow support price quality app crash love hate fast easy team".split()
+
+
+def build_survey(survey_id: int, n_questions: int) -> Survey:
+    survey = Survey(
+        id=survey_id, title=f"Survey {survey_id}", description="benchmark",
+        created_at=datetime.utcnow(), created_by=1
+    )
+    survey.questions = [
+        Question(
+            id=survey_id * 1000 + i, survey_id=survey_id, question_text=f"Question {i}",
+            question_type=QuestionType.TEXT, options=None
+        )
+        for i in range(n_questions)
+    ]
+    return survey
+
+
+def build_responses(n_responses: int) -> list:
+    return [
+        {'responses': {
+            '1': random.randint(1, 5),
+            '2': ' '.join(random.choices(WORDS, k=12)),
+            '3': random.sample(WORDS, 2)
+        }}
+        for _ in range(n_responses)
+    ]
+
+
+def pydantic_render(schema, obj) -> bytes:
+    model = schema.model_validate(obj)
+    return JSONResponse(jsonable_encoder(model)).body
+
+
+def run(n_questions: int, n_surveys: int, n_responses: int, number: int):
+    survey = build_survey(1, n_questions)
+    surveys = [build_survey(i, n_questions) for i in range(n_surveys)]
+    response_row = SurveyResponse(
+        id=1, survey_id=1, respondent_id=1,
+        responses={i: 'answer' for i in range(n_questions)}, submitted_at=datetime.utcnow()
+    )
+    analytics = analyze_survey_responses(build_responses(n_responses))
+
+    cases = {
+        'GET /surveys/{id}': (
+            lambda: pydantic_render(SurveySchema, survey),
+            lambda: FastJSONResponse(survey_to_dict(survey)).body
+        ),
+        'GET /surveys/list': (
+            lambda: JSONResponse(jsonable_encoder(
+                [SurveySchema.model_validate(s) for s in surveys])).body,
+            lambda: FastJSONResponse(surveys_to_list(surveys)).body
+        ),
+        'POST /surveys/{id}/respond': (
+            lambda: pydantic_render(SurveyResponseOut, response_row),
+            lambda: FastJSONResponse(survey_response_to_dict(response_row)).body
+        ),
+        'GET /surveys/analytics/{id}': (
+            lambda: JSONResponse(jsonable_encoder(analytics)).body,
+            lambda: FastJSONResponse(analytics).body
+        ),
+    }
+
+    print(f"{'endpoint':32} {'pydantic+json':>14} {'orjson direct':>14} {'speedup':>8}")
+    for name, (baseline, fast) in cases.items():
+        base_t = min(timeit.repeat(baseline, number=number, repeat=3)) / number
+        fast_t = min(timeit.repeat(fast, number=number, repeat=3)) / number
+        print(f"{name:32} {base_t * 1e6:12.1f}us {fast_t * 1e6:12.1f}us {base_t / fast_t:7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--questions", type=int, default=50)
+    parser.add_argument("--surveys", type=int, default=20)
+    parser.add_argument("--responses", type=int, default=2000)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    run(args.questions, args.surveys, args.responses, args.number)
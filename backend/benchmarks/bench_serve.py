@@ -0,0 +1,168 @@
+"""
+Throughput of `python -m serve` per worker count on a mixed workload.
+
+Seeds a throwaway SQLite database with a survey and its responses, starts the
+server with each worker count in turn and drives it from separate client
+processes for a fixed time: mostly cheap survey reads (cached definition) plus
+a share of analytics requests, which are CPU-bound pandas work. Reports
+requests per second and the latency of the cheap requests, which is what a
+single process lets the analytics requests ruin. Run from ``backend/``:
+
+    python -m benchmarks.bench_serve --workers 1 2 4 --clients 16 --seconds 15
+"""
+import os
+import sys
+import time
+import random
+import socket
+import argparse
+import tempfile
+import subprocess
+import http.client
+from multiprocessing import Pool
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_serve.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + DB_PATH
+os.environ.setdefault("SQL_ECHO", "false")
+
+from benchmarks.bench_encoding import CHOICES
+
+
+def seed(n_responses: int):
+    from core.security import hash_password, create_access_token
+    from database import SessionLocal, create_tables
+    from models.user import User
+    from models.survey import Survey, Question, QuestionType, SurveyResponse
+
+    create_tables()
+    db = SessionLocal()
+    user = User(username="bench", hashed_password=hash_password("benchpass123"), is_active=True)
+    db.add(user)
+    db.flush()
+    survey = Survey(title="Bench", description="", created_by=user.id)
+    db.add(survey)
+    db.flush()
+    questions = [
+        Question(survey_id=survey.id, question_text=f"Q{i}", question_type=kind)
+        for i, kind in enumerate([QuestionType.RATING, QuestionType.MULTIPLE_CHOICE] * 3)
+    ]
+    db.add_all(questions)
+    db.flush()
+    db.add_all([
+        SurveyResponse(survey_id=survey.id, responses={
+            str(q.id): random.randint(1, 5) if q.question_type == QuestionType.RATING else random.choice(CHOICES)
+            for q in questions
+        })
+        for _ in range(n_responses)
+    ])
+    db.commit()
+    survey_id = survey.id
+    db.close()
+    return survey_id, create_access_token({"sub": "bench"})
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def client(job) -> tuple:
+    port, survey_id, token, seconds, analytics_share, seed_value = job
+    rng = random.Random(seed_value)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {"Authorization": f"Bearer {token}"}
+    cheap, heavy, errors = [], 0, 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        analytics = rng.random() < analytics_share
+        path = f"/surveys/analytics/{survey_id}" if analytics else f"/surveys/{survey_id}"
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            ok = False
+        elapsed = time.perf_counter() - started
+        if not ok:
+            errors += 1
+        elif analytics:
+            heavy += 1
+        else:
+            cheap.append(elapsed)
+    conn.close()
+    return cheap, heavy, errors
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else float("nan")
+
+
+def run(workers: int, args, survey_id: int, token: str) -> dict:
+    port = free_port()
+    env = {**os.environ, "RATE_LIMIT_ENABLED": "false", "MAX_CONCURRENT_REQUESTS": "0", "METRICS_ENABLED": "false"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "serve", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--no-access-log", "--log-level", "warning", "--max-requests", "0"],
+        env=env
+    )
+    try:
+        wait_until_up(port)
+        jobs = [(port, survey_id, token, args.seconds, args.analytics_share, i) for i in range(args.clients)]
+        with Pool(args.clients) as pool:
+            results = pool.map(client, jobs)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    cheap = [latency for latencies, _, _ in results for latency in latencies]
+    heavy = sum(count for _, count, _ in results)
+    return {
+        "rps": (len(cheap) + heavy) / args.seconds,
+        "analytics_rps": heavy / args.seconds,
+        "p50": percentile(cheap, 0.5),
+        "p99": percentile(cheap, 0.99),
+        "errors": sum(errors for _, _, errors in results),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--responses", type=int, default=2000)
+    parser.add_argument("--analytics-share", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    random.seed(7)
+    survey_id, token = seed(args.responses)
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, {args.analytics_share:.0%} analytics requests "
+          f"over {args.responses} responses")
+    print(f"{'workers':>7} {'req/s':>8} {'analytics/s':>12} {'read p50 ms':>12} {'read p99 ms':>12} {'errors':>7}")
+    for workers in args.workers:
+        stats = run(workers, args, survey_id, token)
+        print(f"{workers:7} {stats['rps']:8.1f} {stats['analytics_rps']:12.1f} "
+              f"{stats['p50'] * 1e3:12.1f} {stats['p99'] * 1e3:12.1f} {stats['errors']:7}")
+    os.remove(DB_PATH)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
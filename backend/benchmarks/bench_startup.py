@@ -0,0 +1,84 @@
+"""
+Startup-time benchmark: cost of importing the app in a fresh interpreter.
+
+Runs ``import main`` in subprocesses with ``-X importtime``, reports the median
+wall time, the slowest top-level imports, and whether any of the ML stack was
+pulled in eagerly. Run from ``backend/``:
+
+    python -m benchmarks.bench_startup --runs 5 --max-ms 1500
+"""
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+
+HEAVY_MODULES = ("numpy", "pandas", "sklearn", "scipy", "textblob")
+PROBE = (
+    "import sys, main; "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+)
+
+
+def run_once(env: dict) -> tuple:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+    return elapsed, proc.stdout.strip(), proc.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list:
+    """
+    Parse ``-X importtime`` output into (cumulative_us, module) for the modules
+    ``main`` imports directly
+    """
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, help="fail if the median import exceeds this")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'startup_bench.db')}")
+    env.setdefault("SQL_ECHO", "false")
+
+    timings, heavy, log = [], "", ""
+    for _ in range(args.runs):
+        elapsed, heavy, log = run_once(env)
+        timings.append(elapsed * 1000)
+
+    median = statistics.median(timings)
+    print(f"import main: median {median:.0f}ms, min {min(timings):.0f}ms over {args.runs} runs")
+    print(f"ML modules loaded at import: {heavy or 'none'}")
+    print("slowest imports made by main (cumulative):")
+    for cumulative, name in slowest_imports(log, args.top):
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    if heavy:
+        return 1
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"FAIL median {median:.0f}ms > {args.max_ms:.0f}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import threading
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+# tracemalloc is process-wide: the first allocation-tracking profiler starts it and
+# the last one to finish stops it, unless something else was already tracing
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+
+
+class SamplingProfiler:
+    """
+    Stack sampler that runs in a background thread while a request is in flight.
+
+    Samples every thread in the process (sync endpoints run in the threadpool, so
+    the request cannot be pinned to one thread) and writes collapsed stacks that
+    flamegraph.pl and speedscope read directly. The allocation peak is likewise
+    process-wide: it includes requests profiled at the same time.
+    """
+
+    def __init__(self, interval: float = 0.005, track_allocations: bool = False):
+        self.interval = interval
+        self.track_allocations = track_allocations
+        self.samples: Counter = Counter()
+        self.allocation_peak: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        global _tracing_users, _started_tracing
+        if self.track_allocations:
+            with _tracing_lock:
+                if _tracing_users == 0:
+                    if not tracemalloc.is_tracing():
+                        tracemalloc.start()
+                        _started_tracing = True
+                    tracemalloc.reset_peak()
+                _tracing_users += 1
+        self._thread.start()
+        return self
+
+    def stop(self):
+        global _tracing_users, _started_tracing
+        self._stop.set()
+        self._thread.join()
+        if self.track_allocations:
+            with _tracing_lock:
+                self.allocation_peak = tracemalloc.get_traced_memory()[1]
+                _tracing_users -= 1
+                if _tracing_users == 0 and _started_tracing:
+                    tracemalloc.stop()
+                    _started_tracing = False
+
+    def dump(self, directory: str, label: str) -> str:
+        os.makedirs(directory, exist_ok=True)
+        safe_label = "".join(c if c.isalnum() else "_" for c in label).strip("_")
+        path = os.path.join(directory, f"{int(time.time() * 1000)}-{safe_label}.folded")
+        with open(path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
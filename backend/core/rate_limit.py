@@ -0,0 +1,221 @@
+import time
+import asyncio
+import threading
+from importlib import import_module
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+from jose import jwt, JWTError
+from starlette.responses import JSONResponse
+
+from core.config import settings
+from core.metrics import registry
+
+RATE_LIMIT_REJECTIONS = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by a token bucket", ("scope",))
+LOAD_SHED = registry.counter(
+    "load_shed_total", "Requests shed by the concurrency limiter", ("reason",))
+IN_FLIGHT = registry.gauge("http_requests_in_flight", "Requests currently admitted")
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_rate(rate: str) -> Tuple[float, float]:
+    """
+    Parse "10/minute" into (tokens per second, bucket capacity)
+    """
+    count, period = rate.split("/")
+    count = float(count)
+    return count / PERIODS[period.strip()], count
+
+
+class RateLimitStore:
+    """
+    Token-bucket storage. Subclass for a shared backend (e.g. Redis) and point
+    RATE_LIMIT_BACKEND at it as "module:ClassName".
+    """
+
+    def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `cost` tokens from the bucket; returns (allowed, seconds until allowed)
+        """
+        raise NotImplementedError
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """
+    Per-process buckets; limits are per worker when running several workers
+    """
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, rate: float, capacity: float, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                bucket = self._buckets[key] = [capacity, now, rate, capacity]
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (cost - tokens) / rate
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping
+        full = [k for k, (tokens, ts, rate, cap) in self._buckets.items() if tokens + (now - ts) * rate >= cap]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+
+def _load_store() -> RateLimitStore:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return InMemoryRateLimitStore()
+    module_name, class_name = settings.RATE_LIMIT_BACKEND.split(":")
+    return getattr(import_module(module_name), class_name)()
+
+
+store = _load_store()
+
+
+def client_ip(request: Request) -> str:
+    if settings.TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def token_subject(request: Request) -> Optional[str]:
+    """
+    Username from the bearer token without a database lookup
+    """
+    auth = request.headers.get("Authorization", "")
+    if not auth.lower().startswith("bearer "):
+        return None
+    try:
+        return jwt.decode(auth[7:], settings.SECRET_KEY, algorithms=[settings.ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+async def ip_key(request: Request) -> str:
+    return client_ip(request)
+
+
+async def user_key(request: Request) -> str:
+    # Anonymous callers fall back to their IP
+    return token_subject(request) or f"ip:{client_ip(request)}"
+
+
+async def form_username_key(request: Request) -> Optional[str]:
+    form = await request.form()
+    return form.get("username")
+
+
+async def survey_key(request: Request) -> Optional[str]:
+    return request.path_params.get("survey_id")
+
+
+class RateLimit:
+    """
+    FastAPI dependency enforcing one token bucket per key
+    """
+
+    def __init__(self, scope: str, rate: str, key_func: Callable):
+        self.scope = scope
+        self.rate, self.capacity = parse_rate(rate)
+        self.key_func = key_func
+
+    async def __call__(self, request: Request):
+        if not settings.RATE_LIMIT_ENABLED:
+            return
+        key = await self.key_func(request)
+        if key is None:
+            return
+        allowed, retry_after = store.consume(f"{self.scope}:{key}", self.rate, self.capacity)
+        if not allowed:
+            RATE_LIMIT_REJECTIONS.inc(self.scope)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, int(retry_after + 0.999)))}
+            )
+
+
+login_limits = [
+    RateLimit("login_ip", settings.RATE_LIMIT_LOGIN_PER_IP, ip_key),
+    RateLimit("login_user", settings.RATE_LIMIT_LOGIN_PER_USER, form_username_key),
+]
+register_limits = [RateLimit("register_ip", settings.RATE_LIMIT_REGISTER_PER_IP, ip_key)]
+respond_limits = [
+    RateLimit("respond_ip", settings.RATE_LIMIT_RESPOND_PER_IP, ip_key),
+    RateLimit("respond_user", settings.RATE_LIMIT_RESPOND_PER_USER, user_key),
+    RateLimit("respond_survey", settings.RATE_LIMIT_RESPOND_PER_SURVEY, survey_key),
+]
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Admit at most `max_concurrent` requests; up to `max_queued` more wait for at
+    most `queue_timeout` seconds, everything beyond that is shed with a 503.
+    Paths ending in one of `exempt_suffixes` (long-lived streams) bypass the limit.
+    """
+
+    def __init__(self, app, max_concurrent: int, max_queued: int, queue_timeout: float,
+                 exempt_suffixes: tuple = ()):
+        self.app = app
+        self.exempt_suffixes = exempt_suffixes
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or self.max_concurrent <= 0
+                or scope["path"].endswith(self.exempt_suffixes)):
+            await self.app(scope, receive, send)
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queued:
+                await self._shed(scope, receive, send, "queue_full")
+                return
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await self._shed(scope, receive, send, "queue_timeout")
+                return
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            IN_FLIGHT.dec()
+            self._semaphore.release()
+
+    async def _shed(self, scope, receive, send, reason: str):
+        LOAD_SHED.inc(reason)
+        response = JSONResponse(
+            {"detail": "Server is busy, retry later"},
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"}
+        )
+        await response(scope, receive, send)
@@ -1,11 +1,15 @@
+import hmac
+import hashlib
+import secrets
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 import bcrypt
 from sqlalchemy.orm import Session
 
-from models.user import User
+from models.user import User, RefreshToken
 from core.config import settings
 from database import get_db
 
@@ -29,6 +33,107 @@ def create_access_token(data: dict):
 	return encoded_jwt
 
 
+def _refresh_token_hash(token: str) -> bytes:
+	# Refresh tokens are 256 random bits, so a keyed hash is enough; bcrypt would
+	# bring back the per-request cost refresh tokens are meant to avoid
+	return hmac.new(settings.SECRET_KEY.encode(), token.encode(), hashlib.sha256).digest()
+
+
+def new_token_family() -> bytes:
+	"""
+	Identifies one login's refresh tokens; access tokens carry it as `sid`
+	"""
+	return secrets.token_bytes(16)
+
+
+def issue_refresh_token(db: Session, user_id: int, family: bytes) -> str:
+	"""
+	Store a new refresh token for the user in `family` and return it; the
+	caller commits
+	"""
+	token = secrets.token_urlsafe(32)
+	db.add(RefreshToken(
+		token_hash = _refresh_token_hash(token),
+		user_id = user_id,
+		family = family,
+		expires_at = datetime.utcnow() + timedelta(days = settings.REFRESH_TOKEN_EXPIRE_DAYS)
+	))
+	return token
+
+
+def rotate_refresh_token(db: Session, token: str) -> Tuple[User, str, bytes]:
+	"""
+	Exchange a refresh token for its successor; returns the user, the new
+	token and its family. A token that was already exchanged revokes its whole
+	family, since one of the two holders stole it, unless it was exchanged in
+	the last REFRESH_TOKEN_REUSE_GRACE_SECONDS: then it is two tabs sharing one
+	token refreshing at once, and the later one gets a successor of its own.
+	"""
+	invalid = HTTPException(
+		status_code = 401,
+		detail = "Invalid refresh token",
+		headers = {"WWW-Authenticate": "Bearer"},
+	)
+	now = datetime.utcnow()
+	stored = db.query(RefreshToken).filter(RefreshToken.token_hash == _refresh_token_hash(token)).first()
+	if stored is None or stored.expires_at <= now:
+		raise invalid
+
+	# Claim the token with a conditional update so two concurrent exchanges can't both succeed
+	claimed = db.query(RefreshToken).filter(
+		RefreshToken.token_hash == stored.token_hash,
+		RefreshToken.rotated_at.is_(None)
+	).update({RefreshToken.rotated_at: now}, synchronize_session = False)
+	if not claimed:
+		rotated_at = db.query(RefreshToken.rotated_at).filter(RefreshToken.token_hash == stored.token_hash).scalar()
+		grace = timedelta(seconds = settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+		if rotated_at is None or now - rotated_at > grace:
+			db.query(RefreshToken).filter(RefreshToken.family == stored.family).delete(synchronize_session = False)
+			db.commit()
+			raise invalid
+
+	user = db.query(User).filter(User.id == stored.user_id).first()
+	if user is None or not user.is_active:
+		db.rollback()
+		raise invalid
+	new_token = issue_refresh_token(db, user.id, stored.family)
+	db.commit()
+	return user, new_token, stored.family
+
+
+def revoke_refresh_tokens(db: Session, user_id: int, keep_family: Optional[bytes] = None):
+	"""
+	Drop every refresh token of the user, except those of `keep_family`; the
+	caller commits
+	"""
+	query = db.query(RefreshToken).filter(RefreshToken.user_id == user_id)
+	if keep_family is not None:
+		query = query.filter(RefreshToken.family != keep_family)
+	query.delete(synchronize_session = False)
+
+
+def get_session_family(token: str = Depends(oauth2_scheme)) -> Optional[bytes]:
+	"""
+	The refresh token family of the login the access token came from; None for
+	tokens issued without one
+	"""
+	try:
+		sid = jwt.decode(token, settings.SECRET_KEY, algorithms = [settings.ALGORITHM]).get("sid")
+		return bytes.fromhex(sid) if sid else None
+	except (JWTError, ValueError):
+		return None
+
+
+def purge_refresh_tokens(db: Session) -> int:
+	"""
+	Delete expired tokens (exchanged ones are kept until then for reuse detection)
+	"""
+	now = datetime.utcnow()
+	deleted = db.query(RefreshToken).filter(RefreshToken.expires_at <= now).delete(synchronize_session = False)
+	db.commit()
+	return deleted
+
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
 	credentials_exception = HTTPException(
 		status_code = 401,
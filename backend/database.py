@@ -1,17 +1,39 @@
-from sqlalchemy import create_engine
+import time
+import itertools
+from fastapi import Depends, Request
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
 from core.config import settings
+from core.metrics import install_sql_hooks
 
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=3600,
-    echo=True
+    echo=settings.SQL_ECHO
 )
 
+install_sql_hooks(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+replica_engines = [
+    create_engine(url, pool_pre_ping=True, pool_recycle=3600, echo=settings.SQL_ECHO)
+    for url in settings.DATABASE_REPLICA_URLS
+]
+for replica_engine in replica_engines:
+    install_sql_hooks(replica_engine)
+
+ReplicaSessionLocals = [
+    sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+    for replica_engine in replica_engines
+]
+_replica_cycle = itertools.count()
+
+# Authorization header (or client address) -> monotonic deadline for primary-only reads
+_recent_writers = {}
+
 Base = declarative_base()
 
 def get_db() -> Session:
@@ -21,5 +43,57 @@ def get_db() -> Session:
     finally:
         db.close()
 
+def _consistency_key(request: Request) -> str:
+    return request.headers.get("Authorization") or (request.client.host if request.client else "")
+
+def pin_reads_to_primary(request: Request):
+    """
+    Dependency for write routes: route this caller's reads to the primary for
+    READ_YOUR_WRITES_SECONDS so they see their own writes despite replica lag
+    """
+    if not ReplicaSessionLocals:
+        return
+    now = time.monotonic()
+    if len(_recent_writers) > 10_000:
+        for key in [k for k, deadline in _recent_writers.items() if deadline < now]:
+            del _recent_writers[key]
+    _recent_writers[_consistency_key(request)] = now + settings.READ_YOUR_WRITES_SECONDS
+
+def get_read_db(request: Request, primary: Session = Depends(get_db)) -> Session:
+    """
+    Session for read-only routes: a replica (round robin) unless there are none,
+    the caller wrote recently, or sent `X-Read-Consistency: primary`
+    """
+    if not ReplicaSessionLocals or request.headers.get("X-Read-Consistency") == "primary":
+        yield primary
+        return
+    if _recent_writers.get(_consistency_key(request), 0) > time.monotonic():
+        yield primary
+        return
+
+    db = ReplicaSessionLocals[next(_replica_cycle) % len(ReplicaSessionLocals)]()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def insert_returning_ids(db: Session, model, rows: list) -> list:
+    """
+    Multi-row INSERT returning the new primary keys in the order of `rows`
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLAlchemy can't order RETURNING on SQLite and falls back to one INSERT
+        # per row; SQLite has a single writer and assigns rowids in VALUES order
+        return sorted(db.scalars(insert(model).returning(model.id), rows).all())
+    return db.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), rows).all()
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # Importing the models registers their tables on Base
+    from models import user, survey  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+
+
+if __name__ == "__main__":
+    # Run as a script this module is __main__; the models use the importable `database.Base`
+    import database
+    database.create_tables()
@@ -1,15 +1,39 @@
-from fastapi import FastAPI
+import sys
+import hmac
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
+from fastapi.responses import PlainTextResponse
 
 from routes.auth import router as auth_router
 from routes.survey import router as survey_router
 from database import create_tables
+from core.config import settings
+from core.responses import FastJSONResponse
+from core.metrics import (
+    registry, current_stats, server_timing, RequestStats,
+    REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_SQL_STATEMENTS
+)
+from core.profiler import SamplingProfiler
+from core.rate_limit import ConcurrencyLimitMiddleware
+from services.response_buffer import get_response_buffer
+
 
-# Create database tables
-create_tables()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation is an explicit step (`python -m database`); opt back in for dev setups
+    if settings.CREATE_TABLES_ON_STARTUP:
+        create_tables()
+    if settings.RESPONSE_INGEST_MODE == "buffered":
+        get_response_buffer().start()
+    yield
+    if settings.RESPONSE_INGEST_MODE == "buffered":
+        get_response_buffer().stop()
 
-app = FastAPI()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,11 +41,79 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+@app.middleware("http")
+async def instrumentation_middleware(request: Request, call_next):
+    if not settings.METRICS_ENABLED:
+        return await call_next(request)
+
+    stats = RequestStats()
+    token = current_stats.set(stats)
+    profile_mode = request.headers.get("X-Profile") or request.query_params.get("profile")
+    profiler = None
+    if settings.PROFILING_ENABLED and profile_mode:
+        profiler = SamplingProfiler(settings.PROFILE_INTERVAL, track_allocations="alloc" in profile_mode).start()
+
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_stats.reset(token)
+        if profiler:
+            profiler.stop()
+    elapsed = time.perf_counter() - start
+
+    # Label by route template so /surveys/1 and /surveys/2 share a series
+    route = request.scope.get("route")
+    route_label = route.path if route is not None else "unmatched"
+    REQUEST_DURATION.observe(elapsed, request.method, route_label, str(response.status_code))
+    REQUEST_DB_DURATION.observe(stats.sql_time, request.method, route_label)
+    REQUEST_SQL_STATEMENTS.inc(request.method, route_label, amount=stats.sql_count)
+
+    response.headers["Server-Timing"] = server_timing(elapsed, stats)
+    if profiler:
+        response.headers["X-Profile-Output"] = profiler.dump(settings.PROFILE_DIR, f"{request.method} {route_label}")
+        if profiler.allocation_peak is not None:
+            response.headers["X-Profile-Alloc-Peak"] = str(profiler.allocation_peak)
+    return response
+
+
+# Added last so it wraps everything else and sheds load before any work is done
+app.add_middleware(
+    ConcurrencyLimitMiddleware,
+    max_concurrent=settings.MAX_CONCURRENT_REQUESTS,
+    max_queued=settings.MAX_QUEUED_REQUESTS,
+    queue_timeout=settings.QUEUE_TIMEOUT_SECONDS,
+    exempt_suffixes=("/analytics/stream",),
+)
+
+
+LOOPBACK_CLIENTS = ("127.0.0.1", "::1")
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if settings.METRICS_TOKEN:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Metrics need the METRICS_TOKEN bearer token",
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+    elif request.client is None or request.client.host not in LOOPBACK_CLIENTS:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Metrics are only served to loopback clients")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 #routers
 app.include_router(auth_router, prefix="/auth", tags=["Auth"])
 app.include_router(survey_router, prefix = "/surveys", tags = ["surveys"])
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # Pre-forked workers; `uvicorn main:app --reload` remains the development server
+    from serve import main as serve
+    sys.exit(serve())
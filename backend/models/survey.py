@@ -1,7 +1,10 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Float, Enum as SQLEnum, String
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Float, Enum as SQLEnum, String, LargeBinary, Index, text, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
+from core.config import settings
+from utils.response_codec import EncodedResponses
+from utils.partitioning import partition_ddl
 from enum import Enum
 
 class QuestionType(Enum):
@@ -39,18 +42,93 @@ class Question(Base):
 	survey = relationship("Survey", back_populates="questions")
 
 
+# PostgreSQL declarative partitioning needs the partition key in the primary key
+RESPONSE_PARTITION_KEYS = {
+	"none": None,
+	"hash": ("survey_id", "HASH (survey_id)"),
+	"range": ("submitted_at", "RANGE (submitted_at)"),
+}
+_partition_key, _partition_by = RESPONSE_PARTITION_KEYS[settings.RESPONSE_PARTITIONING] or (None, None)
+
+_response_indexes = [
+	# Keyset pagination over (submitted_at, id) within a survey, optionally for one respondent
+	Index("ix_survey_responses_survey_submitted", "survey_id", "submitted_at", "id"),
+	Index("ix_survey_responses_survey_respondent", "survey_id", "respondent_id", "submitted_at", "id"),
+]
+if settings.RESPONSE_ENCODING == "json":
+	# Answer filters are jsonb containment tests on PostgreSQL
+	_response_indexes.append(
+		Index(
+			"ix_survey_responses_answers", text("(responses::jsonb) jsonb_path_ops"), postgresql_using = "gin"
+		).ddl_if(dialect = "postgresql")
+	)
+
 class SurveyResponse(Base):
 	__tablename__ = "survey_responses"
+	__table_args__ = (*_response_indexes, {"postgresql_partition_by": _partition_by} if _partition_by else {})
 
-	id = Column(Integer, primary_key = True, index = True)
-	survey_id = Column(Integer, ForeignKey("surveys.id"))
+	id = Column(Integer, primary_key = True, index = True, autoincrement = True)
+	survey_id = Column(
+		Integer, ForeignKey("surveys.id"),
+		primary_key = _partition_key == "survey_id", nullable = _partition_key != "survey_id"
+	)
 	respondent_id = Column(Integer, ForeignKey("users.id"), nullable = True)
-	responses = Column(JSON)
-	submitted_at = Column(DateTime, default = datetime.utcnow)
+	# Decoded to the same dict whichever encoding the deployment stores
+	responses = Column(JSON if settings.RESPONSE_ENCODING == "json" else EncodedResponses(settings.RESPONSE_ENCODING))
+	submitted_at = Column(
+		DateTime, default = datetime.utcnow,
+		primary_key = _partition_key == "submitted_at", nullable = _partition_key != "submitted_at"
+	)
 
 	survey = relationship("Survey", back_populates = "responses")
 	respondent = relationship("User", back_populates = "survey_responses")
 
+if _partition_by:
+	# A partitioned table takes no rows until it has partitions: create them with it
+	for _statement in partition_ddl(settings.RESPONSE_PARTITIONING):
+		event.listen(SurveyResponse.__table__, "after_create", DDL(_statement).execute_if(dialect = "postgresql"))
+
+class ResponseDedupKey(Base):
+	"""
+	Idempotency-Key and content-hash claims on survey responses, keyed by a
+	16-byte digest so a duplicate check is a single primary-key lookup
+	"""
+	__tablename__ = "response_dedup_keys"
+
+	key_hash = Column(LargeBinary(16), primary_key = True)
+	fingerprint = Column(LargeBinary(16), nullable = True)  # request body digest, Idempotency-Key rows only
+	response_id = Column(Integer, nullable = True)  # NULL while a buffered response is still queued
+	expires_at = Column(DateTime, nullable = False, index = True)
+
+class SurveyThemeModel(Base):
+	"""
+	A pickled utils.themes.ThemeModel, fitted once and reused to classify later feedback
+	"""
+	__tablename__ = "theme_models"
+
+	scope = Column(String, primary_key = True)  # "survey:<id>" or "question:<id>"
+	survey_id = Column(Integer, ForeignKey("surveys.id"), nullable = True, index = True)
+	model = Column(LargeBinary, nullable = False)
+	n_documents = Column(Integer, nullable = False)
+	fitted_at = Column(DateTime, nullable = False)
+	# Text-question models: answers per theme up to last_response_id when fitted
+	assigned_counts = Column(JSON, nullable = True)
+	last_response_id = Column(Integer, nullable = True)
+
+class SurveyArchive(Base):
+	"""
+	An inactive survey whose responses were moved to a compressed archive file,
+	with its analytics as computed just before the move
+	"""
+	__tablename__ = "survey_archives"
+
+	survey_id = Column(Integer, ForeignKey("surveys.id"), primary_key = True)
+	path = Column(String, nullable = False)
+	response_count = Column(Integer, nullable = False)
+	last_submitted_at = Column(DateTime, nullable = True)
+	analytics = Column(JSON, nullable = False)
+	archived_at = Column(DateTime, nullable = False, default = datetime.utcnow)
+
 class SurveyPermission(Base):
 	__tablename__ = "survey_permissions"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, LargeBinary
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -16,3 +16,18 @@ class User(Base):
     surveys = relationship("Survey", back_populates = "creator")
     survey_responses = relationship("SurveyResponse", back_populates = "respondent")
     survey_permissions = relationship("SurveyPermission", back_populates = "user")
+
+
+class RefreshToken(Base):
+    """
+    One refresh token, stored as its HMAC-SHA256 so lookups are a primary-key hit.
+    Tokens issued from one login share a family; rotated_at marks tokens that
+    were already exchanged, so presenting one again revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family = Column(LargeBinary(16), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    rotated_at = Column(DateTime, nullable=True)
@@ -1,8 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Form, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from typing import Optional
 import secrets
-from core.security import verify_password, hash_password, create_access_token, get_current_user
+from core.security import (
+	verify_password, hash_password, create_access_token, get_current_user,
+	new_token_family, issue_refresh_token, rotate_refresh_token, revoke_refresh_tokens, get_session_family
+)
+from core.config import settings
+from core.rate_limit import login_limits, register_limits
 
 from database import get_db
 from models.user import User
@@ -12,7 +18,7 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-@router.post("/register")
+@router.post("/register", dependencies=[Depends(limit) for limit in register_limits])
 def register(
     username: str = Form(...),
     password: str = Form(...),
@@ -57,16 +63,47 @@ def register(
     return {"message": "User registered successfully", "user_id": new_user.id}
 
 
-@router.post("/token")
+@router.post("/token", dependencies=[Depends(limit) for limit in login_limits])
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
 	user = db.query(User).filter(User.username == form_data.username).first()
 
 	if not user or not verify_password(form_data.password, user.hashed_password):
 		raise HTTPException(status_code = 400, detail = "Incorrect username or password")
 
-	access_token = create_access_token(data = {"sub": user.username})
+	family = new_token_family()
+	access_token = create_access_token(data = {"sub": user.username, "sid": family.hex()})
+	refresh_token = issue_refresh_token(db, user.id, family)
+	db.commit()
+
+	return token_response(access_token, refresh_token)
+
+
+def token_response(access_token: str, refresh_token: str) -> dict:
+	return {
+		"access_token": access_token,
+		"token_type": "bearer",
+		"expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+		"refresh_token": refresh_token
+	}
+
+
+@router.post("/refresh")
+def refresh(
+	refresh_token: str = Form(...),
+	grant_type: str = Form("refresh_token"),
+	db: Session = Depends(get_db)
+):
+	"""
+	Trade a refresh token for a new access token and a new refresh token; the
+	old refresh token stops working
+	"""
+	if grant_type != "refresh_token":
+		raise HTTPException(status_code = 400, detail = "Unsupported grant_type")
+
+	user, new_refresh_token, family = rotate_refresh_token(db, refresh_token)
+	access_token = create_access_token(data = {"sub": user.username, "sid": family.hex()})
 
-	return {"access_token": access_token, "token_type": "bearer"}
+	return token_response(access_token, new_refresh_token)
 
 
 @router.get("/profile")
@@ -83,6 +120,7 @@ def change_password(
 	current_password: str = Form(...),
 	new_password: str = Form(...),
 	current_user: User = Depends(get_current_user),
+	session_family: Optional[bytes] = Depends(get_session_family),
 	db: Session = Depends(get_db)
 ):
 	if not verify_password(current_password, current_user.hashed_password):
@@ -98,6 +136,8 @@ def change_password(
 		)
 
 	current_user.hashed_password = hash_password(new_password)
+	# Sign out every other session; access tokens still run out on their own
+	revoke_refresh_tokens(db, current_user.id, keep_family = session_family)
 	db.commit()
 
 	return {"message": "Password successfully changed"}
@@ -134,6 +174,7 @@ def delete_account(
 	current_user: User = Depends(get_current_user),
 	db: Session = Depends(get_db)
 ):
+	revoke_refresh_tokens(db, current_user.id)
 	db.delete(current_user)
 	db.commit()
 	return {"message": "Account deleted successfully"}
\ No newline at end of file
@@ -1,63 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, File, UploadFile, Request, Response, Header, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 
-from database import get_db
+from database import SessionLocal, get_db, get_read_db, pin_reads_to_primary
 from models.user import User
 from models.survey import Survey, SurveyResponse, SurveyPermission, Question
 from schemas.survey import (
-    SurveyCreate, Survey as SurveySchema,
+    SurveyCreate, SurveyBulkCreate, Survey as SurveySchema,
     SurveyAnalytics, FeedbackAnalysis,
-    SurveyResponseCreate, SurveyResponseOut
+    SurveyResponseCreate, SurveyResponseOut, SurveyResponsePage
 )
 from utils.analytics import (
-    analyze_survey_responses,
     analyze_feedback_csv,
+    read_feedback_csv,
     validate_survey_response
 )
+from utils.serializers import survey_to_dict, surveys_to_list
 from core.security import get_current_active_user, get_current_user
+from core.responses import FastJSONResponse
+from core.rate_limit import respond_limits
+from core.config import settings
+from services.response_buffer import get_response_buffer
+from services.survey_cache import survey_cache, etag_matches
+from services.analytics_stream import analytics_hub
+from services.survey_service import (
+    create_surveys, compute_survey_analytics, submit_response, list_responses, parse_answer_filter,
+    question_types
+)
+from services.response_dedup import dedup_keys, claim_pending, replay_body
+from services.theme_service import classify_feedback, refit_theme_model
+from services.segment_service import parse_segment, parse_crosstab, segmented_analytics
+from services.retention import ensure_live, rehydrate_survey, delete_archive
 
 router = APIRouter()
 
-@router.post("/create", response_model=SurveySchema)
+@router.post("/create", response_model=SurveySchema, dependencies=[Depends(pin_reads_to_primary)])
 def create_survey(
     survey: SurveyCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    db_survey = Survey(
-        title=survey.title,
-        description=survey.description,
-        created_by=current_user.id
-    )
-    db.add(db_survey)
-    db.commit()
-    db.refresh(db_survey)
-
-    # Add questions
-    for question in survey.questions:
-        db_question = Question(
-            survey_id=db_survey.id,
-            question_text=question.question_text,
-            question_type=question.question_type,
-            options=question.options
+    created = create_surveys(db, [survey], current_user.id)
+    return FastJSONResponse(created[0])
+
+@router.post("/bulk", response_model=List[SurveySchema], dependencies=[Depends(pin_reads_to_primary)])
+def create_surveys_bulk(
+    payload: SurveyBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    if not payload.surveys:
+        raise HTTPException(status_code=400, detail="No surveys to create")
+    if len(payload.surveys) > settings.BULK_SURVEY_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BULK_SURVEY_MAX} surveys can be created per request"
         )
-        db.add(db_question)
 
-    db.commit()
-    db.refresh(db_survey)
-    return db_survey
+    return FastJSONResponse(create_surveys(db, payload.surveys, current_user.id))
 
 @router.get("/list", response_model=List[SurveySchema])
 def list_surveys(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     surveys = db.query(Survey).filter(Survey.created_by == current_user.id).all()
-    return surveys
+    return FastJSONResponse(surveys_to_list(surveys))
 
-@router.delete("/{survey_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.delete(
+    "/{survey_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(pin_reads_to_primary)]
+)
 def delete_survey(
     survey_id: int,
     db: Session = Depends(get_db),
@@ -70,30 +88,59 @@ def delete_survey(
     if survey.created_by != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to delete this survey")
 
+    delete_archive(db, survey_id)
     db.delete(survey)
     db.commit()
+    survey_cache.invalidate(survey_id)
     return None
 
 @router.post("/analyze")
 async def analyze_feedback(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    survey_id: Optional[int] = None,
+    refit: bool = False,
+    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
+    """
+    Cluster uploaded feedback into themes. With `survey_id` the survey's stored
+    theme model is reused (fitted on the first upload, or again with `refit`),
+    so recurring uploads land in the same themes.
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
 
     content = await file.read()
     content_str = content.decode('utf-8')
 
-    analysis_results = analyze_feedback_csv(content_str)
+    if survey_id is None:
+        analysis_results = analyze_feedback_csv(content_str)
+        return analysis_results
+
+    survey = db.query(Survey).filter(Survey.id == survey_id).first()
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+    if not has_survey_permission(db, current_user.id, survey_id, "analyze"):
+        raise HTTPException(status_code=403, detail="Not authorized to analyze this survey")
+
+    feedback = read_feedback_csv(content_str)
+    analysis_results, stale = classify_feedback(db, survey_id, feedback, refit=refit)
+    if stale:
+        background_tasks.add_task(refit_theme_model, SessionLocal, survey_id, list(feedback))
     return analysis_results
 
-@router.post("/{survey_id}/respond", response_model=SurveyResponseOut)
+@router.post(
+    "/{survey_id}/respond",
+    response_model=SurveyResponseOut,
+    dependencies=[Depends(limit) for limit in respond_limits] + [Depends(pin_reads_to_primary)]
+)
 async def submit_survey_response(
     survey_id: int,
     response: SurveyResponseCreate,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # Allow anonymous responses
+    current_user: Optional[User] = Depends(get_current_user),  # Allow anonymous responses
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     survey = db.query(Survey).filter(Survey.id == survey_id).first()
     if not survey:
@@ -102,24 +149,80 @@ async def submit_survey_response(
     # Validate response
     validate_survey_response(survey, response.responses)
 
-    db_response = SurveyResponse(
-        survey_id=survey_id,
-        respondent_id=current_user.id if current_user else None,  # Allow anonymous respondents
-        responses=response.responses,
-        submitted_at=datetime.utcnow()
+    respondent_id = current_user.id if current_user else None  # Allow anonymous respondents
+    keys = dedup_keys(survey_id, respondent_id, response.responses, idempotency_key)
+
+    # Answering an archived survey brings its responses back first; that can
+    # read a large archive, so keep it off the event loop
+    if settings.RESPONSE_INGEST_MODE == "buffered":
+        # Each group commit locks its batch's surveys itself
+        await run_in_threadpool(rehydrate_survey, db, survey_id)
+        if keys:
+            existing = claim_pending(db, keys)
+            if existing is not None:
+                return replayed_response(db, survey_id, existing)
+        submitted_at = datetime.utcnow()
+        future = get_response_buffer().submit(
+            survey_id, respondent_id, response.responses, submitted_at,
+            dedup_keys=[k.key_hash for k in keys]
+        )
+        if settings.RESPONSE_ACK_POLICY == "enqueue":
+            # The next push may still miss this row; the following one picks it up
+            analytics_hub.notify(survey_id)
+            return FastJSONResponse(
+                {'survey_id': survey_id, 'status': 'queued', 'submitted_at': submitted_at},
+                status_code=status.HTTP_202_ACCEPTED
+            )
+        # Hand the pooled connection back before waiting, the flusher needs one to commit
+        db.close()
+        response_id = await asyncio.wrap_future(future)
+        analytics_hub.notify(survey_id)
+        return FastJSONResponse({
+            'survey_id': survey_id,
+            'responses': response.responses,
+            'id': response_id,
+            'respondent_id': respondent_id,
+            'submitted_at': submitted_at
+        })
+
+    # Leaves the survey locked until the response commits, so it can't be archived in between
+    await run_in_threadpool(ensure_live, db, survey_id)
+    body, replayed = submit_response(db, survey_id, respondent_id, response.responses, keys)
+    if replayed:
+        return replayed_response(db, survey_id, body=body)
+    analytics_hub.notify(survey_id)
+
+    return FastJSONResponse(body)
+
+
+def replayed_response(db: Session, survey_id: int, claim=None, body=None):
+    """
+    Answer a duplicate submission with the response it duplicates
+    """
+    if body is None and claim is not None:
+        body = replay_body(db, claim)
+    if body is not None:
+        return FastJSONResponse(body, headers={"Idempotent-Replayed": "true"})
+    # The original is still queued for group commit
+    if settings.RESPONSE_ACK_POLICY == "enqueue":
+        return FastJSONResponse(
+            {'survey_id': survey_id, 'status': 'queued'},
+            status_code=status.HTTP_202_ACCEPTED,
+            headers={"Idempotent-Replayed": "true"}
+        )
+    raise HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="A request with this Idempotency-Key is still being processed",
+        headers={"Retry-After": "1"}
     )
 
-    db.add(db_response)
-    db.commit()
-    db.refresh(db_response)
-
-    return db_response
-
 
 @router.get("/analytics/{survey_id}", response_model=SurveyAnalytics)
 async def get_survey_analytics(
     survey_id: int,
-    db: Session = Depends(get_db),
+    answer: List[str] = Query([], description="Segment filter <question id>:<answer>, '|' for alternatives; repeat to AND"),
+    crosstab: Optional[str] = Query(None, description="<rows question id>,<columns question id>"),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     survey = db.query(Survey).filter(Survey.id == survey_id).first()
@@ -130,21 +233,78 @@ async def get_survey_analytics(
     if not has_survey_permission(db, current_user.id, survey_id, "analyze"):
         raise HTTPException(status_code=403, detail="Not authorized to view analytics")
 
-    responses = db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).all()
+    if answer or crosstab:
+        return FastJSONResponse(segmented_analytics(
+            db, survey_id, parse_segment(answer, question_types(db, survey_id)),
+            parse_crosstab(crosstab) if crosstab else None
+        ))
+    return FastJSONResponse(compute_survey_analytics(db, survey_id))
 
-    if not responses:  # Prevent sending empty responses list to analyze_survey_responses
-        return SurveyAnalytics(
-            total_responses=0,
-            completion_rate=0.0,
-            average_time=0.0,
-            question_analytics={}
-        )
 
-    analytics = analyze_survey_responses(responses)
-    return SurveyAnalytics(**analytics)
+@router.get("/{survey_id}/analytics/stream")
+def stream_survey_analytics(
+    survey_id: int,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Server-sent events: a `snapshot` event with the full analytics, then `delta`
+    events carrying only the fields and questions that changed
+    """
+    survey = db.query(Survey).filter(Survey.id == survey_id).first()
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+
+    if not has_survey_permission(db, current_user.id, survey_id, "analyze"):
+        raise HTTPException(status_code=403, detail="Not authorized to view analytics")
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.close()
+
+    return StreamingResponse(
+        analytics_hub.stream(survey_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/{survey_id}/responses", response_model=SurveyResponsePage)
+def get_survey_responses(
+    survey_id: int,
+    limit: int = Query(50, ge=1, le=settings.RESPONSES_PAGE_MAX),
+    cursor: Optional[str] = None,
+    respondent_id: Optional[int] = None,
+    submitted_after: Optional[datetime] = None,
+    submitted_before: Optional[datetime] = None,
+    answer: List[str] = Query([], description="<question id>:<answer>, repeatable; all must match"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Page through a survey's responses; pass the returned next_cursor to get the
+    following page, with the same filters and order
+    """
+    survey = db.query(Survey).filter(Survey.id == survey_id).first()
+    if not survey:
+        raise HTTPException(status_code=404, detail="Survey not found")
+
+    if not has_survey_permission(db, current_user.id, survey_id, "analyze"):
+        raise HTTPException(status_code=403, detail="Not authorized to view responses")
+
+    types = question_types(db, survey_id) if answer else {}
+    page = list_responses(
+        db, survey_id, limit,
+        cursor=cursor,
+        respondent_id=respondent_id,
+        submitted_after=submitted_after,
+        submitted_before=submitted_before,
+        answers=[parse_answer_filter(value, types) for value in answer],
+        ascending=order == "asc"
+    )
+    return FastJSONResponse(page)
 
 
-@router.post("/{survey_id}/share")
+@router.post("/{survey_id}/share", dependencies=[Depends(pin_reads_to_primary)])
 async def share_survey(
     survey_id: int,
     user_id: int,
@@ -186,11 +346,22 @@ def has_survey_permission(db: Session, user_id: int, survey_id: int, permission_
 @router.get("/{survey_id}", response_model=SurveySchema)
 def get_survey(
     survey_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: Session = Depends(get_read_db),
     current_user: Optional[User] = Depends(get_current_user)  # Allow anonymous users
 ):
-    survey = db.query(Survey).filter(Survey.id == survey_id).first()
-    if not survey:
+    def load_survey():
+        survey = db.query(Survey).options(selectinload(Survey.questions)).filter(Survey.id == survey_id).first()
+        return survey_to_dict(survey) if survey else None
+
+    cached = survey_cache.get_or_load(survey_id, load_survey)
+    if cached is None:
         raise HTTPException(status_code=404, detail="Survey not found")
 
-    return survey  # No authentication required
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": f"public, max-age={settings.SURVEY_CACHE_MAX_AGE}"
+    }
+    if etag_matches(request.headers.get("If-None-Match", ""), cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)  # No authentication required
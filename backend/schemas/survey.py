@@ -23,6 +23,9 @@ class SurveyBase(BaseModel):
 class SurveyCreate(SurveyBase):
     questions: List[QuestionCreate]
 
+class SurveyBulkCreate(BaseModel):
+    surveys: List[SurveyCreate]
+
 class Survey(SurveyBase):
     id: int
     created_at: datetime
@@ -42,6 +45,10 @@ class SurveyResponseOut(SurveyResponseBase):
     submitted_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
+class SurveyResponsePage(BaseModel):
+    items: List[SurveyResponseOut]
+    next_cursor: Optional[str] = None
+
 class QuestionAnalytics(BaseModel):
     type: str
     total_responses: int
@@ -53,6 +60,8 @@ class SurveyAnalytics(BaseModel):
     completion_rate: float
     average_time: float
     question_analytics: Dict[str, QuestionAnalytics]
+    segment: Optional[Dict[str, int]] = None
+    crosstab: Optional[dict] = None
     model_config = ConfigDict(from_attributes=True)
 
 class FeedbackAnalysis(BaseModel):
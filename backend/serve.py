@@ -0,0 +1,259 @@
+"""
+Production entry point: a pre-forking supervisor around uvicorn.
+
+    python -m serve --workers 4
+
+The app (and, unless disabled, pandas/scikit-learn) is imported once here and
+the listening socket bound before the workers are forked, so workers share
+those pages and a replacement worker is serving within milliseconds. Each
+worker is a uvicorn Server on the shared socket, using uvloop and httptools
+when they are installed (``pip install uvloop httptools``).
+
+A worker exits after SERVE_MAX_REQUESTS requests (plus jitter) and is replaced,
+which bounds memory growth from the analytics libraries. With buffered ingest
+each worker slot journals to RESPONSE_BUFFER_SPILL_PATH.<slot>; the supervisor
+replays a slot's journal before that slot's replacement worker starts. SIGTERM or SIGINT
+stops accepting connections and gives in-flight requests SERVE_GRACEFUL_TIMEOUT
+seconds before the workers are killed.
+"""
+import os
+import sys
+import time
+import signal
+import random
+import logging
+import argparse
+import importlib
+import importlib.util
+from typing import Optional
+
+import uvicorn
+
+from core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+# uvicorn's fast paths, used when installed
+LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+HTTP = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+ANALYTICS_MODULES = ("numpy", "pandas", "sklearn.cluster", "sklearn.feature_extraction.text", "textblob")
+
+# A worker that dies this soon after starting is crashing, not being recycled
+CRASH_WINDOW_SECONDS = 1.0
+
+
+def default_workers() -> int:
+    return settings.SERVE_WORKERS or os.cpu_count() or 1
+
+
+def preload(analytics: bool):
+    """
+    Import the app in the supervisor, before any worker is forked
+    """
+    if analytics:
+        for module in ANALYTICS_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                pass
+
+    from main import app
+    import database
+
+    if settings.CREATE_TABLES_ON_STARTUP:
+        # Once here, so the workers' lifespans find the tables instead of racing to create them
+        database.create_tables()
+    replay_journals()
+    dispose_engines()
+    return app
+
+
+def dispose_engines():
+    # Workers must not share the supervisor's pooled connections
+    import database
+
+    for engine in [database.engine, *database.replica_engines]:
+        engine.dispose()
+
+
+def buffered_ingest() -> bool:
+    return settings.RESPONSE_INGEST_MODE == "buffered" and bool(settings.RESPONSE_BUFFER_SPILL_PATH)
+
+
+def replay_journals(slot: Optional[int] = None):
+    """
+    Commit what workers left in their response journals: every journal at
+    startup (including slots of a run with more workers), or one dead worker's
+    """
+    if not buffered_ingest():
+        return
+    from services import response_buffer
+
+    spill_path = settings.RESPONSE_BUFFER_SPILL_PATH
+    paths = response_buffer.journal_paths(spill_path) if slot is None else [response_buffer.journal_path(spill_path, slot)]
+    try:
+        for path in paths:
+            replayed = response_buffer.replay_journal(path)
+            if replayed:
+                logger.info("Replayed %d buffered responses from %s", replayed, path)
+    finally:
+        dispose_engines()
+
+
+class Supervisor:
+    """
+    Forks `workers` uvicorn servers on one socket and keeps that many running
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, max_requests: int = 0,
+                 max_requests_jitter: int = 0, graceful_timeout: int = 30):
+        self.config = config
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.children = {}  # pid -> (slot, monotonic start time)
+        self.should_exit = False
+
+    def handle_exit(self, sig, frame):
+        self.should_exit = True
+
+    def spawn(self, sock, slot: int):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = (slot, time.monotonic())
+            return
+
+        # Worker process: uvicorn installs its own shutdown handlers
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            random.seed()
+            from services import response_buffer
+            response_buffer.journal_slot = slot
+            if self.max_requests:
+                self.config.limit_max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+            uvicorn.Server(self.config).run(sockets=[sock])
+        except SystemExit as exc:
+            code = exc.code if isinstance(exc.code, int) else 1
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def reap(self, sock=None):
+        """
+        Collect exited workers, replacing them unless shutting down
+        """
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            child = self.children.pop(pid, None)
+            if child is None or self.should_exit or sock is None:
+                continue
+            slot, started = child
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0 and time.monotonic() - started < CRASH_WINDOW_SECONDS:
+                logger.error("Worker %d exited with %d right after starting; retrying in 1s", pid, code)
+                time.sleep(1)
+            else:
+                logger.info("Worker %d exited (%d); starting a replacement", pid, code)
+            try:
+                # Nobody writes the slot's journal now; the replacement starts on an empty one
+                replay_journals(slot)
+            except Exception:
+                # The replacement replays it on startup instead
+                logger.exception("Could not replay the journal of worker slot %d", slot)
+            self.spawn(sock, slot)
+
+    def shutdown(self):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        # uvicorn cancels what is still running after timeout_graceful_shutdown; allow for that
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning("Worker %d did not stop in time; killing it", pid)
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while self.children:
+            self.reap()
+            time.sleep(0.05)
+
+    def run(self) -> int:
+        sock = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGINT, self.handle_exit)
+        logger.info(
+            "Supervisor %d: %d workers, loop=%s http=%s, max requests %s",
+            os.getpid(), self.workers, self.config.loop, self.config.http,
+            f"{self.max_requests}+{self.max_requests_jitter}" if self.max_requests else "unlimited"
+        )
+        for slot in range(self.workers):
+            self.spawn(sock, slot)
+        while not self.should_exit:
+            self.reap(sock)
+            time.sleep(0.2)
+
+        logger.info("Shutting down %d workers", len(self.children))
+        self.shutdown()
+        sock.close()
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked uvicorn workers")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=default_workers(), help="default: one per CPU")
+    parser.add_argument("--max-requests", type=int, default=settings.SERVE_MAX_REQUESTS,
+                        help="replace a worker after this many requests; 0 never does")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.SERVE_MAX_REQUESTS_JITTER)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVE_GRACEFUL_TIMEOUT)
+    parser.add_argument("--no-preload-analytics", dest="preload_analytics", action="store_false",
+                        default=settings.SERVE_PRELOAD_ANALYTICS)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-access-log", dest="access_log", action="store_false")
+    args = parser.parse_args(argv)
+
+    config = uvicorn.Config(
+        preload(args.preload_analytics),
+        host=args.host,
+        port=args.port,
+        loop=LOOP,
+        http=HTTP,
+        lifespan="on",
+        timeout_graceful_shutdown=args.graceful_timeout,
+        log_level=args.log_level,
+        access_log=args.access_log,
+    )
+    if not hasattr(os, "fork"):
+        logger.warning("No fork() on this platform: serving from one process without worker recycling")
+        uvicorn.Server(config).run()
+        return 0
+    return Supervisor(
+        config,
+        workers=max(1, args.workers),
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+    ).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+import time
+import asyncio
+import importlib
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.metrics import registry
+from core.responses import dumps
+
+STREAM_SUBSCRIBERS = registry.gauge("analytics_stream_subscribers", "Open analytics SSE connections")
+STREAM_COMPUTATIONS = registry.counter(
+    "analytics_stream_computations_total", "Analytics recomputations triggered by new responses")
+STREAM_PUSHES = registry.counter("analytics_stream_pushes_total", "Analytics deltas published", ("event",))
+
+RESYNC = {"event": "resync", "data": None}
+
+
+class Subscription:
+    """
+    One subscriber's bounded mailbox. When the subscriber falls too far behind
+    its backlog is replaced by a single resync marker, so a slow client costs
+    O(max_pending) memory and then catches up from the latest snapshot.
+    """
+
+    def __init__(self, max_pending: int = 64):
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+
+    def put(self, message: dict):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """
+        Next message, or None if nothing arrived within `timeout` seconds
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """
+    Fan-out of messages to subscribers. The hub announces new responses
+    through it; the in-process broker only reaches this worker, a shared
+    broker (e.g. Redis pub/sub) plugged in through ANALYTICS_STREAM_BROKER
+    reaches every worker.
+    """
+
+    async def publish(self, channel: str, message: dict):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str):
+        """
+        Async context manager yielding a Subscription for `channel`
+        """
+        raise NotImplementedError
+
+
+class InProcessBroker(Broker):
+    def __init__(self, max_pending: int = 64):
+        self.max_pending = max_pending
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    async def publish(self, channel: str, message: dict):
+        for subscription in self._channels.get(channel, ()):
+            subscription.put(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        subscription = Subscription(self.max_pending)
+        self._channels.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            subscribers = self._channels.get(channel)
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[channel]
+
+
+def load_broker(spec: str) -> Broker:
+    """
+    "memory" or a "module:attribute" path to a Broker subclass or factory
+    """
+    if spec == "memory":
+        return InProcessBroker()
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)()
+
+
+def analytics_delta(previous: Optional[dict], current: dict) -> dict:
+    """
+    Top-level fields that changed plus only the questions whose analytics changed
+    """
+    if previous is None:
+        return current
+    delta = {
+        key: value for key, value in current.items()
+        if key != "question_analytics" and previous.get(key) != value
+    }
+    old_questions = previous.get("question_analytics", {})
+    changed = {
+        question_id: analytics
+        for question_id, analytics in current.get("question_analytics", {}).items()
+        if old_questions.get(question_id) != analytics
+    }
+    if changed:
+        delta["question_analytics"] = changed
+    return delta
+
+
+def format_event(event: str, data) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class _SurveyChannel:
+    __slots__ = ("subscribers", "snapshot", "dirty", "task", "last_push", "listener", "listening")
+
+    def __init__(self):
+        self.subscribers = 0
+        self.snapshot: Optional[dict] = None
+        self.dirty = False
+        self.task: Optional[asyncio.Task] = None
+        self.last_push = 0.0
+        self.listener: Optional[asyncio.Task] = None
+        self.listening = asyncio.Event()
+
+
+class AnalyticsStreamHub:
+    """
+    Live analytics for open dashboards.
+
+    New responses are announced through the broker, so every worker hears of
+    them whichever worker stored them, and only mark a survey dirty. While a
+    survey has viewers on this worker, at most `max_pushes_per_second`
+    recomputations run for it here, each shared by this worker's viewers: the
+    result becomes the worker's snapshot and its delta against the previous one
+    is fanned out locally.
+    """
+
+    def __init__(self, compute: Callable[[int], dict], broker: Optional[Broker] = None,
+                 max_pushes_per_second: float = 2.0, heartbeat: float = 15.0):
+        self.compute = compute
+        self.broker = broker or InProcessBroker()
+        self.viewers = InProcessBroker()
+        self.min_interval = 1.0 / max_pushes_per_second if max_pushes_per_second > 0 else 0.0
+        self.heartbeat = heartbeat
+        self._channels: Dict[int, _SurveyChannel] = {}
+        self._publishing: Set[asyncio.Task] = set()
+
+    @staticmethod
+    def channel_name(survey_id: int) -> str:
+        return f"analytics:{survey_id}"
+
+    def notify(self, survey_id: int):
+        """
+        Announce that a survey received responses to every worker's hub
+        """
+        task = asyncio.create_task(self.broker.publish(self.channel_name(survey_id), {"event": "dirty"}))
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    def _mark_dirty(self, survey_id: int, channel: _SurveyChannel):
+        if not channel.subscribers:
+            return
+        channel.dirty = True
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._refresh(survey_id, channel))
+
+    async def _listen(self, survey_id: int, channel: _SurveyChannel):
+        """
+        Mark the survey dirty on each announcement, for as long as it has viewers here
+        """
+        try:
+            async with self.broker.subscribe(self.channel_name(survey_id)) as subscription:
+                channel.listening.set()
+                while True:
+                    # A resync (announcements overflowed) is one more reason to recompute
+                    if await subscription.get() is not None:
+                        self._mark_dirty(survey_id, channel)
+        finally:
+            # Viewers still get their snapshot if the broker subscription failed
+            channel.listening.set()
+
+    async def _refresh(self, survey_id: int, channel: _SurveyChannel):
+        while channel.dirty and channel.subscribers:
+            wait = channel.last_push + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # Responses arriving during the computation set dirty again and get the next tick
+            channel.dirty = False
+            STREAM_COMPUTATIONS.inc()
+            current = await run_in_threadpool(self.compute, survey_id)
+            delta = analytics_delta(channel.snapshot, current)
+            channel.snapshot = current
+            channel.last_push = time.monotonic()
+            if delta:
+                STREAM_PUSHES.inc("delta")
+                await self.viewers.publish(self.channel_name(survey_id), {"event": "delta", "data": delta})
+
+    async def stream(self, survey_id: int) -> AsyncIterator[bytes]:
+        """
+        Server-sent events for one viewer: a full snapshot, then deltas
+        """
+        channel = self._channels.get(survey_id)
+        if channel is None:
+            channel = self._channels[survey_id] = _SurveyChannel()
+            channel.listener = asyncio.create_task(self._listen(survey_id, channel))
+        channel.subscribers += 1
+        STREAM_SUBSCRIBERS.inc()
+        try:
+            async with self.viewers.subscribe(self.channel_name(survey_id)) as subscription:
+                # Listen before the first snapshot so no response falls in between
+                await channel.listening.wait()
+                if channel.snapshot is None:
+                    channel.snapshot = await run_in_threadpool(self.compute, survey_id)
+                    channel.last_push = time.monotonic()
+                yield format_event("snapshot", channel.snapshot)
+                while True:
+                    message = await subscription.get(self.heartbeat)
+                    if message is None:
+                        yield b": keepalive\n\n"
+                    elif message["event"] == "resync":
+                        yield format_event("snapshot", channel.snapshot)
+                    else:
+                        yield format_event(message["event"], message["data"])
+        finally:
+            STREAM_SUBSCRIBERS.dec()
+            channel.subscribers -= 1
+            if not channel.subscribers and self._channels.get(survey_id) is channel:
+                del self._channels[survey_id]
+                channel.listener.cancel()
+
+
+def _compute_from_database(survey_id: int) -> dict:
+    from database import SessionLocal
+    from services.survey_service import compute_survey_analytics
+
+    # Primary, not a replica: the push follows a write and must include it
+    db = SessionLocal()
+    try:
+        return compute_survey_analytics(db, survey_id)
+    finally:
+        db.close()
+
+
+analytics_hub = AnalyticsStreamHub(
+    _compute_from_database,
+    broker=load_broker(settings.ANALYTICS_STREAM_BROKER),
+    max_pushes_per_second=settings.ANALYTICS_STREAM_MAX_PUSHES_PER_SECOND,
+    heartbeat=settings.ANALYTICS_STREAM_HEARTBEAT,
+)
@@ -0,0 +1,375 @@
+import os
+import re
+import glob
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import update, bindparam
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from core.config import settings
+from core.metrics import registry
+from database import SessionLocal, insert_returning_ids
+from models.survey import SurveyResponse, ResponseDedupKey
+from services.retention import lock_live, remove_archives
+from services.response_dedup import release_claims, stored_claims
+
+JOURNAL_COMPACT_BYTES = 16 * 1024 * 1024
+# A batch that failed on a connection or lock error is retried after these many
+# seconds, doubling up to the maximum
+RETRY_BASE_DELAY = 0.1
+RETRY_MAX_DELAY = 30.0
+
+BUFFER_FLUSHES = registry.counter("response_buffer_flushes_total", "Group commits of buffered responses")
+BUFFER_FLUSHED_ROWS = registry.counter("response_buffer_rows_total", "Responses written by group commit")
+BUFFER_FAILURES = registry.counter("response_buffer_failures_total", "Failed group commits")
+BUFFER_REJECTED = registry.counter(
+    "response_buffer_rejected_total", "Buffered responses the database refused, moved to the .rejected file")
+BUFFER_DEPTH = registry.gauge("response_buffer_depth", "Responses waiting for the next group commit")
+
+
+class PendingResponse:
+    __slots__ = ("seq", "row", "dedup_keys", "future")
+
+    def __init__(self, seq: int, row: dict, dedup_keys: List[bytes] = ()):
+        self.seq = seq
+        self.row = row
+        self.dedup_keys = dedup_keys
+        self.future: Future = Future()
+
+
+class ResponseBuffer:
+    """
+    Write-behind queue for survey responses.
+
+    Validated responses are appended to a local journal (the spill file) and
+    queued; a background thread inserts them in one transaction per batch when
+    `batch_size` rows are waiting or `flush_interval` seconds have passed. After
+    each commit the batch's sequence range is journalled as committed, so on
+    restart only uncommitted rows are replayed (at-least-once: a crash between
+    commit and checkpoint replays that batch).
+
+    A batch that fails on a connection or lock error keeps its rows, futures
+    and dedup claims and is retried with backoff before anything newer. Any
+    other error is the rows' own: they are committed one at a time, and those
+    the database still refuses fail their futures and move from the journal to
+    `<spill_path>.rejected`.
+    """
+
+    def __init__(self, session_factory, batch_size: int = 500, flush_interval: float = 0.05,
+                 spill_path: Optional[str] = None, fsync: bool = False):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.fsync = fsync
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._seq = 0
+        self._held: Optional[List[PendingResponse]] = None  # batch waiting to be retried
+        self._retries = 0
+        self._retry_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return self
+        if self.spill_path:
+            self._replay()
+            self._journal = open(self.spill_path, "a", encoding="utf-8")
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="response-buffer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Flush everything still queued and stop the background thread
+        """
+        if not self._running:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._thread.join()
+        while self._held or self._queue:
+            if not self._flush_batch():
+                break
+        # Still journalled: the next start replays them
+        BUFFER_DEPTH.dec(len(self._queue))
+        for item in (self._held or []) + list(self._queue):
+            item.future.set_exception(RuntimeError("Response buffer stopped before the response was stored"))
+        self._held = None
+        self._queue.clear()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+            self._compact()
+
+    def submit(self, survey_id: int, respondent_id: Optional[int], responses: dict,
+               submitted_at: Optional[datetime] = None, dedup_keys: List[bytes] = ()) -> Future:
+        """
+        Queue one response; the returned future resolves to its id after commit.
+        Pending claims in `dedup_keys` get the id in the same transaction.
+        """
+        row = {
+            "survey_id": survey_id,
+            "respondent_id": respondent_id,
+            "responses": {str(k): v for k, v in responses.items()},
+            "submitted_at": submitted_at or datetime.utcnow(),
+        }
+        with self._journal_lock:
+            self._seq += 1
+            item = PendingResponse(self._seq, row, dedup_keys)
+            if self._journal:
+                record = {"seq": item.seq, "row": {**row, "submitted_at": row["submitted_at"].isoformat()}}
+                if dedup_keys:
+                    record["keys"] = [key.hex() for key in dedup_keys]
+                self._journal.write(json.dumps(record) + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            # Queued under the journal lock so batches hold contiguous sequence numbers
+            with self._cond:
+                self._queue.append(item)
+                BUFFER_DEPTH.inc()
+                if len(self._queue) >= self.batch_size:
+                    self._cond.notify()
+        return item.future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._held:
+                    if self._running and time.monotonic() < self._retry_at:
+                        self._cond.wait(self._retry_at - time.monotonic())
+                elif self._running and len(self._queue) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                if not self._running:
+                    return
+            if self._held:
+                if time.monotonic() >= self._retry_at:
+                    self._flush_batch()
+            elif self._queue:
+                self._flush_batch()
+
+    def _flush_batch(self) -> bool:
+        """
+        Commit the held batch, or else the next one from the queue. Returns
+        False if it failed and is held for a retry.
+        """
+        if self._held:
+            batch, self._held = self._held, None
+        else:
+            with self._cond:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            if not batch:
+                return True
+            BUFFER_DEPTH.dec(len(batch))
+
+        try:
+            ids, archives = self._store(batch)
+        except (OperationalError, InterfaceError):
+            BUFFER_FAILURES.inc()
+            self._held = batch
+            self._retry_at = time.monotonic() + min(RETRY_BASE_DELAY * 2 ** self._retries, RETRY_MAX_DELAY)
+            self._retries += 1
+            return False
+        except Exception as exc:
+            BUFFER_FAILURES.inc()
+            self._retries = 0
+            if len(batch) == 1:
+                self._reject(batch[0], exc)
+                return True
+            # Find the rows at fault: the rest still commit
+            for position, item in enumerate(batch):
+                self._held = [item]
+                if not self._flush_batch():
+                    self._held = batch[position:]
+                    return False
+            return True
+
+        self._retries = 0
+        remove_archives(archives)
+        BUFFER_FLUSHES.inc()
+        BUFFER_FLUSHED_ROWS.inc(amount=len(batch))
+        self._checkpoint(batch[0].seq, batch[-1].seq)
+        for item, response_id in zip(batch, ids):
+            item.future.set_result(response_id)
+        return True
+
+    def _store(self, batch: List[PendingResponse]):
+        """
+        Insert the batch and fill in its dedup claims in one transaction;
+        returns the new ids and the archive files to remove
+        """
+        db = self.session_factory()
+        try:
+            # Serialised with archiving; an archived survey is restored in this transaction
+            archives = lock_live(db, {item.row["survey_id"] for item in batch})
+            ids = insert_returning_ids(db, SurveyResponse, [item.row for item in batch])
+            claims = [
+                {"claim_key": key, "claim_response_id": response_id}
+                for item, response_id in zip(batch, ids) for key in item.dedup_keys
+            ]
+            if claims:
+                table = ResponseDedupKey.__table__
+                db.execute(
+                    update(table).where(table.c.key_hash == bindparam("claim_key"))
+                    .values(response_id=bindparam("claim_response_id")),
+                    claims
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        return ids, archives
+
+    def _reject(self, item: PendingResponse, exc: Exception):
+        """
+        Give up on a row the database refuses: keep it in the .rejected file,
+        let retries of the submission claim its keys again, and resolve it in
+        the journal so it neither replays nor pins the journal
+        """
+        BUFFER_REJECTED.inc()
+        if self.spill_path:
+            record = {"seq": item.seq, "row": {**item.row, "submitted_at": item.row["submitted_at"].isoformat()},
+                      "error": repr(exc)}
+            with open(self.spill_path + ".rejected", "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        self._release_claims([item])
+        self._checkpoint(item.seq, item.seq, "rejected")
+        item.future.set_exception(exc)
+
+    def _release_claims(self, batch: List[PendingResponse]):
+        """
+        Let retries of rejected rows claim their keys again. If the journal
+        replays a row later, it is skipped when a retry already stored it.
+        """
+        keys = [key for item in batch for key in item.dedup_keys]
+        if not keys:
+            return
+        db = self.session_factory()
+        try:
+            release_claims(db, keys)
+        except Exception:
+            # The database is still failing; the claims expire with their TTL
+            db.rollback()
+        finally:
+            db.close()
+
+    def _checkpoint(self, first: int, last: int, outcome: str = "committed"):
+        if not self._journal:
+            return
+        with self._journal_lock:
+            if (last == self._seq and not self._queue and not self._held
+                    and self._journal.tell() > JOURNAL_COMPACT_BYTES):
+                # Nothing newer was journalled, so every record in the file is resolved
+                self._journal.seek(0)
+                self._journal.truncate()
+                return
+            self._journal.write(json.dumps({outcome: [first, last]}) + "\n")
+            self._journal.flush()
+
+    def _replay(self) -> int:
+        """
+        Re-queue journalled rows that were never checkpointed and commit them;
+        returns how many there were
+        """
+        if not os.path.exists(self.spill_path):
+            return 0
+        pending = {}
+        with open(self.spill_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn final write from a crash
+                if "committed" in record or "rejected" in record:
+                    first, last = record.get("committed") or record["rejected"]
+                    for seq in range(first, last + 1):
+                        pending.pop(seq, None)
+                else:
+                    pending[record["seq"]] = record
+        keys = [bytes.fromhex(key) for record in pending.values() for key in record.get("keys", ())]
+        if keys:
+            db = self.session_factory()
+            try:
+                stored = stored_claims(db, keys)
+            finally:
+                db.close()
+            # A retry stored these after their batch failed
+            pending = {
+                seq: record for seq, record in pending.items()
+                if not any(bytes.fromhex(key) in stored for key in record.get("keys", ()))
+            }
+        replayed = len(pending)
+        for seq in sorted(pending):
+            row = pending[seq]["row"]
+            row["submitted_at"] = datetime.fromisoformat(row["submitted_at"])
+            keys = [bytes.fromhex(key) for key in pending[seq].get("keys", ())]
+            self._queue.append(PendingResponse(seq, row, keys))
+        while self._queue:
+            if not self._flush_batch():
+                raise RuntimeError(f"Could not replay buffered responses from {self.spill_path}")
+        self._compact()
+        return replayed
+
+    def _compact(self):
+        # Everything is committed at this point, so the journal can start empty
+        if self.spill_path and os.path.exists(self.spill_path) and not self._queue and not self._held:
+            open(self.spill_path, "w").close()
+
+
+response_buffer = None
+
+# Set by `serve` in each forked worker: sequence numbers and checkpoints are per
+# process, so every worker slot journals to its own file
+journal_slot: Optional[int] = None
+
+
+def journal_path(spill_path: str, slot: Optional[int]) -> str:
+    return spill_path if slot is None else f"{spill_path}.{slot}"
+
+
+def journal_paths(spill_path: str) -> List[str]:
+    """
+    The single-process journal and every worker slot's journal that exist
+    """
+    slot_pattern = re.compile(re.escape(spill_path) + r"\.\d+")
+    slots = [path for path in glob.glob(glob.escape(spill_path) + ".*") if slot_pattern.fullmatch(path)]
+    return [path for path in [spill_path, *sorted(slots)] if os.path.exists(path)]
+
+
+def replay_journal(spill_path: str) -> int:
+    """
+    Commit the uncommitted rows of a journal nobody is writing to, such as the
+    one a dead worker left behind; returns how many were replayed
+    """
+    return ResponseBuffer(
+        SessionLocal, batch_size=settings.RESPONSE_BUFFER_BATCH_SIZE, spill_path=spill_path
+    )._replay()
+
+
+def get_response_buffer() -> ResponseBuffer:
+    global response_buffer
+    if response_buffer is None:
+        spill_path = settings.RESPONSE_BUFFER_SPILL_PATH
+        response_buffer = ResponseBuffer(
+            SessionLocal,
+            batch_size=settings.RESPONSE_BUFFER_BATCH_SIZE,
+            flush_interval=settings.RESPONSE_BUFFER_FLUSH_INTERVAL,
+            spill_path=journal_path(spill_path, journal_slot) if spill_path else None,
+            fsync=settings.RESPONSE_BUFFER_FSYNC,
+        )
+    return response_buffer
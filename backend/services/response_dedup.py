@@ -0,0 +1,174 @@
+"""
+Duplicate detection for POST /surveys/{id}/respond.
+
+Purge expired keys from cron with ``python -m services.response_dedup``.
+"""
+import json
+import hashlib
+from datetime import datetime, timedelta
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import registry
+from models.survey import ResponseDedupKey, SurveyResponse
+from utils.serializers import survey_response_to_dict
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+DUPLICATE_RESPONSES = registry.counter(
+    "response_duplicates_total", "Submissions answered from an earlier response", ("kind",))
+
+
+class DedupKey(NamedTuple):
+    key_hash: bytes
+    fingerprint: Optional[bytes]
+    expires_at: datetime
+
+
+def _digest(*parts) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\x1f")
+    return h.digest()
+
+
+def _canonical(responses: dict) -> bytes:
+    return json.dumps({str(k): v for k, v in responses.items()}, sort_keys=True, separators=(",", ":")).encode()
+
+
+def dedup_keys(survey_id: int, respondent_id: Optional[int], responses: dict,
+               idempotency_key: Optional[str] = None) -> List[DedupKey]:
+    """
+    Keys a submission claims: its Idempotency-Key (if sent) and, with
+    RESPONSE_DEDUP_CONTENT, the hash of a signed-in respondent's answers
+    """
+    keys = []
+    now = datetime.utcnow()
+    body = _canonical(responses)
+    if idempotency_key is not None:
+        if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Idempotency-Key must be 1-{MAX_IDEMPOTENCY_KEY_LENGTH} characters"
+            )
+        keys.append(DedupKey(
+            _digest("idempotency", survey_id, respondent_id, idempotency_key),
+            _digest(body),
+            now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        ))
+    # Identical anonymous answers are usually different people, so only dedup known respondents
+    if settings.RESPONSE_DEDUP_CONTENT and respondent_id is not None:
+        keys.append(DedupKey(
+            _digest("content", survey_id, respondent_id, body),
+            None,
+            now + timedelta(seconds=settings.RESPONSE_DEDUP_CONTENT_WINDOW)
+        ))
+    return keys
+
+
+def find_duplicate(db: Session, keys: List[DedupKey]) -> Optional[ResponseDedupKey]:
+    """
+    The live claim matching one of `keys`, if any. Expired claims are deleted
+    in the caller's transaction so the key can be claimed again.
+    """
+    rows = {
+        row.key_hash: row
+        for row in db.query(ResponseDedupKey).filter(ResponseDedupKey.key_hash.in_([k.key_hash for k in keys]))
+    }
+    now = datetime.utcnow()
+    for key in keys:
+        row = rows.get(key.key_hash)
+        if row is None:
+            continue
+        if row.expires_at <= now:
+            db.delete(row)
+            db.flush()
+            continue
+        if key.fingerprint is not None and row.fingerprint != key.fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request body"
+            )
+        DUPLICATE_RESPONSES.inc("idempotency_key" if key.fingerprint is not None else "content")
+        return row
+    return None
+
+
+def add_keys(db: Session, keys: List[DedupKey], response_id: Optional[int] = None):
+    db.add_all([
+        ResponseDedupKey(key_hash=k.key_hash, fingerprint=k.fingerprint,
+                         response_id=response_id, expires_at=k.expires_at)
+        for k in keys
+    ])
+
+
+def claim_pending(db: Session, keys: List[DedupKey]) -> Optional[ResponseDedupKey]:
+    """
+    Commit claims with no response yet (buffered ingest fills them in at group
+    commit). Returns the existing claim instead if the submission is a duplicate.
+    """
+    existing = find_duplicate(db, keys)
+    if existing is not None:
+        return existing
+    add_keys(db, keys)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent retry claimed the key first
+        db.rollback()
+        existing = find_duplicate(db, keys)
+        if existing is None:
+            raise
+    return existing
+
+
+def release_claims(db: Session, key_hashes: List[bytes]):
+    """
+    Drop claims still waiting for their response, so a retry of a submission
+    that failed to store can claim the key again
+    """
+    db.query(ResponseDedupKey).filter(
+        ResponseDedupKey.key_hash.in_(key_hashes), ResponseDedupKey.response_id.is_(None)
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def stored_claims(db: Session, key_hashes: List[bytes]) -> set:
+    """
+    Which of `key_hashes` are claimed by a stored response
+    """
+    rows = db.query(ResponseDedupKey.key_hash).filter(
+        ResponseDedupKey.key_hash.in_(key_hashes), ResponseDedupKey.response_id.isnot(None)
+    )
+    return {key_hash for key_hash, in rows}
+
+
+def replay_body(db: Session, claim: ResponseDedupKey) -> Optional[dict]:
+    """
+    The stored response a duplicate submission is answered with, or None while
+    the original is still queued
+    """
+    if claim.response_id is None:
+        return None
+    original = db.query(SurveyResponse).filter(SurveyResponse.id == claim.response_id).first()
+    return survey_response_to_dict(original) if original is not None else None
+
+
+def purge_expired(db: Session) -> int:
+    deleted = db.query(ResponseDedupKey).filter(
+        ResponseDedupKey.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as session:
+        print(f"Purged {purge_expired(session)} expired response dedup keys")
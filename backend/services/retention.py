@@ -0,0 +1,290 @@
+"""
+Retention: move the responses of surveys nobody has answered for
+ARCHIVE_INACTIVE_DAYS out of survey_responses into per-survey archive files.
+
+The survey's final analytics are computed from the archived rows and stored
+with the archive, so /surveys/analytics keeps answering from one row. Listing and
+exporting read the archive file; a new response to an archived survey
+rehydrates it first. Run from cron:
+
+    python -m services.retention archive [--inactive-days 180] [--dry-run]
+    python -m services.retention rehydrate <survey id>
+    python -m services.retention export <survey id> > responses.ndjson
+"""
+import os
+import sys
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import registry, span
+from core.responses import dumps
+from models.survey import Survey, SurveyArchive, SurveyResponse
+from utils.response_archive import write_archive, read_archive, iter_archive
+
+SURVEYS_ARCHIVED = registry.counter("surveys_archived_total", "Inactive surveys moved to archive files")
+SURVEYS_REHYDRATED = registry.counter("surveys_rehydrated_total", "Archived surveys moved back to survey_responses")
+
+# Rows of a few archives per process, so paging through one doesn't re-read the file
+_archived_rows: "OrderedDict[tuple, List[Dict]]" = OrderedDict()
+_archived_rows_lock = threading.Lock()
+ARCHIVED_ROWS_CACHE_SIZE = 4
+
+
+def archive_path(survey_id: int) -> str:
+    return os.path.join(settings.ARCHIVE_DIR, f"survey_{survey_id}.json.xz")
+
+
+def get_archive(db: Session, survey_id: int) -> Optional[SurveyArchive]:
+    return db.get(SurveyArchive, survey_id)
+
+
+def archived_responses(archive: SurveyArchive) -> List[Dict]:
+    """
+    An archived survey's responses in the SurveyResponseOut shape, ordered by
+    (submitted_at, id). Shared between callers: do not modify.
+    """
+    key = (archive.survey_id, archive.archived_at)
+    with _archived_rows_lock:
+        rows = _archived_rows.get(key)
+        if rows is not None:
+            _archived_rows.move_to_end(key)
+            return rows
+    with span('read_archive'):
+        rows = sorted(iter_archive(read_archive(archive.path)), key=lambda row: (row['submitted_at'], row['id']))
+    with _archived_rows_lock:
+        _archived_rows[key] = rows
+        while len(_archived_rows) > ARCHIVED_ROWS_CACHE_SIZE:
+            _archived_rows.popitem(last=False)
+    return rows
+
+
+def inactive_surveys(db: Session, inactive_days: int, now: Optional[datetime] = None) -> List[int]:
+    """
+    Surveys with stored responses, none of them newer than `inactive_days`
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=inactive_days)
+    rows = db.query(SurveyResponse.survey_id).group_by(SurveyResponse.survey_id).having(
+        func.max(SurveyResponse.submitted_at) < cutoff
+    ).order_by(SurveyResponse.survey_id)
+    return [survey_id for survey_id, in rows]
+
+
+def lock_survey(db: Session, survey_id: int):
+    """
+    Hold the survey's row lock until the caller's transaction ends. Archiving
+    takes it, and so does every path that stores a response. SQLite ignores
+    FOR UPDATE, so there a no-op UPDATE takes the database write lock instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(update(Survey).where(Survey.id == survey_id).values(id=Survey.id))
+    else:
+        db.execute(select(Survey.id).where(Survey.id == survey_id).with_for_update())
+
+
+def archive_survey(db: Session, survey_id: int, before: Optional[datetime] = None) -> Optional[SurveyArchive]:
+    """
+    Under the survey's row lock, write its responses to the archive file, compute
+    the final analytics from those same rows, then store the archive row and
+    delete the responses in one transaction. Returns None, archiving nothing,
+    if there are no responses or one was submitted at or after `before`.
+    """
+    from services.survey_service import analyze_rows
+
+    lock_survey(db, survey_id)
+    if get_archive(db, survey_id) is not None:
+        db.rollback()
+        return None
+    rows = db.query(
+        SurveyResponse.id, SurveyResponse.respondent_id, SurveyResponse.submitted_at, SurveyResponse.responses
+    ).filter(SurveyResponse.survey_id == survey_id).order_by(SurveyResponse.id).all()
+    last_submitted_at = max((row.submitted_at for row in rows if row.submitted_at), default=None)
+    if not rows or (before is not None and last_submitted_at is not None and last_submitted_at >= before):
+        db.rollback()
+        return None
+
+    with span('final_analytics'):
+        # Round-trip through the API encoder so NumPy scalars become plain JSON
+        analytics = orjson.loads(dumps(analyze_rows(db, survey_id, [(row.id, row.responses) for row in rows])))
+    path = archive_path(survey_id)
+    with span('write_archive'):
+        count = write_archive(path, survey_id, rows)
+
+    archive = SurveyArchive(
+        survey_id=survey_id,
+        path=path,
+        response_count=count,
+        last_submitted_at=last_submitted_at,
+        analytics=analytics,
+        archived_at=datetime.utcnow()
+    )
+    db.add(archive)
+    db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).delete(synchronize_session=False)
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(path)
+        raise
+    SURVEYS_ARCHIVED.inc()
+    return archive
+
+
+def _restore(db: Session, survey_id: int) -> Optional[Tuple[str, int]]:
+    """
+    Claim the survey's archive by deleting its row and insert the archived
+    responses, keeping their ids, in the caller's transaction. A concurrent
+    claim waits for this one to commit and then finds nothing to restore.
+    Returns the archive file, to remove after commit, and the row count.
+    """
+    table = SurveyArchive.__table__
+    path = db.execute(delete(table).where(table.c.survey_id == survey_id).returning(table.c.path)).scalar()
+    if path is None:
+        return None
+    rows = [
+        {
+            'id': row['id'],
+            'survey_id': survey_id,
+            'respondent_id': row['respondent_id'],
+            'responses': row['responses'],
+            'submitted_at': row['submitted_at']
+        }
+        for row in iter_archive(read_archive(path))
+    ]
+    with span('rehydrate_archive'):
+        for start in range(0, len(rows), 5000):
+            db.execute(SurveyResponse.__table__.insert(), rows[start:start + 5000])
+    return path, len(rows)
+
+
+def rehydrate_survey(db: Session, survey_id: int) -> int:
+    """
+    Move an archived survey's responses back into survey_responses, keeping their
+    ids, and drop the archive. Returns the number of responses restored, 0 if
+    the survey was not archived or another request restored it first.
+    """
+    if get_archive(db, survey_id) is None:
+        return 0
+    try:
+        restored = _restore(db, survey_id)
+    except Exception:
+        db.rollback()
+        raise
+    if restored is None:
+        db.rollback()
+        return 0
+    path, count = restored
+    db.commit()
+    os.remove(path)
+    SURVEYS_REHYDRATED.inc()
+    return count
+
+
+def lock_live(db: Session, survey_ids) -> List[str]:
+    """
+    Lock the surveys' rows until the caller commits, restoring any archived one
+    in the same transaction, so responses stored under the lock never land
+    beside an archive. Returns the archive files to remove after the commit.
+    """
+    paths = []
+    for survey_id in sorted(set(survey_ids)):  # one lock order, no deadlocks between batches
+        lock_survey(db, survey_id)
+        if get_archive(db, survey_id) is None:
+            continue
+        restored = _restore(db, survey_id)
+        if restored is not None:
+            paths.append(restored[0])
+            SURVEYS_REHYDRATED.inc()
+    return paths
+
+
+def remove_archives(paths: List[str]):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def ensure_live(db: Session, survey_id: int):
+    """
+    Before a new response is stored: lock the survey row until the caller
+    commits, rehydrating the survey first if it is archived. Blocking: call it
+    from a worker thread in async handlers.
+    """
+    while True:
+        try:
+            paths = lock_live(db, [survey_id])
+        except Exception:
+            db.rollback()
+            raise
+        if not paths:
+            return
+        # Commit the restore on its own; the loop takes the lock again
+        db.commit()
+        remove_archives(paths)
+
+
+def delete_archive(db: Session, survey_id: int):
+    """
+    Drop a survey's archive row (committed by the caller) and its file
+    """
+    archive = get_archive(db, survey_id)
+    if archive is None:
+        return
+    path = archive.path
+    db.delete(archive)
+    db.flush()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def archive_inactive(db: Session, inactive_days: int, dry_run: bool = False) -> List[int]:
+    archived = []
+    cutoff = datetime.utcnow() - timedelta(days=inactive_days)
+    for survey_id in inactive_surveys(db, inactive_days):
+        # Checked again under the survey's lock: it may have been answered since
+        if dry_run or archive_survey(db, survey_id, before=cutoff) is not None:
+            archived.append(survey_id)
+    return archived
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive the responses of inactive surveys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive_cmd = commands.add_parser("archive", help="archive every survey inactive for --inactive-days")
+    archive_cmd.add_argument("--inactive-days", type=int, default=settings.ARCHIVE_INACTIVE_DAYS)
+    archive_cmd.add_argument("--dry-run", action="store_true", help="only list the surveys")
+    rehydrate_cmd = commands.add_parser("rehydrate", help="move a survey's responses back into the database")
+    rehydrate_cmd.add_argument("survey_id", type=int)
+    export_cmd = commands.add_parser("export", help="write a survey's responses as NDJSON, archived or not")
+    export_cmd.add_argument("survey_id", type=int)
+    args = parser.parse_args()
+
+    with SessionLocal() as session:
+        if args.command == "archive":
+            if args.inactive_days <= 0:
+                sys.exit("Archiving is disabled (ARCHIVE_INACTIVE_DAYS=0)")
+            surveys = archive_inactive(session, args.inactive_days, args.dry_run)
+            print(f"{'Would archive' if args.dry_run else 'Archived'} {len(surveys)} surveys: {surveys}")
+        elif args.command == "rehydrate":
+            print(f"Restored {rehydrate_survey(session, args.survey_id)} responses")
+        elif args.command == "export":
+            archive = get_archive(session, args.survey_id)
+            if archive is not None:
+                rows = iter_archive(read_archive(archive.path))
+            else:
+                from utils.serializers import survey_response_to_dict
+
+                rows = (survey_response_to_dict(r) for r in session.query(SurveyResponse).filter(
+                    SurveyResponse.survey_id == args.survey_id
+                ).order_by(SurveyResponse.id).yield_per(5000))
+            for row in rows:
+                sys.stdout.buffer.write(dumps(row) + b"\n")
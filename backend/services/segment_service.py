@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import registry, span
+from models.survey import Question, QuestionType, SurveyResponse
+from services.retention import get_archive, archived_responses
+from services.survey_service import parse_answer_filter
+from utils.analytics import analyze_survey_responses
+from utils.segments import Clause, SegmentIndex
+
+SEGMENT_INDEX_BUILDS = registry.counter("segment_index_builds_total", "Segment indexes built from scratch")
+
+# Answers with a small fixed set of values; text answers are not indexed
+CATEGORICAL_TYPES = (QuestionType.MULTIPLE_CHOICE, QuestionType.DROPDOWN, QuestionType.RATING, QuestionType.BOOLEAN)
+
+_indexes: "OrderedDict[int, Tuple[SegmentIndex, threading.Lock]]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def parse_segment(values: Sequence[str], types: Dict[str, QuestionType]) -> List[Clause]:
+    """
+    `answer` query values to clauses: "<question id>:<answer>" alternatives
+    separated by "|" match either, separate values must all match
+    """
+    return [[parse_answer_filter(alternative, types) for alternative in value.split("|")] for value in values]
+
+
+def parse_crosstab(value: str) -> Tuple[str, str]:
+    rows_question, sep, columns_question = value.partition(",")
+    if not sep or not rows_question.strip().isdigit() or not columns_question.strip().isdigit():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"crosstab takes two question ids, <rows>,<columns>; got {value!r}"
+        )
+    return rows_question.strip(), columns_question.strip()
+
+
+def _categorical_questions(db: Session, survey_id: int) -> List[str]:
+    rows = db.query(Question.id, Question.question_type).filter(Question.survey_id == survey_id)
+    return [str(question_id) for question_id, question_type in rows if question_type in CATEGORICAL_TYPES]
+
+
+def _entry(survey_id: int, questions: List[str]) -> Tuple[SegmentIndex, threading.Lock]:
+    with _indexes_lock:
+        entry = _indexes.get(survey_id)
+        if entry is None or entry[0].questions != frozenset(questions):
+            entry = _indexes[survey_id] = (SegmentIndex(questions), threading.Lock())
+        _indexes.move_to_end(survey_id)
+        while len(_indexes) > settings.SEGMENT_INDEX_CACHE_SURVEYS:
+            _indexes.popitem(last=False)
+        return entry
+
+
+def refresh_index(db: Session, survey_id: int, index: SegmentIndex) -> SegmentIndex:
+    """
+    Bring `index` up to date: responses past its last id are appended, and it is
+    rebuilt if the counts still disagree (a commit landed behind the watermark
+    or rows were removed). Archived surveys are indexed from their archive
+    file. Call with the index's lock held.
+    """
+    archive = get_archive(db, survey_id)
+    if archive is not None:
+        if index.size == archive.response_count:
+            return index
+        SEGMENT_INDEX_BUILDS.inc()
+        rebuilt = SegmentIndex(index.questions)
+        with span('segment_index_build'):
+            rebuilt.add((row['id'], row['responses']) for row in archived_responses(archive))
+        return rebuilt
+
+    def responses(after: int):
+        return db.query(SurveyResponse.id, SurveyResponse.responses).filter(
+            SurveyResponse.survey_id == survey_id, SurveyResponse.id > after
+        ).order_by(SurveyResponse.id)
+
+    stored = db.query(func.count(SurveyResponse.id)).filter(SurveyResponse.survey_id == survey_id).scalar()
+    if stored == index.size:
+        return index
+    if stored > index.size:
+        with span('segment_index_extend'):
+            index.add(responses(index.last_response_id))
+        if stored == index.size:
+            return index
+
+    SEGMENT_INDEX_BUILDS.inc()
+    rebuilt = SegmentIndex(index.questions)
+    with span('segment_index_build'):
+        rebuilt.add(responses(0))
+    return rebuilt
+
+
+def segment_index(db: Session, survey_id: int) -> Tuple[SegmentIndex, threading.Lock]:
+    questions = _categorical_questions(db, survey_id)
+    index, lock = _entry(survey_id, questions)
+    with lock:
+        current = refresh_index(db, survey_id, index)
+    if current is not index:
+        with _indexes_lock:
+            _indexes[survey_id] = (current, lock)
+    return current, lock
+
+
+def segmented_analytics(
+    db: Session,
+    survey_id: int,
+    clauses: Sequence[Clause] = (),
+    crosstab: Optional[Tuple[str, str]] = None
+) -> Dict:
+    """
+    Survey analytics over the responses matching `clauses` (the SurveyAnalytics
+    shape plus a `segment` summary), with an optional cross-tab of two
+    categorical questions within that segment
+    """
+    index, lock = segment_index(db, survey_id)
+    with lock:
+        for question_id in [q for clause in clauses for q, _ in clause] + list(crosstab or ()):
+            if question_id not in index.questions:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Question {question_id} is not a choice, dropdown, rating or boolean question of this survey"
+                )
+        with span('segment_select'):
+            selected = index.select(clauses)
+            responses = index.selected_responses(selected) if selected else []
+        table = index.crosstab(*crosstab, selected) if crosstab else None
+        total = index.size
+
+    analytics = analyze_survey_responses([{'responses': r} for r in responses])
+    analytics['segment'] = {'matched': len(responses), 'of': total}
+    if table is not None:
+        analytics['crosstab'] = table
+    return analytics
@@ -0,0 +1,122 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from core.config import settings
+from core.metrics import registry
+from core.responses import dumps
+
+SURVEY_CACHE_REQUESTS = registry.counter(
+    "survey_cache_requests_total", "Survey definition cache lookups", ("result",))
+
+
+class CachedSurvey:
+    __slots__ = ("body", "etag", "expires_at")
+
+    def __init__(self, body: bytes, ttl: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = time.monotonic() + ttl
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    If-None-Match against our ETag: "*" or any listed tag, compared whole and
+    weakly (W/"x" matches "x")
+    """
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class _InFlight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[CachedSurvey] = None
+        self.error: Optional[BaseException] = None
+
+
+class SurveyCache:
+    """
+    Read-through LRU cache of pre-rendered survey definitions.
+
+    Concurrent misses for the same survey wait on the first caller's load instead
+    of querying the database themselves. The cache is per process; `ttl` bounds
+    how stale another worker's copy can be after an invalidation.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, CachedSurvey]" = OrderedDict()
+        self._in_flight: Dict[int, _InFlight] = {}
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, survey_id: int, loader: Callable[[], Optional[dict]]) -> Optional[CachedSurvey]:
+        """
+        Return the cached survey, calling `loader` (which returns the serialized
+        dict or None) at most once across concurrent callers on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(survey_id)
+            if entry is not None and entry.expires_at > time.monotonic():
+                self._entries.move_to_end(survey_id)
+                SURVEY_CACHE_REQUESTS.inc("hit")
+                return entry
+            flight = self._in_flight.get(survey_id)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[survey_id] = _InFlight()
+                generation = (self._epoch, self._generations.get(survey_id, 0))
+
+        if not leader:
+            SURVEY_CACHE_REQUESTS.inc("coalesced")
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        SURVEY_CACHE_REQUESTS.inc("miss")
+        try:
+            data = loader()
+            flight.result = CachedSurvey(dumps(data), self.ttl) if data is not None else None
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[survey_id]
+                # Skip storing if the survey was invalidated while we were loading it
+                current = (self._epoch, self._generations.get(survey_id, 0))
+                if flight.result is not None and current == generation:
+                    self._entries[survey_id] = flight.result
+                    self._entries.move_to_end(survey_id)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.event.set()
+        return flight.result
+
+    def invalidate(self, survey_id: int):
+        with self._lock:
+            self._entries.pop(survey_id, None)
+            self._generations[survey_id] = self._generations.get(survey_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+
+survey_cache = SurveyCache(settings.SURVEY_CACHE_MAX_ENTRIES, settings.SURVEY_CACHE_TTL)
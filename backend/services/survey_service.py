@@ -0,0 +1,389 @@
+import json
+import base64
+import bisect
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import or_, cast, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import span
+from database import insert_returning_ids
+from models.survey import Survey, Question, QuestionType, SurveyResponse
+from schemas.survey import SurveyCreate
+from services.response_dedup import DedupKey, find_duplicate, add_keys, replay_body
+from services.retention import get_archive, archived_responses
+from services.theme_service import text_question_themes
+from utils.analytics import analyze_survey_responses
+from utils.serializers import survey_response_to_dict
+
+
+def parse_question_type(value: str) -> QuestionType:
+	"""
+	Accept either the enum name ("TEXT", as the frontend sends) or its value ("text")
+	"""
+	try:
+		return QuestionType[value]
+	except KeyError:
+		pass
+	try:
+		return QuestionType(value)
+	except ValueError:
+		raise HTTPException(
+			status_code = status.HTTP_400_BAD_REQUEST,
+			detail = f"Unsupported question type: {value}"
+		)
+
+
+def create_surveys(db: Session, surveys: List[SurveyCreate], user_id: int) -> List[Dict]:
+	"""
+	Insert surveys and all their questions in one transaction: one multi-row
+	INSERT ... RETURNING for the surveys and one for the questions. Returns the
+	created surveys in the Survey schema shape.
+	"""
+	created_at = datetime.utcnow()
+	question_types = [[parse_question_type(q.question_type) for q in s.questions] for s in surveys]
+
+	survey_ids = insert_returning_ids(
+		db, Survey,
+		[
+			{
+				"title": s.title,
+				"description": s.description,
+				"created_by": user_id,
+				"created_at": created_at
+			}
+			for s in surveys
+		]
+	)
+
+	question_rows = [
+		{
+			"survey_id": survey_id,
+			"question_text": q.question_text,
+			"question_type": question_type,
+			"options": q.options
+		}
+		for survey_id, s, types in zip(survey_ids, surveys, question_types)
+		for q, question_type in zip(s.questions, types)
+	]
+	question_ids = []
+	if question_rows:
+		question_ids = insert_returning_ids(db, Question, question_rows)
+	db.commit()
+
+	created = {
+		survey_id: {
+			"title": s.title,
+			"description": s.description,
+			"id": survey_id,
+			"created_at": created_at,
+			"created_by": user_id,
+			"questions": []
+		}
+		for survey_id, s in zip(survey_ids, surveys)
+	}
+	for question_id, row in zip(question_ids, question_rows):
+		created[row["survey_id"]]["questions"].append({
+			"question_text": row["question_text"],
+			"question_type": row["question_type"].value,
+			"options": row["options"],
+			"id": question_id,
+			"survey_id": row["survey_id"]
+		})
+	return list(created.values())
+
+
+def submit_response(
+	db: Session,
+	survey_id: int,
+	respondent_id: Optional[int],
+	responses: Dict,
+	keys: List[DedupKey] = ()
+) -> Tuple[Optional[Dict], bool]:
+	"""
+	Store a response and its dedup claims in one transaction. If one of `keys`
+	was already claimed, nothing is written and the earlier response is
+	returned instead: (response, replayed).
+	"""
+	if keys:
+		existing = find_duplicate(db, keys)
+		if existing is not None:
+			return replay_body(db, existing), True
+
+	db_response = SurveyResponse(
+		survey_id = survey_id,
+		respondent_id = respondent_id,
+		responses = responses,
+		submitted_at = datetime.utcnow()
+	)
+	db.add(db_response)
+	try:
+		if keys:
+			db.flush()
+			add_keys(db, keys, db_response.id)
+		db.commit()
+	except IntegrityError:
+		# A concurrent retry with the same key committed first
+		db.rollback()
+		existing = find_duplicate(db, keys) if keys else None
+		if existing is None:
+			raise
+		return replay_body(db, existing), True
+
+	db.refresh(db_response)
+	return survey_response_to_dict(db_response), False
+
+
+def compute_survey_analytics(db: Session, survey_id: int) -> Dict:
+	"""
+	Aggregate every stored response of a survey into the SurveyAnalytics shape,
+	with themes for text questions
+	"""
+	archive = get_archive(db, survey_id)
+	if archive is not None:
+		# Computed when the responses were archived, and final since
+		return archive.analytics
+
+	with span('load_responses'):
+		rows = db.query(SurveyResponse.id, SurveyResponse.responses).filter(
+			SurveyResponse.survey_id == survey_id
+		).all()
+	return analyze_rows(db, survey_id, rows)
+
+
+def analyze_rows(db: Session, survey_id: int, rows) -> Dict:
+	"""
+	SurveyAnalytics of `rows` of (response id, responses), with themes for text questions
+	"""
+	if not rows:  # Prevent sending empty responses list to analyze_survey_responses
+		return {
+			'total_responses': 0,
+			'completion_rate': 0.0,
+			'average_time': 0.0,
+			'question_analytics': {}
+		}
+	analytics = analyze_survey_responses([{'responses': responses} for _, responses in rows])
+
+	with span('text_themes'):
+		for question_id, question_analytics in analytics['question_analytics'].items():
+			if question_analytics.get('type') != 'text' or not question_analytics.get('analysis'):
+				continue
+			themes = text_question_themes(db, survey_id, question_id, rows)
+			if themes is not None:
+				question_analytics['analysis']['themes'] = themes
+	return analytics
+
+
+def encode_cursor(submitted_at: datetime, response_id: int) -> str:
+	raw = json.dumps([submitted_at.isoformat(), response_id], separators = (",", ":")).encode()
+	return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+	try:
+		raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+		submitted_at, response_id = json.loads(raw)
+		return datetime.fromisoformat(submitted_at), int(response_id)
+	except (ValueError, TypeError):
+		raise HTTPException(
+			status_code = status.HTTP_400_BAD_REQUEST,
+			detail = "Invalid cursor"
+		)
+
+
+def question_types(db: Session, survey_id: int) -> Dict[str, QuestionType]:
+	"""
+	The survey's question types by question id, as answers are keyed
+	"""
+	rows = db.query(Question.id, Question.question_type).filter(Question.survey_id == survey_id)
+	return {str(question_id): question_type for question_id, question_type in rows}
+
+
+def parse_answer_filter(value: str, types: Dict[str, QuestionType]) -> Tuple[str, Any]:
+	"""
+	"<question id>:<answer>" with the answer read as the question stores it:
+	a number for ratings, true/false for boolean questions, the text otherwise
+	(so the option "5" of a dropdown stays the string "5")
+	"""
+	question_id, sep, answer = value.partition(":")
+	question_id = question_id.strip()
+	if not sep or not question_id.isdigit():
+		raise HTTPException(
+			status_code = status.HTTP_400_BAD_REQUEST,
+			detail = f"Answer filters look like <question id>:<answer>, got {value!r}"
+		)
+	question_type = types.get(question_id)
+	if question_type is None:
+		raise HTTPException(
+			status_code = status.HTTP_400_BAD_REQUEST,
+			detail = f"Question {question_id} does not exist in this survey"
+		)
+	if question_type == QuestionType.RATING:
+		try:
+			return question_id, int(answer)
+		except ValueError:
+			pass
+	elif question_type == QuestionType.BOOLEAN:
+		if answer.lower() in ("true", "false"):
+			return question_id, answer.lower() == "true"
+	else:
+		return question_id, answer
+	raise HTTPException(
+		status_code = status.HTTP_400_BAD_REQUEST,
+		detail = f"Question {question_id} takes {'a number' if question_type == QuestionType.RATING else 'true or false'}, got {answer!r}"
+	)
+
+
+def answer_condition(question_id: str, answer: Any):
+	"""
+	jsonb containment for one answer filter: the answer itself, or a choice
+	list holding it. Both forms can use the jsonb_path_ops GIN index.
+	"""
+	document = cast(SurveyResponse.responses, JSONB)
+	return or_(document.contains({question_id: answer}), document.contains({question_id: [answer]}))
+
+
+def _answer_matches(responses: Optional[Dict], answers: List[Tuple[str, Any]]) -> bool:
+	for question_id, expected in answers:
+		answer = (responses or {}).get(question_id)
+		if answer != expected and not (isinstance(answer, list) and expected in answer):
+			return False
+	return True
+
+
+def _answers_in_database(db: Session) -> bool:
+	return settings.RESPONSE_ENCODING == "json" and db.get_bind().dialect.name == "postgresql"
+
+
+def list_responses(
+	db: Session,
+	survey_id: int,
+	limit: int,
+	cursor: Optional[str] = None,
+	respondent_id: Optional[int] = None,
+	submitted_after: Optional[datetime] = None,
+	submitted_before: Optional[datetime] = None,
+	answers: List[Tuple[str, Any]] = (),
+	ascending: bool = False
+) -> Dict:
+	"""
+	One page of a survey's responses, newest first unless `ascending`, as
+	{"items": [...], "next_cursor": str | None}. Pages are keyset-paginated on
+	(submitted_at, id), so page 10 000 costs the same index seek as page 1.
+	Answer filters (question id, answer) match an equal answer or a choice list
+	containing it; on PostgreSQL they are jsonb containment tests, elsewhere
+	rows are filtered here and at most RESPONSES_FILTER_SCAN_ROWS are scanned
+	per page, which may then come back short with a next_cursor to continue.
+	Archived surveys are paged from their archive file the same way.
+	"""
+	archive = get_archive(db, survey_id)
+	if archive is not None:
+		return _list_archived(
+			archive, limit, cursor, respondent_id, submitted_after, submitted_before, answers, ascending
+		)
+
+	key = (SurveyResponse.submitted_at, SurveyResponse.id)
+	query = db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id)
+	if respondent_id is not None:
+		query = query.filter(SurveyResponse.respondent_id == respondent_id)
+	if submitted_after is not None:
+		query = query.filter(SurveyResponse.submitted_at >= submitted_after)
+	if submitted_before is not None:
+		query = query.filter(SurveyResponse.submitted_at < submitted_before)
+
+	in_database = _answers_in_database(db)
+	if answers and in_database:
+		query = query.filter(*(answer_condition(question_id, answer) for question_id, answer in answers))
+	query = query.order_by(*(column.asc() if ascending else column.desc() for column in key))
+
+	def after(position: Tuple[datetime, int]):
+		# A row-value comparison, which both PostgreSQL and SQLite turn into an index range
+		return tuple_(*key) > position if ascending else tuple_(*key) < position
+
+	position = decode_cursor(cursor) if cursor else None
+	if not answers or in_database:
+		with span('page_responses'):
+			rows = (query.filter(after(position)) if position else query).limit(limit + 1).all()
+		page = rows[:limit]
+		more = len(rows) > limit
+	else:
+		page, more, scanned = [], False, 0
+		batch_size = min(max(limit * 4, 100), settings.RESPONSES_FILTER_SCAN_ROWS)
+		with span('scan_responses'):
+			while scanned < settings.RESPONSES_FILTER_SCAN_ROWS:
+				rows = (query.filter(after(position)) if position else query).limit(batch_size).all()
+				for row in rows:
+					scanned += 1
+					position = (row.submitted_at, row.id)
+					if _answer_matches(row.responses, answers):
+						if len(page) == limit:
+							more = True
+							break
+						page.append(row)
+				if more or len(rows) < batch_size:
+					break
+			else:
+				# Scan budget spent: hand back what matched so far and where to resume
+				return {
+					'items': [survey_response_to_dict(row) for row in page],
+					'next_cursor': encode_cursor(*position)
+				}
+
+	return {
+		'items': [survey_response_to_dict(row) for row in page],
+		'next_cursor': encode_cursor(page[-1].submitted_at, page[-1].id) if more else None
+	}
+
+
+def _list_archived(
+	archive,
+	limit: int,
+	cursor: Optional[str],
+	respondent_id: Optional[int],
+	submitted_after: Optional[datetime],
+	submitted_before: Optional[datetime],
+	answers: List[Tuple[str, Any]],
+	ascending: bool
+) -> Dict:
+	"""
+	list_responses over an archived survey's rows, which come sorted by
+	(submitted_at, id): the cursor is a binary search, filters a scan from there
+	"""
+	rows = archived_responses(archive)
+	key = lambda row: (row['submitted_at'], row['id'])
+	position = decode_cursor(cursor) if cursor else None
+	if ascending:
+		start = bisect.bisect_right(rows, position, key = key) if position else 0
+		if submitted_after is not None:
+			start = max(start, bisect.bisect_left(rows, (submitted_after, -1), key = key))
+		candidates = range(start, len(rows))
+	else:
+		end = bisect.bisect_left(rows, position, key = key) if position else len(rows)
+		if submitted_before is not None:
+			end = min(end, bisect.bisect_left(rows, (submitted_before, -1), key = key))
+		candidates = range(end - 1, -1, -1)
+
+	page, more = [], False
+	with span('scan_archive'):
+		for i in candidates:
+			row = rows[i]
+			if (submitted_after is not None and row['submitted_at'] < submitted_after) or \
+					(submitted_before is not None and row['submitted_at'] >= submitted_before):
+				break
+			if respondent_id is not None and row['respondent_id'] != respondent_id:
+				continue
+			if answers and not _answer_matches(row['responses'], answers):
+				continue
+			if len(page) == limit:
+				more = True
+				break
+			page.append(row)
+	return {
+		'items': page,
+		'next_cursor': encode_cursor(page[-1]['submitted_at'], page[-1]['id']) if more else None
+	}
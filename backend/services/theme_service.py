@@ -0,0 +1,264 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.metrics import registry
+from database import SessionLocal
+from models.survey import SurveyThemeModel, SurveyResponse
+from utils.themes import ThemeModel
+
+THEME_MODEL_FITS = registry.counter("theme_model_fits_total", "Theme models fitted", ("reason",))
+THEME_MODEL_FIT_FAILURES = registry.counter("theme_model_fit_failures_total", "Background theme refits that failed")
+THEME_ASSIGNMENT_RECOUNTS = registry.counter(
+    "theme_assignment_recounts_total", "Text-question theme counts recounted from every answer"
+)
+
+_models: Dict[str, ThemeModel] = {}
+_refitting = set()
+_refit_lock = threading.Lock()
+_refit_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="theme-refit")
+
+
+class _Assignments:
+    """
+    Answers per theme of a text question, advanced incrementally past last_response_id
+    """
+    __slots__ = ("fitted_at", "counts", "last_response_id")
+
+    def __init__(self, fitted_at: datetime, counts: List[int], last_response_id: int):
+        self.fitted_at = fitted_at
+        self.counts = counts
+        self.last_response_id = last_response_id
+
+
+_assignments: Dict[str, _Assignments] = {}
+_assignments_lock = threading.Lock()
+
+
+def survey_scope(survey_id: int) -> str:
+    return f"survey:{survey_id}"
+
+
+def question_scope(question_id) -> str:
+    return f"question:{question_id}"
+
+
+def load_theme_model(db: Session, scope: str) -> Optional[ThemeModel]:
+    """
+    The stored model for `scope`; unpickled once per process and fit
+    """
+    fitted_at = db.query(SurveyThemeModel.fitted_at).filter(SurveyThemeModel.scope == scope).scalar()
+    if fitted_at is None:
+        return None
+    cached = _models.get(scope)
+    if cached is not None and cached.fitted_at == fitted_at:
+        return cached
+    blob = db.query(SurveyThemeModel.model).filter(SurveyThemeModel.scope == scope).scalar()
+    if blob is None:
+        return None
+    model = _models[scope] = ThemeModel.loads(blob)
+    return model
+
+
+def save_theme_model(db: Session, scope: str, model: ThemeModel, survey_id: Optional[int] = None,
+                     assigned_counts: Optional[List[int]] = None, last_response_id: Optional[int] = None):
+    db.merge(SurveyThemeModel(
+        scope=scope,
+        survey_id=survey_id,
+        model=model.dumps(),
+        n_documents=model.n_documents,
+        fitted_at=model.fitted_at,
+        assigned_counts=assigned_counts,
+        last_response_id=last_response_id,
+    ))
+    db.commit()
+    _models[scope] = model
+
+
+def is_stale(model: ThemeModel) -> bool:
+    max_age = settings.THEME_MODEL_MAX_AGE_DAYS
+    return max_age > 0 and datetime.utcnow() - model.fitted_at > timedelta(days=max_age)
+
+
+def _claim_refit(scope: str) -> bool:
+    with _refit_lock:
+        if scope in _refitting:
+            return False
+        _refitting.add(scope)
+        return True
+
+
+def _release_refit(scope: str):
+    with _refit_lock:
+        _refitting.discard(scope)
+
+
+def classify_feedback(db: Session, survey_id: int, texts: Sequence[str], refit: bool = False) -> Tuple[Dict, bool]:
+    """
+    Assign feedback to the survey's stored themes, fitting and storing a model
+    first if there is none (or `refit`). Returns (analysis, stale) where stale
+    means the caller should schedule refit_theme_model.
+    """
+    scope = survey_scope(survey_id)
+    previous = load_theme_model(db, scope)
+    if previous is None or refit:
+        THEME_MODEL_FITS.inc("requested" if refit else "first_upload")
+        model, labels = ThemeModel.fit(texts, previous=previous)
+        save_theme_model(db, scope, model, survey_id)
+        fitted = True
+    else:
+        model = previous
+        labels = model.predict(texts)
+        fitted = False
+
+    analysis = model.summarize(labels)
+    analysis['model'] = {
+        'fitted_at': model.fitted_at,
+        'n_documents': model.n_documents,
+        'refitted': fitted
+    }
+    return analysis, not fitted and is_stale(model)
+
+
+def refit_theme_model(session_factory, survey_id: int, texts: Sequence[str]):
+    """
+    Background refresh on recent feedback; theme names carry over where the new
+    themes match the old ones. Concurrent requests for one survey refit once.
+    """
+    scope = survey_scope(survey_id)
+    if not _claim_refit(scope):
+        return
+    db = session_factory()
+    try:
+        previous = load_theme_model(db, scope)
+        if previous is not None and not is_stale(previous):
+            return
+        THEME_MODEL_FITS.inc("stale")
+        model, _ = ThemeModel.fit(texts, previous=previous)
+        save_theme_model(db, scope, model, survey_id)
+    finally:
+        db.close()
+        _release_refit(scope)
+
+
+def _text_answers(rows, question_key: str) -> List[Tuple[int, str]]:
+    answers = []
+    for response_id, responses in rows:
+        answer = (responses or {}).get(question_key)
+        if isinstance(answer, str) and answer:
+            answers.append((response_id, answer))
+    return answers
+
+
+def refit_question_themes(session_factory, survey_id: int, question_id) -> Optional[ThemeModel]:
+    """
+    Fit a text question's themes on its most recent TEXT_THEMES_FIT_SAMPLE
+    answers, assign the older ones to the new centroids and store the model
+    with the per-theme counts
+    """
+    scope = question_scope(question_id)
+    db = session_factory()
+    try:
+        rows = db.query(SurveyResponse.id, SurveyResponse.responses).filter(
+            SurveyResponse.survey_id == survey_id
+        ).order_by(SurveyResponse.id)
+        answers = _text_answers(rows, str(question_id))
+        if len(answers) < settings.TEXT_THEMES_MIN_ANSWERS:
+            return None
+
+        sample = answers[-settings.TEXT_THEMES_FIT_SAMPLE:]
+        older = answers[:-len(sample)]
+        previous = load_theme_model(db, scope)
+        model, labels = ThemeModel.fit([text for _, text in sample], previous=previous)
+        counts = [0] * model.n_themes
+        for label in labels:
+            counts[label] += 1
+        if older:
+            for label in model.predict([text for _, text in older]):
+                counts[label] += 1
+        THEME_MODEL_FITS.inc("text_question")
+        save_theme_model(db, scope, model, survey_id,
+                         assigned_counts=counts, last_response_id=answers[-1][0])
+        return model
+    finally:
+        db.close()
+
+
+def _run_question_refit(session_factory, survey_id: int, question_id):
+    scope = question_scope(question_id)
+    try:
+        refit_question_themes(session_factory, survey_id, question_id)
+    except Exception:
+        THEME_MODEL_FIT_FAILURES.inc()
+    finally:
+        _release_refit(scope)
+
+
+def schedule_question_refit(survey_id: int, question_id, session_factory=None):
+    """
+    Refit a text question's themes on the background thread, at most once at a time
+    """
+    if _claim_refit(question_scope(question_id)):
+        _refit_executor.submit(_run_question_refit, session_factory or SessionLocal, survey_id, question_id)
+
+
+def text_question_themes(db: Session, survey_id: int, question_id, rows) -> Optional[Dict]:
+    """
+    Themes of a text question's answers from `rows` of (response id, responses).
+    Only answers newer than the last seen response are run through the stored
+    model, unless the counts then disagree with the answers, which are all
+    counted again; fitting and refitting happen in the background.
+    """
+    answers = _text_answers(rows, str(question_id))
+    if len(answers) < settings.TEXT_THEMES_MIN_ANSWERS:
+        return None
+
+    scope = question_scope(question_id)
+    model = load_theme_model(db, scope)
+    if model is None:
+        schedule_question_refit(survey_id, question_id)
+        return {'status': 'fitting'}
+
+    with _assignments_lock:
+        state = _assignments.get(scope)
+        if state is None or state.fitted_at != model.fitted_at:
+            counts, last_response_id = db.query(
+                SurveyThemeModel.assigned_counts, SurveyThemeModel.last_response_id
+            ).filter(SurveyThemeModel.scope == scope).one()
+            state = _Assignments(model.fitted_at, list(counts or [0] * model.n_themes), last_response_id or 0)
+            _assignments[scope] = state
+        new = [text for response_id, text in answers if response_id > state.last_response_id]
+        if new:
+            for label in model.predict(new):
+                state.counts[label] += 1
+            state.last_response_id = max(response_id for response_id, _ in answers)
+        if sum(state.counts) != len(answers):
+            # A commit landed behind the watermark or answers were removed: count them all again
+            THEME_ASSIGNMENT_RECOUNTS.inc()
+            state.counts = [0] * model.n_themes
+            for label in model.predict([text for _, text in answers]):
+                state.counts[label] += 1
+            state.last_response_id = max(response_id for response_id, _ in answers)
+        counts = list(state.counts)
+
+    total = sum(counts)
+    if is_stale(model) or total > model.n_documents * settings.TEXT_THEMES_REFIT_GROWTH:
+        schedule_question_refit(survey_id, question_id)
+
+    return {
+        'status': 'ready',
+        'fitted_at': model.fitted_at,
+        'themes': [
+            {
+                'theme': name,
+                'keywords': keywords[:5],
+                'count': count,
+                'frequency': count / total if total else 0.0
+            }
+            for name, keywords, count in zip(model.names, model.keywords, counts)
+        ]
+    }
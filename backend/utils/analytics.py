@@ -1,14 +1,12 @@
 from collections import Counter
+from io import StringIO
 from typing import Dict, List, Union
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-import numpy as np
-from textblob import TextBlob
 import statistics
 from fastapi import status
 from fastapi import HTTPException
 
+from core.metrics import span
+
 def analyze_survey_responses(responses: List[dict]) -> Dict:
     """
     Analyze survey responses and generate comprehensive analytics
@@ -34,12 +32,20 @@ def analyze_question(answers: List[Union[str, int, float, List[str]]]) -> Dict:
     if not answers or all(a is None for a in answers):
         return {}
 
+    if isinstance(answers[0], bool):
+        # bool is an int subclass, but yes/no answers are choices, not numbers
+        with span('choice_frequencies'):
+            return analyze_multiple_choice_responses(
+                [["true" if a else "false"] if a is not None else None for a in answers]
+            )
     if isinstance(answers[0], (int, float)):
-        return analyze_numeric_responses(answers)
+        with span('numeric_stats'):
+            return analyze_numeric_responses(answers)
     elif isinstance(answers[0], str):
         return analyze_text_responses(answers)
     elif isinstance(answers[0], list):
-        return analyze_multiple_choice_responses(answers)
+        with span('choice_frequencies'):
+            return analyze_multiple_choice_responses(answers)
 
     return {}
 
@@ -48,6 +54,8 @@ def analyze_numeric_responses(answers: List[Union[int, float]]) -> Dict:
     """
     Analyze numeric responses with statistical measures
     """
+    import numpy as np
+
     valid_answers = [a for a in answers if a is not None]
 
     if not valid_answers:
@@ -89,9 +97,12 @@ def analyze_text_responses(answers: List[str]) -> Dict:
             'analysis': {}
         }
 
-    sentiments = [TextBlob(answer).sentiment.polarity for answer in valid_answers]
-    all_words = ' '.join(valid_answers).lower().split()
-    word_freq = Counter(all_words)
+    with span('textblob_sentiment'):
+        from textblob import TextBlob
+        sentiments = [TextBlob(answer).sentiment.polarity for answer in valid_answers]
+    with span('word_frequencies'):
+        all_words = ' '.join(valid_answers).lower().split()
+        word_freq = Counter(all_words)
 
     avg_length = sum(len(answer.split()) for answer in valid_answers) / len(valid_answers)
 
@@ -149,45 +160,26 @@ def analyze_multiple_choice_responses(answers: List[List[str]]) -> Dict:
     }
 
 
-def analyze_feedback_csv(file_content: str) -> Dict:
+def read_feedback_csv(file_content: str):
     """
-    Analyze CSV feedback using clustering and theme extraction
+    The `feedback` column of an uploaded CSV, with blanks as empty strings
     """
-    df = pd.read_csv(pd.compat.StringIO(file_content))
-
-    vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(df['feedback'].fillna(''))
-
-    n_clusters = min(5, len(df))
-    kmeans = KMeans(n_clusters=n_clusters)
-    kmeans.fit(tfidf_matrix)
+    # The ML stack is imported on first use so worker boot stays cheap
+    import pandas as pd
 
-    themes = []
-    suggested_questions = []
+    with span('csv_parse'):
+        df = pd.read_csv(StringIO(file_content))
+    return df['feedback'].fillna('')
 
-    for i in range(n_clusters):
-        cluster_docs = df[kmeans.labels_ == i]['feedback']
-        keywords = get_cluster_keywords(vectorizer, kmeans.cluster_centers_[i])
-        themes.append({
-            'theme': f"Theme {i + 1}",
-            'keywords': keywords,
-            'frequency': len(cluster_docs) / len(df)
-        })
-        suggested_questions.append(generate_question(keywords))
 
-    return {
-        'themes': themes,
-        'suggested_questions': suggested_questions
-    }
-
-
-def get_cluster_keywords(vectorizer, cluster_center, num_keywords=5):
+def analyze_feedback_csv(file_content: str) -> Dict:
     """
-    Extract most representative keywords from cluster center
+    Analyze CSV feedback using clustering and theme extraction
     """
-    feature_names = vectorizer.get_feature_names_out()
-    top_indices = cluster_center.argsort()[-num_keywords:][::-1]
-    return [feature_names[i] for i in top_indices]
+    from utils.themes import ThemeModel
+
+    model, labels = ThemeModel.fit(read_feedback_csv(file_content))
+    return model.summarize(labels)
 
 
 def generate_question(keywords):
@@ -226,7 +218,7 @@ def validate_survey_response(survey, response):
     """
     Validates survey responses against question types
     """
-    question_types = {q.id: q.question_type for q in survey.questions}
+    question_types = {q.id: getattr(q.question_type, 'value', q.question_type) for q in survey.questions}
 
     for question_id, answer in response.items():
         if question_id not in question_types:
@@ -242,6 +234,7 @@ def validate_survey_response(survey, response):
             "numeric": lambda a: isinstance(a, (int, float)),
             "text": lambda a: isinstance(a, str),
             "multiple_choice": lambda a: isinstance(a, (str, list)),
+            "dropdown": lambda a: isinstance(a, str),
             "rating": lambda a: isinstance(a, int) and 1 <= a <= 5,
             "boolean": lambda a: isinstance(a, bool)
         }
@@ -0,0 +1,192 @@
+"""
+Partition management for survey_responses on PostgreSQL.
+
+    python -m utils.partitioning migrate                 # convert the existing table
+    python -m utils.partitioning ensure --months-ahead 3 # range: create upcoming months
+    python -m utils.partitioning archive survey_responses_y2024m01 --to archive/
+
+The strategy comes from RESPONSE_PARTITIONING ("hash" by survey_id or "range"
+by submitted_at). Analytics queries filter on survey_id, so with hash
+partitioning the planner prunes every partition but one.
+"""
+import os
+import gzip
+import argparse
+from datetime import date
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from core.config import settings
+
+TABLE = "survey_responses"
+COLUMNS = "id, survey_id, respondent_id, responses, submitted_at"
+
+
+def _month_start(day: date, offset: int = 0) -> date:
+    month_index = day.year * 12 + day.month - 1 + offset
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def range_partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def hash_partition_ddl(partitions: int) -> List[str]:
+    return [
+        f"CREATE TABLE IF NOT EXISTS {TABLE}_p{i} PARTITION OF {TABLE} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})"
+        for i in range(partitions)
+    ]
+
+
+def range_partition_ddl(start: date, months: int) -> List[str]:
+    """
+    Monthly partitions from the month of `start`, plus a default partition
+    that catches rows outside the covered range
+    """
+    statements = []
+    for offset in range(months):
+        lower, upper = _month_start(start, offset), _month_start(start, offset + 1)
+        statements.append(
+            f"CREATE TABLE IF NOT EXISTS {range_partition_name(lower)} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    statements.append(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+    return statements
+
+
+def range_partition_attach_ddl(month: date) -> List[str]:
+    """
+    Add the partition for `month` to a table that already has a default
+    partition: rows of that month that landed in the default are moved into
+    the new table before it is attached, since they would overlap it
+    """
+    lower, upper = _month_start(month), _month_start(month, 1)
+    name = range_partition_name(lower)
+    bounds = f"submitted_at >= '{lower.isoformat()}' AND submitted_at < '{upper.isoformat()}'"
+    return [
+        f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+        f"WITH moved AS (DELETE FROM {TABLE}_default WHERE {bounds} RETURNING {COLUMNS}) "
+        f"INSERT INTO {name} ({COLUMNS}) SELECT {COLUMNS} FROM moved",
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')",
+    ]
+
+
+def partition_ddl(strategy: str, start: Optional[date] = None, months: int = 12) -> List[str]:
+    if strategy == "hash":
+        return hash_partition_ddl(settings.RESPONSE_HASH_PARTITIONS)
+    if strategy == "range":
+        return range_partition_ddl(start or _month_start(date.today()), months)
+    raise ValueError(f"Unknown partitioning strategy: {strategy}")
+
+
+def migrate(engine: Engine, keep_legacy: bool = False):
+    """
+    Move an unpartitioned survey_responses into a partitioned table of the same name
+    """
+    from models.survey import SurveyResponse
+
+    strategy = settings.RESPONSE_PARTITIONING
+    if strategy == "none":
+        raise SystemExit("Set RESPONSE_PARTITIONING to 'hash' or 'range' first")
+
+    table = SurveyResponse.__table__
+    with engine.begin() as conn:
+        first_row = conn.execute(text(f"SELECT min(submitted_at) FROM {TABLE}")).scalar()
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq RENAME TO {TABLE}_legacy_id_seq"))
+        for index in table.indexes:
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name}_legacy"))
+        conn.execute(text(f"ALTER INDEX IF EXISTS {TABLE}_pkey RENAME TO {TABLE}_legacy_pkey"))
+
+        conn.execute(CreateTable(table))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index))
+
+        start = _month_start(first_row.date()) if first_row else None
+        months = 12
+        if start:
+            today = date.today()
+            months = (today.year - start.year) * 12 + today.month - start.month + 4
+        for statement in partition_ddl(strategy, start, months):
+            conn.execute(text(statement))
+
+        conn.execute(text(f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {TABLE}_legacy"))
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+            f"COALESCE((SELECT max(id) FROM {TABLE}), 0) + 1, false)"
+        ))
+        if not keep_legacy:
+            conn.execute(text(f"DROP TABLE {TABLE}_legacy"))
+
+
+def ensure_range_partitions(engine: Engine, months_ahead: int = 3):
+    """
+    Create this month's and the next `months_ahead` monthly partitions
+    """
+    start = _month_start(date.today())
+    with engine.begin() as conn:
+        for offset in range(months_ahead + 1):
+            month = _month_start(start, offset)
+            if conn.execute(text("SELECT to_regclass(:name)"), {"name": range_partition_name(month)}).scalar():
+                continue
+            for statement in range_partition_attach_ddl(month):
+                conn.execute(text(statement))
+
+
+def detach_partition(engine: Engine, name: str):
+    """
+    Detach without blocking writers to the parent; the partition becomes a plain table
+    """
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+
+
+def archive_partition(engine: Engine, name: str, directory: str) -> str:
+    """
+    Detach a partition, dump it as gzipped CSV and drop it
+    """
+    detach_partition(engine, name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.csv.gz")
+
+    raw = engine.raw_connection()
+    try:
+        with gzip.open(path, "wt", encoding="utf-8") as out:
+            raw.cursor().copy_expert(f"COPY {name} ({COLUMNS}) TO STDOUT WITH CSV HEADER", out)
+        raw.cursor().execute(f"DROP TABLE {name}")
+        raw.commit()
+    finally:
+        raw.close()
+    return path
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_cmd = commands.add_parser("migrate", help="convert survey_responses to a partitioned table")
+    migrate_cmd.add_argument("--keep-legacy", action="store_true")
+    ensure_cmd = commands.add_parser("ensure", help="create upcoming monthly range partitions")
+    ensure_cmd.add_argument("--months-ahead", type=int, default=3)
+    detach_cmd = commands.add_parser("detach", help="detach a partition")
+    detach_cmd.add_argument("name")
+    archive_cmd = commands.add_parser("archive", help="detach, dump to gzipped CSV and drop a partition")
+    archive_cmd.add_argument("name")
+    archive_cmd.add_argument("--to", default="archive")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate(engine, keep_legacy=args.keep_legacy)
+    elif args.command == "ensure":
+        ensure_range_partitions(engine, args.months_ahead)
+    elif args.command == "detach":
+        detach_partition(engine, args.name)
+    elif args.command == "archive":
+        print(archive_partition(engine, args.name, args.to))
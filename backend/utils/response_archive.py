@@ -0,0 +1,95 @@
+"""
+Compressed columnar files holding an archived survey's responses.
+
+One file per survey: an LZMA-compressed JSON document with one list per column
+(id, respondent_id, submitted_at) and one per question, aligned by row. Values
+of a question sit together, so the repeated choices and ratings compress far
+better than the same answers spread across per-row JSON objects.
+
+    {"format": 2, "survey_id": 7, "count": 2,
+     "columns": {"id": [...], "respondent_id": [...], "submitted_at": [...]},
+     "answers": {"<question id>": [answer or null, ...]},
+     "missing": {"<question id>": [rows that did not answer it, ...]}}
+
+`missing` tells an unanswered question from an answer stored as null.
+"""
+import os
+import lzma
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, Tuple
+
+import orjson
+
+from core.responses import dumps
+
+ARCHIVE_FORMAT = 2
+
+# (id, respondent_id, submitted_at, responses)
+ArchiveRow = Tuple[int, int, datetime, Dict]
+
+
+def write_archive(path: str, survey_id: int, rows: Iterable[ArchiveRow]) -> int:
+    """
+    Write rows to `path` atomically (temporary file, fsync, rename); returns the row count
+    """
+    ids, respondents, submitted = [], [], []
+    answers: Dict[str, list] = {}
+    missing: Dict[str, list] = {}
+    for count, (response_id, respondent_id, submitted_at, responses) in enumerate(rows):
+        ids.append(response_id)
+        respondents.append(respondent_id)
+        submitted.append(submitted_at)
+        for question_id, answer in (responses or {}).items():
+            column = answers.get(question_id)
+            if column is None:
+                column = answers[question_id] = [None] * count
+                if count:
+                    missing[question_id] = list(range(count))
+            column.append(answer)
+        for question_id, column in answers.items():
+            if len(column) == count:
+                column.append(None)
+                missing.setdefault(question_id, []).append(count)
+
+    document = {
+        "format": ARCHIVE_FORMAT,
+        "survey_id": survey_id,
+        "count": len(ids),
+        "columns": {"id": ids, "respondent_id": respondents, "submitted_at": submitted},
+        "answers": answers,
+        "missing": missing,
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    partial = path + ".partial"
+    with open(partial, "wb") as f:
+        f.write(lzma.compress(dumps(document)))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    return len(ids)
+
+
+def read_archive(path: str) -> Dict:
+    with open(path, "rb") as f:
+        document = orjson.loads(lzma.decompress(f.read()))
+    if document.get("format") != ARCHIVE_FORMAT:
+        raise ValueError(f"Unsupported response archive format in {path}: {document.get('format')}")
+    return document
+
+
+def iter_archive(document: Dict) -> Iterator[Dict]:
+    """
+    Rows of a read archive in the SurveyResponseOut shape, in id order
+    """
+    columns = document["columns"]
+    answers = list(document["answers"].items())
+    missing = {q: set(rows) for q, rows in document["missing"].items()}
+    for i, response_id in enumerate(columns["id"]):
+        submitted_at = columns["submitted_at"][i]
+        yield {
+            'survey_id': document["survey_id"],
+            'responses': {q: column[i] for q, column in answers if i not in missing.get(q, ())},
+            'id': response_id,
+            'respondent_id': columns["respondent_id"][i],
+            'submitted_at': datetime.fromisoformat(submitted_at) if submitted_at else None
+        }
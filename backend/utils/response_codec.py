@@ -0,0 +1,303 @@
+"""
+Storage encodings for SurveyResponse.responses, selected per deployment with
+RESPONSE_ENCODING:
+
+- ``json``: the JSON column type (default, queryable with database JSON operators)
+- ``msgpack``: MessagePack with integer question ids (needs ``pip install msgpack``)
+- ``compact``: the stdlib-only layout below
+
+Every encoding decodes to the same ``{"<question id>": answer}`` dict the JSON
+column returns, so the API and analytics see no difference. Convert stored rows
+with ``python -m utils.response_codec migrate --from json --to compact``.
+
+Compact layout: a version byte, the answer count and then, in question id order,
+the id as a varint delta from the previous one followed by a type tag and the
+answer. Question ids of a survey are allocated together, so deltas are usually
+one byte, against a quoted string key per answer in JSON.
+"""
+import json
+import struct
+import argparse
+from typing import Dict
+
+from sqlalchemy import LargeBinary, text
+from sqlalchemy.types import TypeDecorator
+
+COMPACT_VERSION = 1
+JSON_FALLBACK_VERSION = 0
+
+TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_STR_LIST, TAG_JSON = range(8)
+
+_double = struct.Struct("<d")
+
+
+class Codec:
+    name = ""
+
+    def encode(self, responses: Dict) -> bytes:
+        raise NotImplementedError
+
+    def decode(self, data: bytes) -> Dict:
+        raise NotImplementedError
+
+
+class JsonCodec(Codec):
+    name = "json"
+
+    def encode(self, responses: Dict) -> bytes:
+        return json.dumps({str(k): v for k, v in responses.items()}, separators=(",", ":")).encode()
+
+    def decode(self, data: bytes) -> Dict:
+        return json.loads(data)
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("RESPONSE_ENCODING=msgpack needs the msgpack package (pip install msgpack)")
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, responses: Dict) -> bytes:
+        return self._packb({int(k): v for k, v in responses.items()})
+
+    def decode(self, data: bytes) -> Dict:
+        return {str(k): v for k, v in self._unpackb(data, strict_map_key=False).items()}
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    byte = data[pos]
+    if byte < 0x80:
+        return byte, pos + 1
+    value, shift = byte & 0x7F, 7
+    while True:
+        pos += 1
+        byte = data[pos]
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos + 1
+        shift += 7
+
+
+def _write_str(out: bytearray, value: str):
+    raw = value.encode()
+    _write_varint(out, len(raw))
+    out += raw
+
+
+class CompactCodec(Codec):
+    name = "compact"
+
+    def encode(self, responses: Dict) -> bytes:
+        try:
+            items = sorted((int(k), v) for k, v in responses.items())
+        except (TypeError, ValueError):
+            items = None
+        if items is None or (items and items[0][0] < 0):
+            return bytes([JSON_FALLBACK_VERSION]) + JsonCodec().encode(responses)
+
+        out = bytearray((COMPACT_VERSION,))
+        _write_varint(out, len(items))
+        previous = 0
+        for question_id, answer in items:
+            _write_varint(out, question_id - previous)
+            previous = question_id
+            if answer is None:
+                out.append(TAG_NONE)
+            elif answer is True or answer is False:
+                out.append(TAG_TRUE if answer else TAG_FALSE)
+            elif isinstance(answer, int) and -2**63 <= answer < 2**63:
+                out.append(TAG_INT)
+                _write_varint(out, (answer << 1) ^ (answer >> 63))  # zigzag
+            elif isinstance(answer, float):
+                out.append(TAG_FLOAT)
+                out += _double.pack(answer)
+            elif isinstance(answer, str):
+                out.append(TAG_STR)
+                _write_str(out, answer)
+            elif isinstance(answer, list) and all(isinstance(a, str) for a in answer):
+                out.append(TAG_STR_LIST)
+                _write_varint(out, len(answer))
+                for choice in answer:
+                    _write_str(out, choice)
+            else:
+                out.append(TAG_JSON)
+                _write_str(out, json.dumps(answer, separators=(",", ":")))
+        return bytes(out)
+
+    def decode(self, data: bytes) -> Dict:
+        if data[0] == JSON_FALLBACK_VERSION:
+            return json.loads(data[1:])
+        if data[0] != COMPACT_VERSION:
+            raise ValueError(f"Unknown compact response version {data[0]}")
+
+        count, pos = _read_varint(data, 1)
+        responses = {}
+        question_id = 0
+        for _ in range(count):
+            delta, pos = _read_varint(data, pos)
+            question_id += delta
+            tag = data[pos]
+            pos += 1
+            if tag == TAG_STR:
+                length, pos = _read_varint(data, pos)
+                answer = data[pos:pos + length].decode()
+                pos += length
+            elif tag == TAG_INT:
+                zigzag, pos = _read_varint(data, pos)
+                answer = (zigzag >> 1) ^ -(zigzag & 1)
+            elif tag == TAG_STR_LIST:
+                n, pos = _read_varint(data, pos)
+                answer = []
+                for _ in range(n):
+                    length, pos = _read_varint(data, pos)
+                    answer.append(data[pos:pos + length].decode())
+                    pos += length
+            elif tag == TAG_FLOAT:
+                answer = _double.unpack_from(data, pos)[0]
+                pos += 8
+            elif tag == TAG_TRUE or tag == TAG_FALSE:
+                answer = tag == TAG_TRUE
+            elif tag == TAG_NONE:
+                answer = None
+            elif tag == TAG_JSON:
+                length, pos = _read_varint(data, pos)
+                answer = json.loads(data[pos:pos + length])
+                pos += length
+            else:
+                raise ValueError(f"Unknown compact answer tag {tag}")
+            responses[str(question_id)] = answer
+        return responses
+
+
+CODECS = {"json": JsonCodec, "msgpack": MsgpackCodec, "compact": CompactCodec}
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown response encoding: {name}")
+
+
+class EncodedResponses(TypeDecorator):
+    """
+    Binary column that stores responses with a Codec and hands back plain dicts
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, encoding: str):
+        super().__init__()
+        self.encoding = encoding
+        self.codec = get_codec(encoding)
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else self.codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.codec.decode(bytes(value))
+
+
+def _load_stored(value, source: Codec) -> Dict:
+    # JSON columns come back as dicts (psycopg2) or text (SQLite); binary ones as bytes/memoryview
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        return json.loads(value)
+    return source.decode(bytes(value))
+
+
+def _reencode(conn, table: str, rows, source_codec: Codec, target_codec: Codec, target: str):
+    updates = []
+    for row_id, value in rows:
+        responses = _load_stored(value, source_codec) if value is not None else None
+        if responses is not None:
+            encoded = target_codec.encode(responses)
+            updates.append({"id": row_id, "value": encoded.decode() if target == "json" else encoded})
+    if updates:
+        conn.execute(text(f"UPDATE {table} SET responses_reencoded = :value WHERE id = :id"), updates)
+
+
+def _lock_for_swap(conn, table: str):
+    if conn.dialect.name == "sqlite":
+        # Take the write lock now rather than at the first write
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    else:
+        conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+
+
+def migrate(engine, source: str, target: str, batch_size: int = 5000) -> int:
+    """
+    Re-encode every stored response from `source` to `target` into a new column,
+    in id-ordered batches, then swap it in for `responses`. Restart the app with
+    RESPONSE_ENCODING=<target> afterwards.
+
+    The app can keep taking responses meanwhile: the swap locks the table and
+    first re-encodes the rows stored since their batch was copied. Stored
+    responses are never rewritten in place by the app; stop anything else that
+    updates `responses` before migrating.
+    """
+    source_codec, target_codec = get_codec(source), get_codec(target)
+    column_type = "JSON" if target == "json" else ("BYTEA" if engine.dialect.name == "postgresql" else "BLOB")
+    table = "survey_responses"
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN responses_reencoded {column_type}"))
+
+    migrated, after = 0, -1
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, responses FROM {table} WHERE id > :after ORDER BY id LIMIT :limit"),
+                {"after": after, "limit": batch_size}
+            ).all()
+            if not rows:
+                break
+            _reencode(conn, table, rows, source_codec, target_codec, target)
+            migrated += len(rows)
+            after = rows[-1][0]
+
+    with engine.begin() as conn:
+        _lock_for_swap(conn, table)
+        # Rows inserted while the batches ran (new responses, rehydrated archives)
+        rows = conn.execute(text(
+            f"SELECT id, responses FROM {table} WHERE responses_reencoded IS NULL AND responses IS NOT NULL"
+        )).all()
+        _reencode(conn, table, rows, source_codec, target_codec, target)
+        migrated += len(rows)
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN responses"))
+        conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN responses_reencoded TO responses"))
+        if target == "json" and conn.dialect.name == "postgresql":
+            # Dropping the old column dropped the answer filters' GIN index; see models.survey
+            conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_survey_responses_answers ON {table} "
+                f"USING gin ((responses::jsonb) jsonb_path_ops)"
+            ))
+    return migrated
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Convert stored survey responses to another encoding")
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_cmd = commands.add_parser("migrate", help="re-encode survey_responses.responses in place")
+    migrate_cmd.add_argument("--from", dest="source", choices=sorted(CODECS), required=True)
+    migrate_cmd.add_argument("--to", dest="target", choices=sorted(CODECS), required=True)
+    migrate_cmd.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print(f"Re-encoded {migrate(engine, args.source, args.target, args.batch_size)} responses")
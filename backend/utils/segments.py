@@ -0,0 +1,138 @@
+"""
+Bitmap indexes over a survey's responses for segment filters and cross-tabs.
+
+Responses get dense positions in id order. Each categorical question keeps one
+bitmap per answer value (a Python int with bit i set when response i chose
+it), so "answered Yes to Q1 and rated Q3 4 or 5" is an AND of an OR of
+bitmaps and a cross-tab cell is the popcount of two bitmaps ANDed with the
+segment.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+# (question id, answer) alternatives ORed together; clauses are ANDed
+Clause = Sequence[Tuple[str, Any]]
+
+
+def _value_key(value) -> Tuple[bool, Any]:
+    # True == 1 in a dict, but a boolean answer is not the rating 1
+    return isinstance(value, bool), value
+
+
+def _to_bitmap(positions: List[int], size: int) -> int:
+    import numpy as np
+
+    bits = np.zeros(size, dtype=bool)
+    bits[positions] = True
+    return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
+
+
+def value_label(value) -> str:
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+class SegmentIndex:
+    """
+    Per-question, per-answer bitmaps plus the responses themselves, extended in
+    place as new responses arrive
+    """
+
+    def __init__(self, questions: Iterable[str]):
+        self.questions = frozenset(questions)
+        self.responses: List[Dict] = []
+        self.bitmaps: Dict[str, Dict[Tuple[bool, Any], int]] = {q: {} for q in self.questions}
+        self.last_response_id = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.responses)
+
+    @property
+    def everyone(self) -> int:
+        return (1 << self.size) - 1
+
+    def add(self, rows: Iterable[Tuple[int, Dict]]):
+        """
+        Append (response id, responses) rows, in ascending id order
+        """
+        batch = [(response_id, responses or {}) for response_id, responses in rows]
+        if not batch:
+            return
+        start = self.size
+        self.responses.extend(responses for _, responses in batch)
+        self.last_response_id = batch[-1][0]
+
+        # Setting bits one at a time copies the whole int each time: collect each
+        # value's positions per question and merge them into its bitmap once
+        for question_id in self.questions:
+            positions: Dict[Tuple[bool, Any], List[int]] = {}
+            for offset, (_, responses) in enumerate(batch):
+                answer = responses.get(question_id)
+                if answer is None:
+                    continue
+                for value in answer if isinstance(answer, list) else (answer,):
+                    try:
+                        positions.setdefault((isinstance(value, bool), value), []).append(offset)
+                    except TypeError:  # unhashable answer: not a category
+                        pass
+            bitmaps = self.bitmaps[question_id]
+            for key, offsets in positions.items():
+                bitmaps[key] = bitmaps.get(key, 0) | (_to_bitmap(offsets, len(batch)) << start)
+
+    def match(self, question_id: str, value) -> int:
+        if question_id not in self.questions:
+            raise KeyError(question_id)
+        return self.bitmaps[question_id].get(_value_key(value), 0)
+
+    def select(self, clauses: Sequence[Clause]) -> int:
+        """
+        Bitmap of the responses matching every clause
+        """
+        selected = self.everyone
+        for clause in clauses:
+            alternatives = 0
+            for question_id, value in clause:
+                alternatives |= self.match(question_id, value)
+            selected &= alternatives
+            if not selected:
+                break
+        return selected
+
+    def selected_responses(self, selected: int) -> List[Dict]:
+        if selected == self.everyone:
+            return list(self.responses)
+        import numpy as np
+
+        raw = np.frombuffer(selected.to_bytes((self.size + 7) // 8 or 1, "little"), dtype=np.uint8)
+        positions = np.flatnonzero(np.unpackbits(raw, bitorder="little")[:self.size])
+        return [self.responses[i] for i in positions]
+
+    def crosstab(self, rows_question: str, columns_question: str, selected: int) -> Dict:
+        """
+        Response counts for each pair of answers to two categorical questions
+        within `selected`; a multiple choice response counts once per choice
+        """
+        row_bitmaps = [(value, bitmap & selected) for (_, value), bitmap in self.bitmaps[rows_question].items()]
+        column_bitmaps = [(value, bitmap & selected) for (_, value), bitmap in self.bitmaps[columns_question].items()]
+        row_bitmaps = [(value, bitmap) for value, bitmap in row_bitmaps if bitmap]
+        column_bitmaps = [(value, bitmap) for value, bitmap in column_bitmaps if bitmap]
+
+        counts = {}
+        for row_value, row_bitmap in row_bitmaps:
+            counts[value_label(row_value)] = {
+                value_label(column_value): (row_bitmap & column_bitmap).bit_count()
+                for column_value, column_bitmap in column_bitmaps
+            }
+        answered_rows = answered_columns = 0
+        for _, bitmap in row_bitmaps:
+            answered_rows |= bitmap
+        for _, bitmap in column_bitmaps:
+            answered_columns |= bitmap
+        return {
+            'rows': rows_question,
+            'columns': columns_question,
+            'counts': counts,
+            'row_totals': {value_label(value): bitmap.bit_count() for value, bitmap in row_bitmaps},
+            'column_totals': {value_label(value): bitmap.bit_count() for value, bitmap in column_bitmaps},
+            'total': (answered_rows & answered_columns).bit_count()
+        }
@@ -0,0 +1,49 @@
+from typing import Dict, List
+
+from models.survey import Survey, Question, SurveyResponse
+
+
+def question_to_dict(question: Question) -> Dict:
+    """
+    Serialize a Question row to the Question schema shape
+    """
+    question_type = question.question_type
+    return {
+        'question_text': question.question_text,
+        'question_type': getattr(question_type, 'value', question_type),
+        'options': question.options,
+        'id': question.id,
+        'survey_id': question.survey_id
+    }
+
+
+def survey_to_dict(survey: Survey) -> Dict:
+    """
+    Serialize a Survey row (with its questions) to the Survey schema shape
+    without going through Pydantic validation
+    """
+    return {
+        'title': survey.title,
+        'description': survey.description,
+        'id': survey.id,
+        'created_at': survey.created_at,
+        'created_by': survey.created_by,
+        'questions': [question_to_dict(q) for q in survey.questions]
+    }
+
+
+def surveys_to_list(surveys: List[Survey]) -> List[Dict]:
+    return [survey_to_dict(s) for s in surveys]
+
+
+def survey_response_to_dict(response: SurveyResponse) -> Dict:
+    """
+    Serialize a SurveyResponse row to the SurveyResponseOut schema shape
+    """
+    return {
+        'survey_id': response.survey_id,
+        'responses': response.responses,
+        'id': response.id,
+        'respondent_id': response.respondent_id,
+        'submitted_at': response.submitted_at
+    }
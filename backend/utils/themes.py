@@ -0,0 +1,142 @@
+"""
+Theme extraction with TF-IDF + KMeans, split into an expensive fit and a cheap
+assignment so a fitted model can be stored and reused for later feedback.
+"""
+import pickle
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from core.metrics import span
+
+KEYWORDS_PER_THEME = 5
+ALIGNMENT_KEYWORDS = 20  # compared between refits to carry theme names over
+MIN_ALIGNMENT_OVERLAP = 0.2
+
+
+def _top_keywords(centers, feature_names, count: int) -> List[List[str]]:
+    import numpy as np
+
+    top = np.argsort(centers, axis=1)[:, ::-1][:, :count]
+    return [[str(feature_names[i]) for i in row] for row in top]
+
+
+def _jaccard(a: Sequence[str], b: Sequence[str]) -> float:
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+class ThemeModel:
+    """
+    A fitted TF-IDF vocabulary and KMeans centroids plus the per-theme keywords,
+    computed once at fit time (one get_feature_names_out() call for all themes).
+    """
+
+    def __init__(self, vectorizer, kmeans, keywords: List[List[str]], names: List[str],
+                 n_documents: int, fitted_at: Optional[datetime] = None):
+        self.vectorizer = vectorizer
+        self.kmeans = kmeans
+        self.keywords = keywords
+        self.names = names
+        self.n_documents = n_documents
+        self.fitted_at = fitted_at or datetime.utcnow()
+
+    @property
+    def n_themes(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def fit(cls, texts: Sequence[str], n_clusters: int = 5, max_features: int = 1000,
+            previous: Optional["ThemeModel"] = None):
+        """
+        Fit on `texts`; returns (model, labels of `texts`). With `previous`,
+        themes that match an earlier theme's keywords keep its name.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.cluster import KMeans
+
+        with span('tfidf'):
+            vectorizer = TfidfVectorizer(max_features=max_features, stop_words='english')
+            tfidf_matrix = vectorizer.fit_transform(texts)
+
+        with span('kmeans'):
+            n_clusters = min(n_clusters, len(texts))
+            # Fixed seed so refits on similar data produce similar themes
+            kmeans = KMeans(n_clusters=n_clusters, random_state=0)
+            kmeans.fit(tfidf_matrix)
+
+        keywords = _top_keywords(kmeans.cluster_centers_, vectorizer.get_feature_names_out(), ALIGNMENT_KEYWORDS)
+        names = cls._align_names(keywords, previous)
+        return cls(vectorizer, kmeans, keywords, names, len(texts)), kmeans.labels_
+
+    @staticmethod
+    def _align_names(keywords: List[List[str]], previous: Optional["ThemeModel"]) -> List[str]:
+        if previous is None:
+            return [f"Theme {i + 1}" for i in range(len(keywords))]
+
+        # Greedily pair new and old themes by keyword overlap, best pairs first
+        pairs = sorted(
+            ((_jaccard(new, old), i, j)
+             for i, new in enumerate(keywords) for j, old in enumerate(previous.keywords)),
+            reverse=True
+        )
+        names: List[Optional[str]] = [None] * len(keywords)
+        taken = set()
+        for score, i, j in pairs:
+            if score < MIN_ALIGNMENT_OVERLAP:
+                break
+            if names[i] is None and j not in taken:
+                names[i] = previous.names[j]
+                taken.add(j)
+
+        used = set(previous.names)
+        next_number = len(used) + 1
+        for i, name in enumerate(names):
+            if name is None:
+                while f"Theme {next_number}" in used:
+                    next_number += 1
+                names[i] = f"Theme {next_number}"
+                used.add(names[i])
+        return names
+
+    def predict(self, texts: Sequence[str]):
+        """
+        Assign texts to the nearest existing theme: transform + predict, no refit
+        """
+        with span('theme_predict'):
+            return self.kmeans.predict(self.vectorizer.transform(texts))
+
+    def summarize(self, labels) -> Dict:
+        """
+        Themes with keywords and frequencies, plus suggested questions, for the
+        given theme assignments (the analyze_feedback_csv response shape)
+        """
+        from utils.analytics import generate_question
+
+        counts = [0] * self.n_themes
+        for label in labels:
+            counts[label] += 1
+        total = len(labels) or 1
+
+        themes = []
+        suggested_questions = []
+        for name, keywords, count in zip(self.names, self.keywords, counts):
+            top = keywords[:KEYWORDS_PER_THEME]
+            themes.append({
+                'theme': name,
+                'keywords': top,
+                'frequency': count / total
+            })
+            suggested_questions.append(generate_question(top))
+
+        return {
+            'themes': themes,
+            'suggested_questions': suggested_questions
+        }
+
+    def dumps(self) -> bytes:
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def loads(data: bytes) -> "ThemeModel":
+        # Only ever loaded from blobs this service wrote to its own database
+        return pickle.loads(data)
@@ -18,9 +18,51 @@ axiosInstance.interceptors.request.use((config) => {
   return config;
 });
 
+// One refresh at a time; requests that fail while it runs wait for the same result
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = (): Promise<string> => {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refreshToken');
+    const formData = new URLSearchParams();
+    formData.append('refresh_token', refreshToken || '');
+    refreshing = axios
+      .post(`${API_URL}/auth/refresh`, formData, {
+        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
+      })
+      .then((response) => {
+        localStorage.setItem('token', response.data.access_token);
+        localStorage.setItem('refreshToken', response.data.refresh_token);
+        return response.data.access_token;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 axiosInstance.interceptors.response.use(
   (response) => response,
-  (error) => {
+  async (error) => {
+    const original = error.config;
+    if (
+      error.response?.status === 401 &&
+      original &&
+      !original._retried &&
+      !original.url?.startsWith('/auth/token') &&
+      localStorage.getItem('refreshToken')
+    ) {
+      original._retried = true;
+      try {
+        const token = await refreshAccessToken();
+        original.headers.Authorization = `Bearer ${token}`;
+        return axiosInstance(original);
+      } catch {
+        // Fall through to the sign-out below
+      }
+    }
+
     if (error.response?.status === 422) {
       const validationErrors = error.response.data.detail;
       if (Array.isArray(validationErrors)) {
@@ -32,6 +74,7 @@ axiosInstance.interceptors.response.use(
       }
     } else if (error.response?.status === 401) {
       localStorage.removeItem('token');
+      localStorage.removeItem('refreshToken');
       window.location.href = '/login';
     } else if (error.response?.status === 500) {
       toast.error('Internal server error. Please try again later.');
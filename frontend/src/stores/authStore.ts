@@ -32,12 +32,14 @@ export const useAuthStore = create<AuthState>((set) => ({
       });
 
       localStorage.setItem('token', response.data.access_token);
+      localStorage.setItem('refreshToken', response.data.refresh_token);
 
       // Fetch user profile after successful login
       const profileResponse = await axiosInstance.get('/auth/profile');
       set({ user: profileResponse.data, isAuthenticated: true });
     } catch (error: any) {
       localStorage.removeItem('token');
+      localStorage.removeItem('refreshToken');
       set({ user: null, isAuthenticated: false });
       throw error;
     }
@@ -71,6 +73,7 @@ export const useAuthStore = create<AuthState>((set) => ({
 
   logout: () => {
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     set({ user: null, isAuthenticated: false });
   },
 
@@ -80,6 +83,7 @@ export const useAuthStore = create<AuthState>((set) => ({
       set({ user: response.data, isAuthenticated: true });
     } catch (error) {
       localStorage.removeItem('token');
+      localStorage.removeItem('refreshToken');
       set({ user: null, isAuthenticated: false });
     }
   },
@@ -19,4 +19,6 @@ export interface RegisterData {
 export interface AuthResponse {
   access_token: string;
   token_type: string;
+  expires_in: number;
+  refresh_token: string;
 }
\ No newline at end of file
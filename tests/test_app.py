@@ -4,10 +4,11 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from typing import Dict, Generator
 import json
-from datetime import datetime
+from datetime import date, datetime
 
 from main import app  # Your FastAPI app
 from database import Base, get_db
+from core.metrics import install_sql_hooks
 from models.user import User
 from models.survey import Survey, Question, SurveyResponse
 
@@ -15,6 +16,7 @@ from models.survey import Survey, Question, SurveyResponse
 SQLALCHEMY_TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_TEST_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+install_sql_hooks(engine)
 
 @pytest.fixture(scope="session")
 def db() -> Generator:
@@ -109,6 +111,39 @@ class TestAuthentication:
         assert "username" in data
         assert "email" in data
 
+    def test_refresh_token_rotation_and_revocation(self, client: TestClient, monkeypatch):
+        from core.config import settings
+
+        credentials = {"username": "refreshuser", "password": "refreshpass123"}
+        assert client.post("/auth/register", data=credentials).status_code == 200
+        first = client.post("/auth/token", data=credentials).json()
+
+        rotated = client.post("/auth/refresh", data={"refresh_token": first["refresh_token"]})
+        assert rotated.status_code == 200
+        second = rotated.json()
+        assert second["refresh_token"] != first["refresh_token"]
+        assert client.get("/auth/profile", headers={"Authorization": f"Bearer {second['access_token']}"}).status_code == 200
+
+        # A second tab refreshing with the same token a moment later gets a successor of its own
+        other_tab = client.post("/auth/refresh", data={"refresh_token": first["refresh_token"]})
+        assert other_tab.status_code == 200
+        assert other_tab.json()["refresh_token"] != second["refresh_token"]
+
+        # Past the grace window, replaying an exchanged token revokes the whole family
+        monkeypatch.setattr(settings, "REFRESH_TOKEN_REUSE_GRACE_SECONDS", -1)
+        assert client.post("/auth/refresh", data={"refresh_token": first["refresh_token"]}).status_code == 401
+        assert client.post("/auth/refresh", data={"refresh_token": second["refresh_token"]}).status_code == 401
+        assert client.post("/auth/refresh", data={"refresh_token": other_tab.json()["refresh_token"]}).status_code == 401
+
+        # Changing the password signs out the other sessions, not the one that changed it
+        session = client.post("/auth/token", data=credentials).json()
+        other_session = client.post("/auth/token", data=credentials).json()
+        changed = client.post("/auth/change-password", headers={"Authorization": f"Bearer {session['access_token']}"},
+                              data={"current_password": "refreshpass123", "new_password": "refreshpass456"})
+        assert changed.status_code == 200
+        assert client.post("/auth/refresh", data={"refresh_token": session["refresh_token"]}).status_code == 200
+        assert client.post("/auth/refresh", data={"refresh_token": other_session["refresh_token"]}).status_code == 401
+
 class TestSurvey:
     @pytest.fixture(scope="class")
     def test_survey(self, client: TestClient, auth_headers: Dict[str, str]) -> Dict:
@@ -204,5 +239,935 @@ class TestSurvey:
         )
         assert response.status_code == 404
 
+class TestSerialization:
+    def test_fast_json_response_encodes_numpy_and_int_keys(self):
+        import numpy as np
+        from core.responses import FastJSONResponse
+
+        body = FastJSONResponse({1: {"q1": np.float64(2.5), "n": np.int64(3)}}).body
+        assert json.loads(body) == {"1": {"q1": 2.5, "n": 3}}
+
+    def test_survey_serializer_matches_schema(self):
+        from models.survey import Survey as SurveyModel, Question as QuestionModel, QuestionType
+        from schemas.survey import Survey as SurveySchema
+        from utils.serializers import survey_to_dict
+
+        survey = SurveyModel(id=1, title="t", description=None, created_at=datetime(2025, 1, 1), created_by=1)
+        survey.questions = [QuestionModel(
+            id=1, survey_id=1, question_text="q", question_type=QuestionType.TEXT, options=None
+        )]
+        assert survey_to_dict(survey) == SurveySchema.model_validate(survey).model_dump()
+
+class TestInstrumentation:
+    def test_server_timing_reports_sql(self, client: TestClient, auth_headers: Dict[str, str]):
+        response = client.get("/auth/profile", headers=auth_headers)
+        assert response.status_code == 200
+        timing = response.headers["Server-Timing"]
+        assert timing.startswith("app;dur=")
+        assert 'db;dur=' in timing and '1 queries' in timing
+
+    def test_metrics_endpoint_exposes_route_series(self, client: TestClient, auth_headers: Dict[str, str], monkeypatch):
+        from core.config import settings
+
+        client.get("/auth/profile", headers=auth_headers)
+        # TestClient's peer is not loopback, so only the token lets it in
+        assert client.get("/metrics").status_code == 403
+        monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-me")
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+        assert response.status_code == 200
+        assert 'http_request_duration_seconds_count{method="GET",route="/auth/profile",status="200"}' in response.text
+        assert 'http_request_sql_statements_total{method="GET",route="/auth/profile"}' in response.text
+
+    def test_overlapping_allocation_profiles_share_tracemalloc(self):
+        import tracemalloc
+        from core.profiler import SamplingProfiler
+
+        first = SamplingProfiler(track_allocations=True).start()
+        second = SamplingProfiler(track_allocations=True).start()
+        first.stop()
+        assert tracemalloc.is_tracing() and first.allocation_peak is not None
+        second.stop()
+        assert not tracemalloc.is_tracing() and second.allocation_peak is not None
+
+class TestStartup:
+    def test_import_does_not_load_ml_stack(self):
+        import os
+        import subprocess
+        import sys
+
+        backend_dir = os.path.dirname(sys.modules["main"].__file__)
+        probe = "import sys, main; print(sorted(m for m in ('numpy', 'pandas', 'sklearn', 'textblob') if m in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", probe], cwd=backend_dir,
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == "[]"
+
+    def test_database_script_creates_every_table(self, tmp_path):
+        import os
+        import sqlite3
+        import subprocess
+        import sys
+
+        backend_dir = os.path.dirname(sys.modules["main"].__file__)
+        path = tmp_path / "schema.db"
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{path}", "SQL_ECHO": "false"}
+        subprocess.run([sys.executable, "-m", "database"], cwd=backend_dir, env=env, check=True)
+        with sqlite3.connect(path) as conn:
+            tables = {name for name, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert set(Base.metadata.tables) <= tables
+
+class TestServe:
+    def test_workers_are_recycled_and_drained_on_sigterm(self, tmp_path):
+        import os
+        import signal
+        import socket
+        import subprocess
+        import sys
+        import time
+        import urllib.request
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        backend_dir = os.path.dirname(sys.modules["main"].__file__)
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path / 'serve.db'}", "SQL_ECHO": "false"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "serve", "--host", "127.0.0.1", "--port", str(port), "--workers", "2",
+             "--max-requests", "3", "--max-requests-jitter", "0", "--no-preload-analytics", "--no-access-log"],
+            cwd=backend_dir, env=env, stderr=subprocess.PIPE, text=True
+        )
+        try:
+            statuses = []
+            deadline = time.monotonic() + 30
+            while len(statuses) < 12 and time.monotonic() < deadline:
+                try:
+                    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+                        statuses.append(response.status)
+                except OSError:
+                    time.sleep(0.2)
+                    continue
+                time.sleep(0.15)  # let a worker at its limit notice before the next request
+            assert statuses == [200] * 12
+        finally:
+            server.send_signal(signal.SIGTERM)
+            _, log = server.communicate(timeout=30)
+        assert server.returncode == 0
+        assert "starting a replacement" in log
+        assert log.count("Finished server process") >= 3
+
+    def test_each_worker_slot_replays_its_own_journal(self, db, tmp_path, monkeypatch):
+        import serve
+        from core.config import settings
+        from services import response_buffer
+
+        spill = str(tmp_path / "journal")
+        monkeypatch.setattr(settings, "RESPONSE_INGEST_MODE", "buffered")
+        monkeypatch.setattr(settings, "RESPONSE_BUFFER_SPILL_PATH", spill)
+        monkeypatch.setattr(response_buffer, "SessionLocal", TestingSessionLocal)
+        row = {"survey_id": 997, "respondent_id": None, "responses": {"1": "x"},
+               "submitted_at": "2025-01-01T00:00:00"}
+        # Both workers numbered their first row 1; slot 0 committed its own, slot 1 died first
+        with open(response_buffer.journal_path(spill, 0), "w") as f:
+            f.write(json.dumps({"seq": 1, "row": row}) + "\n" + json.dumps({"committed": [1, 1]}) + "\n")
+        with open(response_buffer.journal_path(spill, 1), "w") as f:
+            f.write(json.dumps({"seq": 1, "row": row}) + "\n")
+
+        assert response_buffer.journal_paths(spill) == [spill + ".0", spill + ".1"]
+        serve.replay_journals(slot=1)
+        serve.replay_journals()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == 997).count() == 1
+        assert (tmp_path / "journal.1").read_text() == ""
+
+class TestRateLimiting:
+    def test_token_bucket_refills(self):
+        from core.rate_limit import InMemoryRateLimitStore
+
+        store = InMemoryRateLimitStore()
+        assert store.consume("k", rate=1000.0, capacity=2) == (True, 0.0)
+        assert store.consume("k", rate=1000.0, capacity=2)[0]
+        allowed, retry_after = store.consume("k", rate=1000.0, capacity=2)
+        assert not allowed and 0 < retry_after <= 0.001
+
+    def test_login_limited_per_username(self, client: TestClient, monkeypatch):
+        from core.config import settings
+        from core.rate_limit import parse_rate
+
+        monkeypatch.setattr(settings, "RATE_LIMIT_ENABLED", True)
+        limit = int(parse_rate(settings.RATE_LIMIT_LOGIN_PER_USER)[1])
+        for _ in range(limit):
+            response = client.post("/auth/token", data={"username": "bucketuser", "password": "wrongpass"})
+            assert response.status_code == 400
+        response = client.post("/auth/token", data={"username": "bucketuser", "password": "wrongpass"})
+        assert response.status_code == 429
+        assert "Retry-After" in response.headers
+
+class TestResponseBuffer:
+    def test_group_commit_resolves_ids(self, db, tmp_path):
+        from services.response_buffer import ResponseBuffer
+
+        buffer = ResponseBuffer(TestingSessionLocal, batch_size=10, spill_path=str(tmp_path / "spill")).start()
+        futures = [buffer.submit(999, None, {1: "answer"}) for _ in range(25)]
+        ids = [f.result(timeout=5) for f in futures]
+        buffer.stop()
+        assert len(set(ids)) == 25
+        assert db.query(SurveyResponse).filter(SurveyResponse.id.in_(ids)).count() == 25
+        assert (tmp_path / "spill").read_text() == ""
+
+    def test_replays_uncommitted_journal_rows(self, db, tmp_path):
+        from services.response_buffer import ResponseBuffer
+
+        spill = tmp_path / "spill"
+        row = {"survey_id": 998, "respondent_id": None, "responses": {"1": "x"},
+               "submitted_at": "2025-01-01T00:00:00"}
+        spill.write_text("\n".join([
+            json.dumps({"seq": 1, "row": row}),
+            json.dumps({"seq": 2, "row": row}),
+            json.dumps({"committed": [1, 1]}),
+            '{"seq": 3, "row"',  # torn write
+        ]) + "\n")
+        ResponseBuffer(TestingSessionLocal, spill_path=str(spill)).start().stop()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == 998).count() == 1
+
+    def test_batch_failing_on_connection_error_is_retried(self, db, tmp_path, monkeypatch):
+        from sqlalchemy.exc import OperationalError
+        from services import response_buffer
+
+        real_insert = response_buffer.insert_returning_ids
+        failures = []
+
+        def flaky_insert(*args, **kwargs):
+            if len(failures) < 2:
+                failures.append(1)
+                raise OperationalError("INSERT", {}, Exception("database is locked"))
+            return real_insert(*args, **kwargs)
+
+        monkeypatch.setattr(response_buffer, "insert_returning_ids", flaky_insert)
+        monkeypatch.setattr(response_buffer, "RETRY_BASE_DELAY", 0.01)
+        spill = tmp_path / "spill"
+        buffer = response_buffer.ResponseBuffer(TestingSessionLocal, batch_size=3, spill_path=str(spill)).start()
+        futures = [buffer.submit(997, None, {"1": "retried"}) for _ in range(3)]
+        ids = [f.result(timeout=5) for f in futures]
+        buffer.stop()
+        assert len(failures) == 2
+        assert db.query(SurveyResponse).filter(SurveyResponse.id.in_(ids)).count() == 3
+        assert spill.read_text() == ""
+
+    def test_rejected_row_does_not_sink_its_batch(self, db, tmp_path, monkeypatch):
+        from services import response_buffer
+
+        real_insert = response_buffer.insert_returning_ids
+
+        def picky_insert(db, model, rows):
+            if any(row["responses"] == {"1": "refused"} for row in rows):
+                raise ValueError("value out of range")
+            return real_insert(db, model, rows)
+
+        monkeypatch.setattr(response_buffer, "insert_returning_ids", picky_insert)
+        spill = tmp_path / "spill"
+        buffer = response_buffer.ResponseBuffer(TestingSessionLocal, batch_size=3, flush_interval=5,
+                                                spill_path=str(spill)).start()
+        futures = [buffer.submit(996, None, {"1": answer}) for answer in ("kept", "refused", "kept")]
+        assert isinstance(futures[1].exception(timeout=5), ValueError)
+        kept = [futures[0].result(timeout=5), futures[2].result(timeout=5)]
+        buffer.stop()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == 996).count() == 2
+        assert db.query(SurveyResponse).filter(SurveyResponse.id.in_(kept)).count() == 2
+        assert json.loads((tmp_path / "spill.rejected").read_text())["row"]["responses"] == {"1": "refused"}
+
+        # Resolved in the journal: a restart stores nothing more
+        response_buffer.ResponseBuffer(TestingSessionLocal, spill_path=str(spill)).start().stop()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == 996).count() == 2
+
+class TestSurveyCache:
+    def test_get_survey_etag_and_invalidation(self, client: TestClient, auth_headers: Dict[str, str]):
+        created = client.post("/surveys/create", json={
+            "title": "Cached", "questions": [{"question_text": "Why?", "question_type": "TEXT"}]
+        }, headers=auth_headers).json()
+
+        first = client.get(f"/surveys/{created['id']}", headers=auth_headers)
+        assert first.status_code == 200
+        assert first.json() == created
+        assert first.headers["Cache-Control"].startswith("public")
+
+        etag = first.headers["ETag"]
+        revalidated = client.get(f"/surveys/{created['id']}", headers={**auth_headers, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        for matching in (f'W/{etag}', f'"other", {etag}', '*'):
+            assert client.get(f"/surveys/{created['id']}", headers={**auth_headers, "If-None-Match": matching}).status_code == 304
+        longer = etag[:-1] + 'ff"'
+        assert client.get(f"/surveys/{created['id']}", headers={**auth_headers, "If-None-Match": longer}).status_code == 200
+        assert client.get(f"/surveys/{created['id']}", headers={**auth_headers, "If-None-Match": f'"x{etag}"'}).status_code == 200
+
+        assert client.delete(f"/surveys/{created['id']}", headers=auth_headers).status_code == 204
+        assert client.get(f"/surveys/{created['id']}", headers=auth_headers).status_code == 404
+
+    def test_concurrent_misses_load_once(self):
+        import threading
+        import time
+        from services.survey_cache import SurveyCache
+
+        cache = SurveyCache()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return {"id": 1}
+
+        threads = [threading.Thread(target=cache.get_or_load, args=(1, loader)) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(calls) == 1
+        assert cache.get_or_load(1, loader).body == b'{"id":1}'
+
+class TestBulkSurveyCreation:
+    def test_bulk_endpoint_creates_surveys_with_questions(self, client: TestClient, auth_headers: Dict[str, str]):
+        payload = {"surveys": [
+            {"title": f"Bulk {i}", "questions": [
+                {"question_text": f"Q{j}", "question_type": "RATING"} for j in range(3)
+            ]}
+            for i in range(4)
+        ]}
+        response = client.post("/surveys/bulk", json=payload, headers=auth_headers)
+        assert response.status_code == 200
+        surveys = response.json()
+        assert [s["title"] for s in surveys] == [f"Bulk {i}" for i in range(4)]
+        assert all(len(s["questions"]) == 3 for s in surveys)
+
+        fetched = client.get(f"/surveys/{surveys[2]['id']}", headers=auth_headers).json()
+        assert fetched == surveys[2]
+
+    def test_create_uses_one_statement_per_table(self, db):
+        from core.metrics import RequestStats, current_stats
+        from schemas.survey import SurveyCreate
+        from services.survey_service import create_surveys
+
+        surveys = [SurveyCreate(title=f"S{i}", questions=[
+            {"question_text": f"Q{j}", "question_type": "text"} for j in range(100)
+        ]) for i in range(3)]
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            created = create_surveys(TestingSessionLocal(), surveys, user_id=1)
+        finally:
+            current_stats.reset(token)
+        assert sum(len(s["questions"]) for s in created) == 300
+        assert stats.sql_count == 2
+
+    def test_unknown_question_type_is_rejected(self, client: TestClient, auth_headers: Dict[str, str]):
+        response = client.post("/surveys/create", json={
+            "title": "Bad", "questions": [{"question_text": "Q", "question_type": "essay"}]
+        }, headers=auth_headers)
+        assert response.status_code == 400
+
+class TestReadReplicas:
+    @pytest.fixture
+    def replica(self, db, test_user: Dict[str, str], tmp_path, monkeypatch):
+        import database
+
+        replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+        Base.metadata.create_all(bind=replica_engine)
+        ReplicaSession = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+        user_id = db.query(User).filter(User.username == test_user["username"]).first().id
+        with ReplicaSession() as session:
+            session.add(Survey(title="Replica only", created_by=user_id))
+            session.commit()
+
+        monkeypatch.setattr(database, "ReplicaSessionLocals", [ReplicaSession])
+        monkeypatch.setattr(database, "_recent_writers", {})
+        yield
+        replica_engine.dispose()
+
+    def test_reads_go_to_replica(self, client: TestClient, auth_headers: Dict[str, str], replica):
+        titles = [s["title"] for s in client.get("/surveys/list", headers=auth_headers).json()]
+        assert titles == ["Replica only"]
+
+        forced = client.get("/surveys/list", headers={**auth_headers, "X-Read-Consistency": "primary"}).json()
+        assert "Replica only" not in [s["title"] for s in forced]
+
+    def test_read_your_writes_after_create(self, client: TestClient, auth_headers: Dict[str, str], replica):
+        client.post("/surveys/create", json={"title": "Just written", "questions": []}, headers=auth_headers)
+        titles = [s["title"] for s in client.get("/surveys/list", headers=auth_headers).json()]
+        assert "Just written" in titles
+        assert "Replica only" not in titles
+
+class TestAnalyticsStream:
+    def test_delta_contains_only_changed_questions(self):
+        from services.analytics_stream import analytics_delta
+
+        before = {"total_responses": 1, "question_analytics": {"1": {"mean": 3}, "2": {"mean": 4}}}
+        after = {"total_responses": 2, "question_analytics": {"1": {"mean": 3}, "2": {"mean": 5}}}
+        assert analytics_delta(before, after) == {"total_responses": 2, "question_analytics": {"2": {"mean": 5}}}
+        assert analytics_delta(after, after) == {}
+
+    def test_burst_is_computed_once_for_all_viewers(self):
+        import asyncio
+        from services.analytics_stream import AnalyticsStreamHub
+
+        calls = []
+
+        def compute(survey_id):
+            calls.append(survey_id)
+            return {"total_responses": len(calls), "question_analytics": {}}
+
+        async def scenario():
+            hub = AnalyticsStreamHub(compute, max_pushes_per_second=20, heartbeat=5)
+            viewers = [hub.stream(7) for _ in range(3)]
+            snapshots = [await viewer.__anext__() for viewer in viewers]
+            for _ in range(50):
+                hub.notify(7)
+            deltas = [await asyncio.wait_for(viewer.__anext__(), 2) for viewer in viewers]
+            for viewer in viewers:
+                await viewer.aclose()
+            return snapshots, deltas
+
+        snapshots, deltas = asyncio.run(scenario())
+        assert snapshots[0].startswith(b"event: snapshot")
+        assert set(deltas) == {b'event: delta\ndata: {"total_responses":2}\n\n'}
+        assert len(calls) == 2
+
+    def test_responses_on_one_worker_reach_viewers_on_another(self):
+        import asyncio
+        from services.analytics_stream import AnalyticsStreamHub, InProcessBroker
+
+        stored = [0]
+
+        def compute(survey_id):
+            return {"total_responses": stored[0], "question_analytics": {}}
+
+        async def scenario():
+            shared = InProcessBroker()
+            worker_a = AnalyticsStreamHub(compute, broker=shared, max_pushes_per_second=20, heartbeat=5)
+            worker_b = AnalyticsStreamHub(compute, broker=shared, max_pushes_per_second=20, heartbeat=5)
+            viewer = worker_b.stream(7)
+            snapshot = await viewer.__anext__()
+            stored[0] = 1
+            worker_a.notify(7)
+            delta = await asyncio.wait_for(viewer.__anext__(), 2)
+            await viewer.aclose()
+            return snapshot, delta, worker_b._channels
+
+        snapshot, delta, channels = asyncio.run(scenario())
+        assert snapshot == b'event: snapshot\ndata: {"total_responses":0,"question_analytics":{}}\n\n'
+        assert delta == b'event: delta\ndata: {"total_responses":1}\n\n'
+        assert channels == {}
+
+    def test_stream_requires_permission(self, client: TestClient, auth_headers: Dict[str, str]):
+        assert client.get("/surveys/999999/analytics/stream", headers=auth_headers).status_code == 404
+
+class TestResponseDeduplication:
+    @pytest.fixture(scope="class")
+    def survey(self, client: TestClient, auth_headers: Dict[str, str]) -> Dict:
+        return client.post("/surveys/create", json={
+            "title": "Retries", "questions": [{"question_text": "Why?", "question_type": "TEXT"}]
+        }, headers=auth_headers).json()
+
+    @pytest.fixture(scope="class")
+    def survey_id(self, survey: Dict) -> int:
+        return survey["id"]
+
+    def test_retry_with_idempotency_key_is_replayed(self, client: TestClient, auth_headers: Dict[str, str],
+                                                   db, survey: Dict):
+        survey_id, question_id = survey["id"], survey["questions"][0]["id"]
+        answer = {"survey_id": survey_id, "responses": {str(question_id): "flaky network"}}
+        headers = {**auth_headers, "Idempotency-Key": "retry-1"}
+        first = client.post(f"/surveys/{survey_id}/respond", json=answer, headers=headers)
+        retry = client.post(f"/surveys/{survey_id}/respond", json=answer, headers=headers)
+        assert first.status_code == retry.status_code == 200
+        assert retry.json()["id"] == first.json()["id"]
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).count() == 1
+
+        reused = client.post(f"/surveys/{survey_id}/respond", json={**answer, "responses": {str(question_id): "other"}},
+                             headers=headers)
+        assert reused.status_code == 422
+
+    def test_concurrent_retries_store_one_response(self, db, survey_id: int):
+        import threading
+        from services.response_dedup import dedup_keys
+        from services.survey_service import submit_response
+
+        answers = {"1": "sent eight times"}
+        results = []
+
+        def retry():
+            session = TestingSessionLocal()
+            try:
+                keys = dedup_keys(survey_id, None, answers, "concurrent-1")
+                results.append(submit_response(session, survey_id, None, answers, keys))
+            finally:
+                session.close()
+
+        threads = [threading.Thread(target=retry) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len({body["id"] for body, _ in results}) == 1
+        assert sorted(replayed for _, replayed in results) == [False] + [True] * 7
+        assert db.query(SurveyResponse).filter(SurveyResponse.responses == answers).count() == 1
+
+    def test_content_dedup_per_respondent(self, db, survey_id: int, monkeypatch):
+        from core.config import settings
+        from services.response_dedup import dedup_keys
+        from services.survey_service import submit_response
+
+        monkeypatch.setattr(settings, "RESPONSE_DEDUP_CONTENT", True)
+        answers = {"1": "same answer"}
+        first, _ = submit_response(db, survey_id, 1, answers, dedup_keys(survey_id, 1, answers))
+        again, replayed = submit_response(db, survey_id, 1, answers, dedup_keys(survey_id, 1, answers))
+        other, other_replayed = submit_response(db, survey_id, 2, answers, dedup_keys(survey_id, 2, answers))
+        assert replayed and again["id"] == first["id"]
+        assert not other_replayed and other["id"] != first["id"]
+
+    def test_failed_group_commit_releases_claims(self, db, survey_id: int, tmp_path, monkeypatch):
+        from services import response_buffer
+        from services.response_dedup import dedup_keys, claim_pending, find_duplicate
+        from services.survey_service import submit_response
+
+        answers = {"1": "group commit failed"}
+        keys = dedup_keys(survey_id, None, answers, "buffered-1")
+        session = TestingSessionLocal()
+        assert claim_pending(session, keys) is None
+
+        def failing_insert(*args, **kwargs):
+            raise RuntimeError("database unavailable")
+
+        spill = str(tmp_path / "spill")
+        buffer = response_buffer.ResponseBuffer(TestingSessionLocal, spill_path=spill).start()
+        with monkeypatch.context() as patch:
+            patch.setattr(response_buffer, "insert_returning_ids", failing_insert)
+            future = buffer.submit(survey_id, None, answers, dedup_keys=[k.key_hash for k in keys])
+            assert isinstance(future.exception(timeout=5), RuntimeError)
+        buffer.stop()
+
+        # The retry is stored instead of waiting on a claim nobody will fill
+        session.expire_all()
+        assert find_duplicate(session, keys) is None
+        _, replayed = submit_response(session, survey_id, None, answers, keys)
+        assert not replayed
+        session.close()
+        # ...and replaying the journal at restart does not store it twice
+        response_buffer.ResponseBuffer(TestingSessionLocal, spill_path=spill).start().stop()
+        assert db.query(SurveyResponse).filter(SurveyResponse.responses == answers).count() == 1
+
+class TestResponseEncoding:
+    ANSWERS = {"48001": 4, "48002": "great support", "48003": ["Email", "Chat"], "48004": True, "48005": 2.5}
+
+    @pytest.mark.parametrize("encoding", ["compact", "msgpack"])
+    def test_codecs_round_trip_to_json_shape(self, encoding):
+        from utils.response_codec import get_codec, JsonCodec
+
+        if encoding == "msgpack":
+            pytest.importorskip("msgpack")
+        codec = get_codec(encoding)
+        encoded = codec.encode(self.ANSWERS)
+        assert codec.decode(encoded) == self.ANSWERS
+        assert len(encoded) < len(JsonCodec().encode(self.ANSWERS))
+
+    def test_migrate_json_to_compact_and_back(self, tmp_path, monkeypatch):
+        from sqlalchemy import text
+        from utils import response_codec
+        from utils.response_codec import migrate, EncodedResponses
+
+        migrate_engine = create_engine(f"sqlite:///{tmp_path / 'encoding.db'}")
+        insert = text("INSERT INTO survey_responses (responses) VALUES (:r)")
+        with migrate_engine.begin() as conn:
+            conn.execute(text("CREATE TABLE survey_responses (id INTEGER PRIMARY KEY, responses JSON)"))
+            conn.execute(insert, [{"r": json.dumps(self.ANSWERS)}] * 3)
+
+        lock_for_swap = response_codec._lock_for_swap
+
+        def response_arrives_before_swap(conn, table):
+            # Committed after the last batch was copied
+            with migrate_engine.begin() as writer:
+                writer.execute(insert, {"r": json.dumps(self.ANSWERS)})
+            lock_for_swap(conn, table)
+
+        monkeypatch.setattr(response_codec, "_lock_for_swap", response_arrives_before_swap)
+        assert migrate(migrate_engine, "json", "compact", batch_size=2) == 4
+        monkeypatch.setattr(response_codec, "_lock_for_swap", lock_for_swap)
+        with migrate_engine.connect() as conn:
+            stored = conn.execute(text("SELECT responses FROM survey_responses")).scalars().all()
+        decode = EncodedResponses("compact").process_result_value
+        assert [decode(value, None) for value in stored] == [self.ANSWERS] * 4
+
+        migrate(migrate_engine, "compact", "json")
+        with migrate_engine.connect() as conn:
+            stored = conn.execute(text("SELECT responses FROM survey_responses")).scalars().all()
+        assert [json.loads(value) for value in stored] == [self.ANSWERS] * 4
+        migrate_engine.dispose()
+
+class TestThemeModels:
+    TOPICS = {
+        "shipping": "late delivery shipping courier package arrived damaged box".split(),
+        "app": "app crash login bug slow screen update freeze".split(),
+        "support": "support agent helpful friendly call chat resolved quick".split(),
+    }
+
+    def feedback(self, n: int, seed: int) -> list:
+        import random
+
+        rng = random.Random(seed)
+        return [" ".join(rng.choices(self.TOPICS[topic], k=8)) for topic in rng.choices(list(self.TOPICS), k=n)]
+
+    def test_stored_model_assigns_new_feedback_to_existing_themes(self):
+        from utils.themes import ThemeModel
+
+        texts = self.feedback(300, seed=1)
+        model, labels = ThemeModel.fit(texts, n_clusters=3)
+        restored = ThemeModel.loads(model.dumps())
+        assert list(restored.predict(texts)) == list(labels)
+
+        refitted, _ = ThemeModel.fit(self.feedback(300, seed=2), n_clusters=3, previous=model)
+        assert sorted(refitted.names) == sorted(model.names)
+        for name, keywords in zip(refitted.names, refitted.keywords):
+            old_keywords = model.keywords[model.names.index(name)]
+            assert set(keywords[:5]) & set(old_keywords[:5])
+
+    def test_analyze_reuses_survey_theme_model(self, client: TestClient, auth_headers: Dict[str, str]):
+        survey_id = client.post("/surveys/create", json={"title": "Weekly feedback", "questions": []},
+                                headers=auth_headers).json()["id"]
+
+        def upload(seed: int):
+            csv = "feedback\n" + "\n".join(self.feedback(60, seed)) + "\n"
+            return client.post(f"/surveys/analyze?survey_id={survey_id}", headers=auth_headers,
+                               files={"file": ("week.csv", csv, "text/csv")})
+
+        first, second = upload(1), upload(2)
+        assert first.status_code == second.status_code == 200
+        assert first.json()["model"]["refitted"] is True
+        assert second.json()["model"]["refitted"] is False
+        assert second.json()["model"]["fitted_at"] == first.json()["model"]["fitted_at"]
+        assert [t["theme"] for t in second.json()["themes"]] == [t["theme"] for t in first.json()["themes"]]
+
+    def test_text_question_themes_are_assigned_incrementally(self, db, client: TestClient,
+                                                             auth_headers: Dict[str, str], monkeypatch):
+        import services.theme_service as theme_service
+        from core.config import settings
+        from services.survey_service import compute_survey_analytics
+
+        monkeypatch.setattr(settings, "TEXT_THEMES_MIN_ANSWERS", 20)
+        monkeypatch.setattr(theme_service, "SessionLocal", TestingSessionLocal)
+        survey = client.post("/surveys/create", json={
+            "title": "Open ended", "questions": [{"question_text": "Anything else?", "question_type": "TEXT"}]
+        }, headers=auth_headers).json()
+        key = str(survey["questions"][0]["id"])
+
+        def add_answers(texts):
+            db.add_all([SurveyResponse(survey_id=survey["id"], responses={key: text}) for text in texts])
+            db.commit()
+
+        add_answers(self.feedback(60, seed=3))
+        assert compute_survey_analytics(db, survey["id"])["question_analytics"][key]["analysis"]["themes"] == \
+            {"status": "fitting"}
+        theme_service._refit_executor.submit(lambda: None).result()  # wait for the background fit
+
+        ready = compute_survey_analytics(db, survey["id"])["question_analytics"][key]["analysis"]["themes"]
+        assert ready["status"] == "ready"
+        assert sum(t["count"] for t in ready["themes"]) == 60
+
+        add_answers(self.feedback(10, seed=4))
+        updated = compute_survey_analytics(db, survey["id"])["question_analytics"][key]["analysis"]["themes"]
+        assert updated["fitted_at"] == ready["fitted_at"]
+        assert sum(t["count"] for t in updated["themes"]) == 70
+
+        # An answer removed, then one committed behind the watermark: counts follow the stored answers
+        late = db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey["id"]).order_by(SurveyResponse.id).first()
+        late_id, late_answers = late.id, dict(late.responses)
+        db.delete(late)
+        db.commit()
+        removed = compute_survey_analytics(db, survey["id"])["question_analytics"][key]["analysis"]["themes"]
+        assert sum(t["count"] for t in removed["themes"]) == 69
+        db.add(SurveyResponse(id=late_id, survey_id=survey["id"], responses=late_answers))
+        db.commit()
+        restored = compute_survey_analytics(db, survey["id"])["question_analytics"][key]["analysis"]["themes"]
+        assert sum(t["count"] for t in restored["themes"]) == 70
+
+class TestResponseListing:
+    @pytest.fixture(scope="class")
+    def survey(self, db, client: TestClient, auth_headers: Dict[str, str]) -> Dict:
+        from datetime import datetime, timedelta
+
+        survey = client.post("/surveys/create", json={"title": "Listed", "questions": [
+            {"question_text": "Rate us", "question_type": "RATING"},
+            {"question_text": "Channels", "question_type": "MULTIPLE_CHOICE", "options": "Email,Chat,Phone"},
+            {"question_text": "Plan", "question_type": "DROPDOWN", "options": "5,true"},
+        ]}, headers=auth_headers).json()
+        survey_id = survey["id"]
+        survey["keys"] = rating, channels, plan = [str(q["id"]) for q in survey["questions"]]
+        start = datetime(2026, 3, 1)
+        db.add_all([
+            SurveyResponse(
+                survey_id=survey_id,
+                respondent_id=i % 3,
+                responses={rating: i % 5 + 1, channels: ["Email", "Chat"] if i % 2 else ["Phone"],
+                           plan: "5" if i % 3 else "true"},
+                # Pairs share a timestamp so the id tiebreak is exercised
+                submitted_at=start + timedelta(hours=i // 2)
+            )
+            for i in range(45)
+        ])
+        db.commit()
+        return survey
+
+    @pytest.fixture(scope="class")
+    def survey_id(self, survey: Dict) -> int:
+        return survey["id"]
+
+    def pages(self, client: TestClient, auth_headers: Dict[str, str], url: str) -> list:
+        items, cursor = [], None
+        while True:
+            page = client.get(url + (f"&cursor={cursor}" if cursor else ""), headers=auth_headers)
+            assert page.status_code == 200
+            items.extend(page.json()["items"])
+            cursor = page.json()["next_cursor"]
+            if cursor is None:
+                return items
+
+    def test_pages_cover_every_response_once_in_order(self, client: TestClient, auth_headers: Dict[str, str],
+                                                      survey_id: int):
+        items = self.pages(client, auth_headers, f"/surveys/{survey_id}/responses?limit=10")
+        keys = [(item["submitted_at"], item["id"]) for item in items]
+        assert len(keys) == len(set(keys)) == 45
+        assert keys == sorted(keys, reverse=True)
+
+        ascending = self.pages(client, auth_headers, f"/surveys/{survey_id}/responses?limit=7&order=asc")
+        assert [item["id"] for item in ascending] == [item["id"] for item in reversed(items)]
+
+    def test_filters(self, client: TestClient, auth_headers: Dict[str, str], survey: Dict, monkeypatch):
+        from core.config import settings
+
+        survey_id, (rating, channels, plan) = survey["id"], survey["keys"]
+
+        url = f"/surveys/{survey_id}/responses?limit=4"
+        by_respondent = self.pages(client, auth_headers, url + "&respondent_id=1")
+        assert len(by_respondent) == 15 and {item["respondent_id"] for item in by_respondent} == {1}
+
+        window = self.pages(client, auth_headers,
+                            url + "&submitted_after=2026-03-01T05:00:00&submitted_before=2026-03-01T10:00:00")
+        assert len(window) == 10
+
+        # A small scan budget returns short pages but still reaches every match
+        monkeypatch.setattr(settings, "RESPONSES_FILTER_SCAN_ROWS", 6)
+        matched = self.pages(client, auth_headers, url + f"&answer={rating}:5&answer={channels}:Email")
+        assert len(matched) == 4
+        assert all(item["responses"][rating] == 5 and "Email" in item["responses"][channels] for item in matched)
+
+        # A dropdown option that reads like a number or boolean is still matched as text
+        assert len(self.pages(client, auth_headers, url + f"&answer={plan}:5")) == 30
+        assert len(self.pages(client, auth_headers, url + f"&answer={plan}:true")) == 15
+
+    def test_invalid_cursor_and_filter(self, client: TestClient, auth_headers: Dict[str, str], survey_id: int):
+        assert client.get(f"/surveys/{survey_id}/responses?cursor=bm9wZQ",
+                          headers=auth_headers).status_code == 400
+        assert client.get(f"/surveys/{survey_id}/responses?answer=Email",
+                          headers=auth_headers).status_code == 400
+        assert client.get(f"/surveys/{survey_id}/responses?answer=999999:Email",
+                          headers=auth_headers).status_code == 400
+
+    def test_answer_filters_are_jsonb_containment_on_postgres(self):
+        from sqlalchemy.dialects import postgresql
+        from services.survey_service import answer_condition
+
+        sql = str(answer_condition("1", "Email").compile(dialect=postgresql.dialect()))
+        assert sql.count("CAST(survey_responses.responses AS JSONB) @>") == 2
+
+class TestSegments:
+    @pytest.fixture(scope="class")
+    def survey(self, db, client: TestClient, auth_headers: Dict[str, str]) -> Dict:
+        survey = client.post("/surveys/create", json={"title": "Segments", "questions": [
+            {"question_text": "Recommend us?", "question_type": "BOOLEAN"},
+            {"question_text": "Rate delivery", "question_type": "RATING"},
+            {"question_text": "Channels", "question_type": "MULTIPLE_CHOICE", "options": "Email,Chat,Phone"},
+            {"question_text": "Anything else?", "question_type": "TEXT"},
+        ]}, headers=auth_headers).json()
+        survey["keys"] = [str(q["id"]) for q in survey["questions"]]
+        survey["answers"] = [
+            {survey["keys"][0]: i % 3 == 0, survey["keys"][1]: i % 5 + 1,
+             survey["keys"][2]: ["Email", "Chat"] if i % 2 else ["Phone"]}
+            for i in range(60)
+        ]
+        db.add_all([SurveyResponse(survey_id=survey["id"], responses=r) for r in survey["answers"]])
+        db.commit()
+        return survey
+
+    def test_filters_combine_with_and_or(self, client: TestClient, auth_headers: Dict[str, str], survey: Dict):
+        recommend, rating, channels, _ = survey["keys"]
+        url = f"/surveys/analytics/{survey['id']}?answer={recommend}:true&answer={rating}:4|{rating}:5"
+        body = client.get(url, headers=auth_headers).json()
+        expected = [r for r in survey["answers"] if r[recommend] and r[rating] >= 4]
+        assert body["segment"] == {"matched": len(expected), "of": 60}
+        assert body["total_responses"] == len(expected)
+        assert body["question_analytics"][rating]["statistics"]["mean"] == \
+            sum(r[rating] for r in expected) / len(expected)
+
+        by_choice = client.get(f"/surveys/analytics/{survey['id']}?answer={channels}:Chat",
+                               headers=auth_headers).json()
+        assert by_choice["segment"]["matched"] == 30
+
+    def test_crosstab_and_incremental_index(self, db, client: TestClient, auth_headers: Dict[str, str],
+                                            survey: Dict):
+        recommend, rating, _, _ = survey["keys"]
+        url = f"/surveys/analytics/{survey['id']}?crosstab={rating},{recommend}"
+        table = client.get(url, headers=auth_headers).json()["crosstab"]
+        for value in range(1, 6):
+            assert table["counts"][str(value)]["true"] == sum(
+                1 for r in survey["answers"] if r[rating] == value and r[recommend]
+            )
+        assert table["total"] == 60
+
+        db.add(SurveyResponse(survey_id=survey["id"], responses={recommend: True, rating: 5}))
+        db.commit()
+        updated = client.get(url, headers=auth_headers).json()["crosstab"]
+        assert updated["counts"]["5"]["true"] == table["counts"]["5"]["true"] + 1
+
+    def test_text_questions_cannot_segment(self, client: TestClient, auth_headers: Dict[str, str], survey: Dict):
+        text_question = survey["keys"][3]
+        assert client.get(f"/surveys/analytics/{survey['id']}?answer={text_question}:hello",
+                          headers=auth_headers).status_code == 400
+        assert client.get(f"/surveys/analytics/{survey['id']}?crosstab={text_question}",
+                          headers=auth_headers).status_code == 400
+
+    def test_boolean_answers_are_not_ratings(self):
+        from utils.segments import SegmentIndex
+
+        index = SegmentIndex(["1", "2"])
+        index.add([(1, {"1": True, "2": 1}), (2, {"1": False, "2": 1})])
+        assert index.match("1", True) == 0b01
+        assert index.match("1", 1) == 0
+        assert index.select([[("2", 1)], [("1", False)]]) == 0b10
+
+class TestRetention:
+    @pytest.fixture(scope="class")
+    def survey(self, db, client: TestClient, auth_headers: Dict[str, str]) -> Dict:
+        from datetime import datetime, timedelta
+
+        survey = client.post("/surveys/create", json={"title": "Last year's", "questions": [
+            {"question_text": "Rate us", "question_type": "RATING"},
+            {"question_text": "Channels", "question_type": "MULTIPLE_CHOICE", "options": "Email,Chat"},
+        ]}, headers=auth_headers).json()
+        survey["keys"] = [str(q["id"]) for q in survey["questions"]]
+        rating, channels = survey["keys"]
+        db.add_all([
+            SurveyResponse(survey_id=survey["id"], respondent_id=i % 2,
+                           responses={rating: i % 5 + 1, **({channels: ["Email"]} if i % 3 else {})},
+                           submitted_at=datetime(2020, 1, 1) + timedelta(hours=i))
+            for i in range(30)
+        ])
+        db.commit()
+        return survey
+
+    def test_archive_round_trip_keeps_missing_answers(self, tmp_path):
+        from datetime import datetime
+        from utils.response_archive import write_archive, read_archive, iter_archive
+
+        rows = [(1, None, datetime(2020, 1, 1, 12, 30, 5, 123), {"7": 5}),
+                (2, 3, datetime(2020, 1, 2), {"7": 1, "8": ["Email", "Chat"]}),
+                (3, 3, datetime(2020, 1, 3), {"7": None})]
+        path = str(tmp_path / "survey.json.xz")
+        assert write_archive(path, 9, rows) == 3
+        assert [(r["id"], r["respondent_id"], r["submitted_at"], r["responses"])
+                for r in iter_archive(read_archive(path))] == rows
+
+    def test_archived_survey_is_served_from_archive_and_rehydrated_on_response(
+        self, db, client: TestClient, auth_headers: Dict[str, str], survey: Dict, tmp_path, monkeypatch
+    ):
+        import os
+        from core.config import settings
+        from models.survey import SurveyArchive
+        from services.retention import inactive_surveys, archive_survey
+
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        survey_id, (rating, channels) = survey["id"], survey["keys"]
+        analytics = client.get(f"/surveys/analytics/{survey_id}", headers=auth_headers).json()
+
+        assert survey_id in inactive_surveys(db, 180)
+        assert archive_survey(db, survey_id, before=datetime(2020, 1, 1, 12)) is None  # answered since
+        archive = archive_survey(db, survey_id, before=datetime(2021, 1, 1))
+        assert archive.response_count == 30 and os.path.exists(archive.path)
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).count() == 0
+
+        assert client.get(f"/surveys/analytics/{survey_id}", headers=auth_headers).json() == analytics
+        page = client.get(f"/surveys/{survey_id}/responses?limit=5&respondent_id=1&answer={channels}:Email",
+                          headers=auth_headers).json()
+        assert len(page["items"]) == 5 and page["next_cursor"]
+        rest = client.get(f"/surveys/{survey_id}/responses?limit=50&respondent_id=1&answer={channels}:Email"
+                          f"&cursor={page['next_cursor']}", headers=auth_headers).json()
+        assert len(page["items"]) + len(rest["items"]) == 10
+        window = client.get(f"/surveys/{survey_id}/responses?order=asc&submitted_after=2020-01-01T05:00:00"
+                            f"&submitted_before=2020-01-01T10:00:00", headers=auth_headers).json()
+        assert [item["submitted_at"] for item in window["items"]] == \
+            [f"2020-01-01T{hour:02d}:00:00" for hour in range(5, 10)]
+        segment = client.get(f"/surveys/analytics/{survey_id}?answer={rating}:5", headers=auth_headers).json()
+        assert segment["segment"] == {"matched": 6, "of": 30}
+
+        submitted = client.post(f"/surveys/{survey_id}/respond", headers=auth_headers,
+                                json={"survey_id": survey_id, "responses": {rating: 4}})
+        assert submitted.status_code == 200
+        db.expire_all()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).count() == 31
+        assert db.get(SurveyArchive, survey_id) is None and not os.path.exists(archive.path)
+        assert client.get(f"/surveys/analytics/{survey_id}", headers=auth_headers).json()["total_responses"] == 31
+
+    def test_concurrent_rehydrates_restore_once(self, db, survey: Dict, tmp_path, monkeypatch):
+        import threading
+        import time
+        from core.config import settings
+        from services.retention import archive_survey, rehydrate_survey, _restore
+
+        monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+        survey_id = survey["id"]
+        stored = db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).count()
+        assert archive_survey(db, survey_id) is not None
+
+        claimed = threading.Event()
+
+        def first():
+            session = TestingSessionLocal()
+            assert _restore(session, survey_id)[1] == stored
+            claimed.set()
+            time.sleep(0.3)
+            session.commit()
+            session.close()
+
+        winner = threading.Thread(target=first)
+        winner.start()
+        claimed.wait(5)
+        loser = TestingSessionLocal()
+        # Waits for the winner's commit, then finds the archive already claimed
+        assert rehydrate_survey(loser, survey_id) == 0
+        loser.close()
+        winner.join()
+        db.expire_all()
+        assert db.query(SurveyResponse).filter(SurveyResponse.survey_id == survey_id).count() == stored
+
+class TestPartitioning:
+    def test_range_partitions_cover_consecutive_months(self):
+        from utils.partitioning import range_partition_ddl
+
+        statements = range_partition_ddl(date(2025, 11, 15), months=3)
+        assert statements[0].endswith("FOR VALUES FROM ('2025-11-01') TO ('2025-12-01')")
+        assert "survey_responses_y2026m01" in statements[2]
+        assert statements[2].endswith("FOR VALUES FROM ('2026-01-01') TO ('2026-02-01')")
+        assert statements[-1].endswith("PARTITION OF survey_responses DEFAULT")
+
+    def test_new_range_partition_takes_its_rows_from_default(self):
+        from utils.partitioning import range_partition_attach_ddl
+
+        create, move, attach = range_partition_attach_ddl(date(2026, 3, 20))
+        assert create.startswith("CREATE TABLE survey_responses_y2026m03 (LIKE survey_responses")
+        assert "DELETE FROM survey_responses_default WHERE submitted_at >= '2026-03-01' " \
+               "AND submitted_at < '2026-04-01'" in move
+        assert attach.endswith("ATTACH PARTITION survey_responses_y2026m03 FOR VALUES FROM ('2026-03-01') TO ('2026-04-01')")
+
+    def test_hash_partitions_use_every_remainder(self):
+        from utils.partitioning import hash_partition_ddl
+
+        statements = hash_partition_ddl(4)
+        assert [s.split("REMAINDER ")[1] for s in statements] == ["0)", "1)", "2)", "3)"]
+
 if __name__ == "__main__":
     pytest.main(["-v"])
\ No newline at end of file